@@ -0,0 +1,67 @@
+"""
+Alias checks per second, with exists for every check and with an
+AliasRegistry
+
+    python benchmarks/bench_aliases.py
+
+The registry is loaded with SHOPS taken aliases. The checks are mostly
+free aliases like the prefixes typed into a signup form, with a share of
+taken ones answered by exists once and then from the cache. The local fake
+server waits LATENCY seconds before answering like a real server would.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.aliases import AliasRegistry  # noqa: E402
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from tests.fake_epages import FakeEpages, soap_response  # noqa: E402
+
+LATENCY = 0.005
+SHOPS = 100000
+CHECKS = 100000
+EXISTS_CALLS = 200
+TAKEN_SHARE = 10
+
+
+def exists_handler(body):
+    time.sleep(LATENCY)
+    return 200, soap_response(
+        'exists', '<exists>{}</exists>'.format(int(b'Taken' in body)))
+
+
+def report(name, checks, seconds, registry=None):
+    line = "{:24} {:10.0f} / s".format(name, checks / seconds)
+    if registry is not None:
+        line += "   {} exists calls".format(registry.exists_calls)
+    print(line)
+
+
+def main():
+    taken = ['Taken{}'.format(i) for i in range(SHOPS)]
+    # one in TAKEN_SHARE checks is one of 100 taken aliases
+    checks = ['Taken{}'.format(i % 100) if i % TAKEN_SHARE == 0
+              else 'Free{}'.format(i) for i in range(CHECKS)]
+    with FakeEpages() as fake:
+        fake.handlers['exists'] = exists_handler
+        sc = ShopConfigService(server=fake.server)
+
+        start = time.perf_counter()
+        for alias in checks[:EXISTS_CALLS]:
+            sc.alias_exists(alias)
+        report('alias_exists', EXISTS_CALLS, time.perf_counter() - start)
+
+        for name, error_rate in (('registry set', None),
+                                 ('registry bloom 1%', 0.01)):
+            registry = AliasRegistry(sc, cache_ttl=60, error_rate=error_rate)
+            registry.load(taken)
+            start = time.perf_counter()
+            for alias in checks:
+                registry.is_available(alias)
+            report(name, CHECKS, time.perf_counter() - start, registry)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Peak memory and time of get_all_info and iter_all_info
+
+    python benchmarks/bench_all_info.py [shops]
+
+The local fake server answers getAllInfo with the given number of shops
+(default 20000). Memory is the peak traced by tracemalloc while going
+through all the shops.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from tests.fake_epages import FakeEpages, soap_response  # noqa: E402
+
+SHOP = (
+    '<item><Alias>Shop{0}</Alias><ShopType>MinDemo</ShopType>'
+    '<Database>Store</Database><Provider>Distributor</Provider>'
+    '<IsClosed>0</IsClosed><IsTrialShop>1</IsTrialShop>'
+    '<DomainName>shop{0}.example</DomainName>'
+    '<MerchantEMail>owner@shop{0}.example</MerchantEMail>'
+    '<SecondaryDomains soapenc:arrayType="xsd:string[1]">'
+    '<item>www.shop{0}.example</item></SecondaryDomains>'
+    '<Name>Shop number {0}</Name>'
+    '</item>'
+)
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    took = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:32} {:6} shops {:8.2f} s {:8.1f} MB".format(
+        name, count, took, peak / 2 ** 20))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    content = soap_response(
+        'getAllInfo',
+        '<Shops soapenc:arrayType="ns0:TInfoShop_Return[{}]">{}</Shops>'
+        .format(count, ''.join(SHOP.format(i) for i in range(count))))
+
+    with FakeEpages() as fake:
+        fake.handlers['getAllInfo'] = lambda body: (200, content)
+        sc = ShopConfigService(server=fake.server)
+
+        measure('get_all_info',
+                lambda: len(sc.get_all_info()))
+        measure('iter_all_info',
+                lambda: sum(1 for shop in sc.iter_all_info()))
+        measure('iter_all_info, Alias only',
+                lambda: sum(1 for shop in sc.iter_all_info(['Alias'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput of exists over many aliases, one call after another and with
+ShopConfigService.map_operation
+
+    python benchmarks/bench_bulk.py
+
+The local fake server waits LATENCY seconds before answering like a real
+server would, so the sequential loop is bound by the round trips. The pool
+of the TransportConfig is sized for the highest concurrency.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from epages_provisioning.transport import TransportConfig  # noqa: E402
+from tests.fake_epages import FakeEpages, soap_response  # noqa: E402
+
+LATENCY = 0.005
+CALLS = 1000
+CONCURRENCY = (1, 4, 16, 32, 64)
+
+
+def exists_handler(body):
+    time.sleep(LATENCY)
+    return 200, soap_response('exists', '<exists>1</exists>')
+
+
+def report(name, seconds):
+    print("{:24} {:8.0f} / s".format(name, CALLS / seconds))
+
+
+def main():
+    aliases = ['Shop{}'.format(i) for i in range(CALLS)]
+    with FakeEpages() as fake:
+        fake.handlers['exists'] = exists_handler
+        sc = ShopConfigService(
+            server=fake.server,
+            transport_config=TransportConfig(pool_maxsize=max(CONCURRENCY)))
+
+        start = time.perf_counter()
+        for alias in aliases:
+            sc.exists(sc.get_shopref_obj({'Alias': alias}))
+        report('sequential', time.perf_counter() - start)
+
+        for concurrency in CONCURRENCY:
+            for ordered in (True, False):
+                start = time.perf_counter()
+                for result in sc.map_operation('exists', aliases,
+                                               concurrency, ordered):
+                    assert result.ok, result.error
+                report('concurrency {:2} {}'.format(
+                    concurrency, 'ordered' if ordered else 'completed'),
+                    time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+ArrayFixer + BooleanFixer against the single pass EnvelopeFixer
+
+    python benchmarks/bench_envelope_fixer.py
+
+Fixes large update envelopes (many Attributes and SecondaryDomains) and a
+plain exists envelope, and checks the results are byte identical.
+"""
+import copy
+import os
+import sys
+import time
+
+from lxml import etree
+from zeep import Client, Settings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.zeep_utils import (  # noqa: E402
+    ArrayFixer, BooleanFixer, EnvelopeFixer, LocalSchemaTransport
+)
+from tests.fake_epages import DATA_DIR  # noqa: E402
+
+ROUNDS = 500
+
+
+def main():
+    client = Client(
+        os.path.join(DATA_DIR, 'ShopConfigService12.wsdl'),
+        settings=Settings(strict=False),
+        transport=LocalSchemaTransport(),
+    )
+    binding = next(iter(client.wsdl.bindings.values()))
+    service = client.create_service(binding.name, 'http://localhost/')
+    attribute = client.get_type('ns1:TAttribute')
+
+    cases = []
+    for size in (10, 100, 1000):
+        shop = client.get_type('ns0:TUpdateShop')(
+            Alias='DemoShop',
+            IsClosed=False,
+            SecondaryDomains=['shop{}.example'.format(i)
+                              for i in range(size)],
+            Attributes=[attribute(Name='a{}'.format(i), Value=str(i))
+                        for i in range(size)],
+        )
+        cases.append(('update, {} items'.format(size), 'update', shop))
+    cases.append(('exists', 'exists',
+                  client.get_type('ns0:TShopRef')(Alias='DemoShop')))
+
+    old_plugins = (ArrayFixer(), BooleanFixer())
+    fixer = EnvelopeFixer()
+
+    for label, name, value in cases:
+        envelope = client.create_message(service, name, value)
+        operation = binding.get(name)
+
+        def old(env):
+            for plugin in old_plugins:
+                env, _ = plugin.egress(env, {}, operation, {})
+            return env
+
+        def new(env):
+            env, _ = fixer.egress(env, {}, operation, {})
+            return env
+
+        assert etree.tostring(old(copy.deepcopy(envelope))) == \
+            etree.tostring(new(copy.deepcopy(envelope)))
+
+        # best of a few runs, every run fixes fresh copies of the envelope
+        times = {old: [], new: []}
+        for i in range(3):
+            for func in (old, new):
+                copies = [copy.deepcopy(envelope) for j in range(ROUNDS)]
+                start = time.perf_counter()
+                for env in copies:
+                    func(env)
+                times[func].append((time.perf_counter() - start) / ROUNDS)
+        old_time, new_time = min(times[old]), min(times[new])
+        print("{:20} old {:9.1f} us  new {:9.1f} us  {:5.1f}x".format(
+            label, old_time * 1e6, new_time * 1e6, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Memory per shop of Shop objects and ShopRecords
+
+    python benchmarks/bench_records.py [shops]
+
+The local fake server answers getAllInfo with the given number of shops
+(default 10000). The Shops are filled from the response like refresh does,
+so each keeps its getInfo object as shopinfo and its request objects. The
+memory is what tracemalloc sees still allocated once the shops are built
+and everything else is dropped.
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from epages_provisioning.records import ShopRecord  # noqa: E402
+from epages_provisioning.shop import Shop  # noqa: E402
+from tests.fake_epages import FakeEpages, soap_response  # noqa: E402
+
+SHOP = (
+    '<item><Alias>Shop{0}</Alias><ShopType>MinDemo</ShopType>'
+    '<Database>Store</Database><Provider>Distributor</Provider>'
+    '<IsClosed>0</IsClosed><IsTrialShop>1</IsTrialShop>'
+    '<DomainName>shop{0}.example</DomainName>'
+    '<MerchantEMail>owner@shop{0}.example</MerchantEMail>'
+    '<SecondaryDomains soapenc:arrayType="xsd:string[1]">'
+    '<item>www.shop{0}.example</item></SecondaryDomains>'
+    '<ShopAddress_CountryID>DE</ShopAddress_CountryID>'
+    '<ShopAddress_City>Jena</ShopAddress_City>'
+    '<Name>Shop number {0}</Name>'
+    '</item>'
+)
+
+
+def loaded_shop(info, sc):
+    shop = Shop(info.Alias, sc, lazy=True)
+    shop.shopinfo = info
+    shop.exists = True
+    shop._loaded = True
+    shop._from_dict(info)
+    return shop
+
+
+def measure(name, count, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    shops = build()
+    took = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:28} {:6} shops {:8.2f} s {:8.0f} bytes / shop".format(
+        name, len(shops), took, current / count))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    content = soap_response(
+        'getAllInfo',
+        '<Shops soapenc:arrayType="ns0:TInfoShop_Return[{}]">{}</Shops>'
+        .format(count, ''.join(SHOP.format(i) for i in range(count))))
+
+    with FakeEpages() as fake:
+        fake.handlers['getAllInfo'] = lambda body: (200, content)
+        sc = ShopConfigService(server=fake.server)
+        sc.warm_up()
+
+        measure('Shop', count, lambda: [
+            loaded_shop(info, sc) for info in sc.get_all_info()])
+        measure('ShopRecord, get_all_info', count, lambda: [
+            ShopRecord.from_info(info) for info in sc.get_all_info()])
+        measure('ShopRecord, iter_all_info', count, lambda: [
+            ShopRecord.from_info(info) for info in sc.iter_all_info()])
+
+
+if __name__ == '__main__':
+    main()
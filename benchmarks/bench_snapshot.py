@@ -0,0 +1,45 @@
+"""
+Cold start of ShopConfigService: wsdl from the server vs from a snapshot
+
+    python benchmarks/bench_snapshot.py
+
+Uses the local fake server and the reduced test wsdl, the real ePages wsdl
+is several times larger so the difference there is bigger.
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from tests.fake_epages import FakeEpages  # noqa: E402
+
+ROUNDS = 50
+
+
+def main():
+    with FakeEpages() as fake, tempfile.TemporaryDirectory() as tmpdir:
+        kwargs = {
+            'server': fake.server,
+            'provider': 'Distributor',
+            'username': 'admin',
+            'password': 'admin',
+        }
+        path = os.path.join(tmpdir, 'ShopConfigService12.snapshot')
+        ShopConfigService(**kwargs).save_snapshot(path)
+
+        wsdl = timeit.timeit(
+            lambda: ShopConfigService(**kwargs), number=ROUNDS) / ROUNDS
+        snapshot = timeit.timeit(
+            lambda: ShopConfigService.from_snapshot(path, **kwargs),
+            number=ROUNDS) / ROUNDS
+
+    print("from wsdl:     {:8.2f} ms".format(wsdl * 1000))
+    print("from snapshot: {:8.2f} ms".format(snapshot * 1000))
+    print("speedup:       {:8.1f}x".format(wsdl / snapshot))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Per call time of exists through zeep and through the envelope template
+
+    python benchmarks/bench_templates.py
+
+Both run against the local fake server, so the numbers include the HTTP
+round trip to localhost. The second table leaves the network out and only
+compares building the request body.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from zeep.wsdl.utils import etree_to_string  # noqa: E402
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from tests.fake_epages import FakeEpages, soap_response  # noqa: E402
+
+ROUNDS = 2000
+
+
+def exists_handler(body):
+    return 200, soap_response('exists', '<exists>1</exists>')
+
+
+def main():
+    with FakeEpages() as fake:
+        fake.handlers['exists'] = exists_handler
+        sc = ShopConfigService(server=fake.server)
+
+        def zeep_exists():
+            return sc.exists(sc.get_shopref_obj({'Alias': 'DemoShop'}))
+
+        def template_exists():
+            return sc.alias_exists('DemoShop')
+
+        template_exists()
+        for name, func in (('exists, zeep', zeep_exists),
+                           ('exists, template', template_exists)):
+            took = timeit.timeit(func, number=ROUNDS) / ROUNDS
+            print("{:22} {:8.1f} us".format(name, took * 1e6))
+
+    binding = sc.service2._binding
+    options = sc.service2._binding_options
+    template = sc._template('exists', None)
+
+    def zeep_body():
+        envelope, _ = binding._create(
+            'exists', [sc.get_shopref_obj({'Alias': 'DemoShop'})], {},
+            client=sc.client, options=options)
+        return etree_to_string(envelope)
+
+    def template_body():
+        return template.render('DemoShop')
+
+    for name, func in (('body, zeep', zeep_body),
+                       ('body, template', template_body)):
+        took = timeit.timeit(func, number=ROUNDS * 10) / (ROUNDS * 10)
+        print("{:22} {:8.1f} us".format(name, took * 1e6))
+
+
+if __name__ == '__main__':
+    main()
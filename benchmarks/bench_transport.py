@@ -0,0 +1,76 @@
+"""
+Throughput of exists calls as the number of threads rises
+
+    python benchmarks/bench_transport.py
+
+All threads share one ShopConfigService talking to the local fake server,
+which waits LATENCY seconds before answering like a real server would. With
+the default pool of 10 connections per host, calls beyond that open a new
+connection each time and throw it away afterwards ("Connection pool is
+full"); a pool sized for the concurrency keeps reusing them. Calls that
+fail are counted, not raised.
+"""
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from epages_provisioning.transport import TransportConfig  # noqa: E402
+from tests.fake_epages import FakeEpages, soap_response  # noqa: E402
+
+LATENCY = 0.005
+CALLS = 1000
+THREADS = (1, 4, 16, 32, 64)
+
+
+def exists_handler(body):
+    time.sleep(LATENCY)
+    return 200, soap_response('exists', '<exists>1</exists>')
+
+
+def throughput(sc, threads):
+    """ calls per second and the number of calls that failed """
+    def call(alias):
+        try:
+            sc.alias_exists(alias)
+        except Exception:
+            return 1
+        return 0
+
+    with ThreadPoolExecutor(threads) as executor:
+        start = time.perf_counter()
+        errors = sum(executor.map(call, ['DemoShop'] * CALLS))
+        return CALLS / (time.perf_counter() - start), errors
+
+
+def cell(result):
+    calls, errors = result
+    return '{:.0f} / s, {} failed'.format(calls, errors)
+
+
+def main():
+    # urllib3 warns for every connection it can not put back into the pool
+    logging.getLogger('urllib3.connectionpool').setLevel(logging.ERROR)
+    with FakeEpages() as fake:
+        fake.handlers['exists'] = exists_handler
+        configs = (
+            ('default pool', TransportConfig()),
+            ('pool_maxsize=64', TransportConfig(pool_maxsize=64)),
+        )
+        print("{:8} {}".format(
+            'threads', ''.join('{:>24}'.format(name) for name, _ in configs)))
+        services = [ShopConfigService(server=fake.server,
+                                      transport_config=config)
+                    for _, config in configs]
+        for threads in THREADS:
+            print("{:8} {}".format(threads, ''.join(
+                '{:>24}'.format(cell(throughput(sc, threads)))
+                for sc in services)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Per call overhead of the type checks in the operations
+
+    python benchmarks/bench_type_checks.py
+
+Compares the old check, which built a throwaway object for every call, with
+the cached type classes.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epages_provisioning.provisioning import ShopConfigService  # noqa: E402
+from tests.fake_epages import FakeEpages  # noqa: E402
+
+ROUNDS = 20000
+
+
+def main():
+    with FakeEpages() as fake:
+        sc = ShopConfigService(server=fake.server)
+
+    shopref = sc.get_shopref_obj({'Alias': 'DemoShop'})
+
+    def old_check():
+        return isinstance(
+            shopref, type(sc.client.get_type('ns0:TShopRef')()))
+
+    def new_check():
+        return isinstance(shopref, sc._type_class('ns0:TShopRef'))
+
+    def old_factory():
+        return sc.client.get_type('ns0:TShopRef')(Alias='DemoShop')
+
+    def new_factory():
+        return sc.get_shopref_obj({'Alias': 'DemoShop'})
+
+    for name, func in (('check, old', old_check),
+                       ('check, new', new_check),
+                       ('get_shopref_obj, old', old_factory),
+                       ('get_shopref_obj, new', new_factory)):
+        took = timeit.timeit(func, number=ROUNDS) / ROUNDS
+        print("{:22} {:8.2f} us".format(name, took * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+"""
+asyncio versions of the services and Shop
+
+The async services have the same get_*_obj factories and operations as the
+blocking ones, the operations return coroutines:
+
+    sc = AsyncShopConfigService(server="example.com", ...)
+    exists = await sc.exists(sc.get_shopref_obj({'Alias': 'DemoShop'}))
+
+    shop = await AsyncShop.open('DemoShop', sc)
+    shop.IsClosed = True
+    await shop.apply()
+
+The operations are sent with httpx (install epages_provisioning[async]),
+the wsdl is still loaded with requests when the service is created, as
+zeep does. Use lazy=True to load it on the first call, snapshot or shared
+to make it cheap. Services created with the same TransportConfig share one
+httpx.AsyncClient and its connections; call ``await config.aclose()`` when
+done.
+"""
+import logging
+from contextlib import asynccontextmanager
+
+from lxml import etree
+from requests.auth import HTTPBasicAuth
+from zeep import AsyncClient
+from zeep.helpers import serialize_object
+from zeep.proxy import AsyncServiceProxy
+
+from .bulk import DEFAULT_CONCURRENCY, run_bulk_async
+from .features import FeaturePackService
+from .provisioning import ShopConfigService, SimpleProvisioningService
+from .shop import Shop, ShopDisappearedError, ShopExistsError
+from .templates import (
+    ArrayReader, TemplateError, parse_response, read_fields, read_value,
+    select_fields
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncClientMixin(object):
+    """ creates an AsyncClient with an AsyncLocalSchemaTransport """
+
+    _client_class = AsyncClient
+
+    def _create_transport(self):
+        return self.transport_config.create_async_transport(
+            auth=HTTPBasicAuth(self.userpath, self.password),
+            cache=self.cache, version=getattr(self, 'version', ""))
+
+    def _create_service(self, client, qname):
+        # AsyncClient.create_service would return a blocking proxy
+        return AsyncServiceProxy(
+            client, client.wsdl.bindings[qname], address=self.endpoint)
+
+
+class AsyncServiceMixin(AsyncClientMixin):
+    """ the fast paths of BaseProvisioningService as coroutines """
+
+    _awaitable_results = True
+
+    async def _alias_exists(self, alias):
+        template = self._template(
+            'exists', lambda alias: [self.get_shopref_obj({'Alias': alias})])
+        try:
+            if template is not None:
+                response = await template.call_async(alias)
+                return read_value(response[0], template.result_type())
+        except TemplateError:
+            pass
+        shopref = self.get_shopref_obj({'Alias': alias})
+        return await self.service2.exists(shopref)
+
+    async def _get_info_fields(self, alias, fields=None):
+        template = self._template(
+            'getInfo', lambda alias: [self._get_info_obj(alias)])
+        try:
+            if template is not None:
+                response = await template.call_async(alias)
+                return read_fields(
+                    response[0], template.result_type(), fields)
+        except TemplateError:
+            pass
+        info = await self.service2.getInfo(self._get_info_obj(alias))
+        return select_fields(serialize_object(info), fields)
+
+
+class AsyncShopConfigService(AsyncServiceMixin, ShopConfigService):
+    """ ShopConfigService with coroutine operations """
+
+    def map_operation(self, operation, items,
+                      concurrency=DEFAULT_CONCURRENCY, ordered=True):
+        """ run one operation for every item as tasks of the event loop,
+        see ShopConfigService.map_operation. Returns an async generator of
+        the BulkResults
+
+        async for result in sc.map_operation('exists', aliases, 16):
+            print(result.item, result.result)
+        """
+        func = self._bulk_call(operation)
+        self.warm_up()
+        return run_bulk_async(func, items, concurrency, ordered)
+
+    def bulk(self, calls, concurrency=DEFAULT_CONCURRENCY, ordered=True):
+        """ map_operation for different operations, see
+        ShopConfigService.bulk """
+        self.warm_up()
+        return run_bulk_async(
+            self._bulk_pair_call(), calls, concurrency, ordered)
+
+    async def iter_all_info(self, fields=None, predicate=None):
+        """ getAllInfo one shop at a time, see
+        ShopConfigService.iter_all_info
+
+        async for shop in sc.iter_all_info(['Alias']):
+            print(shop['Alias'])
+        """
+        template = self._templates.get(
+            'getAllInfo', self.client, self.service2, 'getAllInfo',
+            lambda: [], slots=0)
+        if template is None:
+            for shop in await self.get_all_info() or []:
+                values = serialize_object(shop)
+                if predicate is None or predicate(values):
+                    yield select_fields(values, fields)
+            return
+
+        transport = self.client.transport
+        reader = ArrayReader(
+            template.result_type()._array_type.array_type, fields, predicate)
+        parser = etree.XMLPullParser(events=('start', 'end'), huge_tree=True)
+        request = transport.client.build_request(
+            'POST', template.address, content=template.render(),
+            headers=template.headers,
+            timeout=transport.timeout_for('getAllInfo'))
+        # the limiter slot is only held until the headers have arrived
+        async with transport.limited() as call:
+            response = await transport.client.send(
+                request, auth=transport.auth, stream=True)
+            call.record(response.status_code)
+        try:
+            if response.status_code != 200:
+                # faults are small, read them whole
+                await response.aread()
+                parse_response(transport.new_response(response))
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+                for values in reader.read(parser.read_events()):
+                    yield values
+        finally:
+            await response.aclose()
+        parser.close()
+        for values in reader.read(parser.read_events()):
+            yield values
+
+
+class AsyncSimpleProvisioningService(
+        AsyncServiceMixin, SimpleProvisioningService):
+    """ SimpleProvisioningService with coroutine operations """
+
+    async def mark_for_deletion(self, shop):
+        """ Mark the shop for deletion, see
+        SimpleProvisioningService.mark_for_deletion """
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
+            raise TypeError(
+                "Get shop from get_shopref_obj and call with that")
+
+        if await self.service2.exists(shop):
+            return await self._forget(
+                lambda: self.service2.markForDeletion(shop), shop)
+        else:
+            return False
+
+
+class AsyncFeaturePackService(AsyncClientMixin, FeaturePackService):
+    """ FeaturePackService with coroutine operations """
+
+    async def getInfo(self, feature: str, language: str | list[str] = "en"):
+        """ Get information about a feature pack """
+        return (await self.getInfoMultiple([feature], language))[0]
+
+    async def getInfoFields(self, feature: str,
+                            fields: list[str] | None = None,
+                            language: str | list[str] = "en"):
+        """ getInfo of one feature pack as a dict, see
+        FeaturePackService.getInfoFields """
+        languages = [language] if isinstance(language, str) else list(language)
+        path = f"/Providers/{self.provider}/FeaturePacks/{feature}"
+        template = self._get_info_template(languages)
+        try:
+            if template is not None:
+                response = await template.call_async(path)
+                item_type = template.result_type()._array_type.array_type
+                return read_fields(response[0][0], item_type, fields)
+        except TemplateError:
+            pass
+        info = await self.getInfo(feature, languages)
+        return select_fields(serialize_object(info), fields)
+
+    async def applyToShop(self, feature: str, shop: str):
+        """ Apply a feature pack to a specific shop. """
+        input_type = self._get_type("ns1:TApplyToShop_Input")
+        pair = input_type(*self._feature_shop_paths(feature, shop))
+        result = await self.service2.applyToShop(pair)
+        return result[0]
+
+    async def removeFromShop(self, feature: str, shop: str):
+        """ Remove a feature pack from a specific shop. """
+        input_type = self._get_type("ns1:TRemoveFromShop_Input")
+        pair = input_type(*self._feature_shop_paths(feature, shop))
+        result = await self.service2.removeFromShop(pair)
+        return result[0]
+
+
+class AsyncShop(Shop):
+    """ Shop for the async services
+
+    Nothing is loaded when created, use open or call refresh:
+
+    shop = await AsyncShop.open('DemoShop', sc)
+
+    The attributes are sent right away or collected with attribute_batch,
+    there is no attribute_flush_delay.
+    """
+
+    attribute_flush_delay = None
+
+    def __init__(
+            self,
+            Alias=None,
+            provisioning=None,
+            attribute_cache_ttl=None,
+    ):
+        self.attribute_cache_ttl = attribute_cache_ttl
+        self._attribute_cache = {}
+        self._init_attribute_writes()
+        for key in self.shopkeys:
+            setattr(self, key, None)
+        self.Alias = Alias
+        self.sc = provisioning
+        self.exists = None
+
+        self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
+        self.infoshopobj = self.sc.get_infoshop_obj({'Alias': self.Alias})
+
+    @classmethod
+    async def open(cls, Alias, provisioning):
+        """ shop with the data from the server, if it exists """
+        shop = cls(Alias, provisioning)
+        shop.exists = await shop.sc.exists(shop.shoprefobj)
+        if shop.exists:
+            await shop.refresh()
+        return shop
+
+    async def refresh(self):
+        """ refresh the internal state from the server """
+        self._attribute_cache.clear()
+        self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
+        self.exists = await self.sc.exists(self.shoprefobj)
+
+        if not self.exists:
+            raise ShopDisappearedError("Could not find the shop anymore!")
+
+        self.infoshopobj = self.sc.get_infoshop_obj({'Alias': self.Alias})
+        self.shopinfo = await self.sc.get_info(self.infoshopobj)
+
+        self._from_dict(self.shopinfo)
+
+    async def create(self):
+        """ creates the shop on the server """
+        self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
+        self.exists = await self.sc.exists(self.shoprefobj)
+
+        if self.exists:
+            raise ShopExistsError("Shop already exists")
+
+        await self.sc.create(self._createshop_obj())
+        await self.refresh()
+
+    async def apply(self, refresh=True):
+        """ apply the changes to the server, see Shop.apply """
+        changes = self.changes()
+        if not changes:
+            return
+
+        await self.sc.update(self._updateshop_obj(changes))
+        self._attribute_cache.clear()
+
+        if refresh:
+            await self.refresh()
+        else:
+            self._mark_clean(changes)
+
+    async def get_shop_attribute(self, attributename, language=None):
+        """ get one attribute value from the shop """
+        if self._attribute_writes:
+            await self.flush_attributes()
+        data = await self.sc.get_info(
+            self._attribute_infoshop_obj(attributename, language))
+        return data['Attributes'][0].Value
+
+    async def get_shop_attributes(self, names, languages=None):
+        """ read attributes of the shop with one getInfo, see
+        Shop.get_shop_attributes """
+        if self._attribute_writes:
+            await self.flush_attributes()
+        languages = self._attribute_languages(languages)
+        found, missing = self._cached_attributes(names, languages)
+        if missing:
+            data = await self.sc.get_info(
+                self._attributes_infoshop_obj(missing, languages))
+            found.update(self._read_attributes(data, languages))
+        return {name: found.get(name) for name in names}
+
+    async def set_shop_attribute(self,
+                                 attributename,
+                                 value=None,
+                                 localized_values=None):
+        """ set one attribute value of the shop, collected for one update
+        in an attribute_batch """
+        self._forget_attribute(attributename)
+        if self._attribute_batches:
+            self._buffer_attribute(attributename, value, localized_values)
+            return None
+        return await self.sc.update(self._attribute_updateshop_obj(
+            attributename, value, localized_values))
+
+    async def set_shop_attributes(self, attributes):
+        """ set several attributes with one update, see
+        Shop.set_shop_attributes """
+        async with self.attribute_batch():
+            for name, value in attributes.items():
+                if isinstance(value, dict):
+                    await self.set_shop_attribute(
+                        name, localized_values=value)
+                else:
+                    await self.set_shop_attribute(name, value)
+
+    @asynccontextmanager
+    async def attribute_batch(self):
+        """ collect the set_shop_attribute calls of the block for one
+        update, see Shop.attribute_batch
+
+        async with shop.attribute_batch():
+            await shop.set_shop_attribute('Title', 'Demo shop')
+        """
+        self._attribute_batches += 1
+        try:
+            yield self
+        finally:
+            self._attribute_batches -= 1
+            if not self._attribute_batches:
+                await self.flush_attributes()
+
+    async def flush_attributes(self):
+        """ send the attributes collected so far with one update """
+        writes = self._take_attribute_writes()
+        if not writes:
+            return
+        try:
+            await self.sc.update(self._attributes_updateshop_obj(writes))
+        except BaseException:
+            self._restore_attribute_writes(writes)
+            raise
+
+    async def reset_merchant_pass(self, newpass):
+        """ reset the merchant password, see Shop.reset_merchant_pass """
+        await self.refresh()
+        if not newpass:
+            raise ValueError("Password must be defined")
+
+        await self.sc.update(self.sc.get_updateshop_obj({
+            'Alias': self.Alias,
+            'MerchantPassword': newpass,
+        }))
+        await self.refresh()
+
+    async def rename(self, newalias):
+        """ rename the shop, see Shop.rename """
+        await self.refresh()
+        if not newalias:
+            raise ValueError("New alias must be defined")
+
+        await self.sc.update(self.sc.get_updateshop_obj({
+            'Alias': self.Alias,
+            'NewAlias': newalias,
+            'WebServerScriptNamePart': newalias,
+        }))
+        self.Alias = newalias
+        await self.refresh()
+
+    async def mark_for_delete(self, mark=True):
+        """ mark the shop for deletion, see Shop.mark_for_delete """
+        await self.sc.update(self.sc.get_updateshop_obj({
+            'Alias': self.Alias,
+            'MarkedForDelete': mark,
+        }))
+        await self.refresh()
+
+    async def delete(self, shopref=False):
+        """ delete the shop """
+        await self.refresh()
+        await self.sc.delete(self.shoprefobj)
+        self.exists = False
@@ -0,0 +1,217 @@
+"""
+Alias availability without a call per check
+
+Signup forms check whether an alias is free on every keystroke. An
+AliasRegistry loads the taken aliases once and answers from memory: an
+alias that is not in the loaded set is free, only aliases that look taken
+are confirmed with an exists call, whose answers are cached for a few
+seconds:
+
+    registry = AliasRegistry(sc).load()
+    registry.is_available('NewShop')               # no call
+    registry.is_available('DemoShop')              # exists, then cached
+    registry.is_available('NewShop', strict=True)  # exists, before create
+
+The taken aliases are kept in a set, or with error_rate in a BloomFilter
+that needs a few bits per alias and sometimes takes a free alias for a
+taken one, which the exists call then corrects. With watch the shops
+created, renamed and deleted through the ShopConfigService are followed,
+for the ones created elsewhere load again now and then, or use strict:
+
+    registry.watch(sc)
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter(object):
+    """ set of strings that may answer True for strings never added, but
+    never False for added ones
+
+    :param capacity: number of strings expected
+    :param error_rate: share of false positives at capacity
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        capacity = max(capacity, 1)
+        self.size = max(int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, key):
+        # two hashes combined give the k positions (Kirsch, Mitzenmacher)
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size
+                for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def discard(self, key):
+        """ strings can not be removed from a Bloom filter """
+        pass
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def __len__(self):
+        """ number of strings added """
+        return self._count
+
+
+class AliasRegistry(object):
+    """ answers whether aliases are free from the loaded taken aliases and
+    a cache of exists answers
+
+    :param provisioning: service with alias_exists, a ShopConfigService
+                         also for load and watch
+    :param cache_ttl: seconds the answers of exists are used
+    :param error_rate: keep the taken aliases in a BloomFilter with this
+                       error rate instead of a set
+    :param strict: confirm free aliases with exists as well
+    :param max_cache_entries: expired answers are dropped above this
+    """
+
+    def __init__(
+            self,
+            provisioning,
+            cache_ttl=5.0,
+            error_rate=None,
+            strict=False,
+            max_cache_entries=10000):
+        self.sc = provisioning
+        self.cache_ttl = cache_ttl
+        self.error_rate = error_rate
+        self.strict = strict
+        self.max_cache_entries = max_cache_entries
+        self._taken = set()
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.local_answers = 0
+        self.cache_hits = 0
+        self.exists_calls = 0
+        self.false_positives = 0
+
+    def load(self, aliases=None):
+        """ replace the taken aliases with the ones of getAllInfo, or the
+        given ones """
+        if aliases is None:
+            aliases = [shop['Alias']
+                       for shop in self.sc.iter_all_info(['Alias'])]
+        else:
+            aliases = list(aliases)
+        if self.error_rate is None:
+            taken = set(_key(alias) for alias in aliases)
+        else:
+            taken = BloomFilter(len(aliases), self.error_rate)
+            for alias in aliases:
+                taken.add(_key(alias))
+        with self._lock:
+            self._taken = taken
+            self._cache.clear()
+            self.loaded_at = time.time()
+        logger.debug('Loaded %d taken aliases', len(aliases))
+        return self
+
+    def is_available(self, alias, strict=None):
+        """ is the alias free
+
+        :param strict: confirm a free answer with exists, defaults to the
+                       strict of the registry
+        """
+        return not self.is_taken(alias, strict)
+
+    def is_taken(self, alias, strict=None):
+        """ is the alias used by a shop, see is_available """
+        key = _key(alias)
+        strict = self.strict if strict is None else strict
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self.cache_hits += 1
+                return cached[1]
+            if not strict and key not in self._taken:
+                self.local_answers += 1
+                return False
+
+        exists = bool(self.sc.alias_exists(alias))
+        with self._lock:
+            self.exists_calls += 1
+            if exists:
+                self._taken.add(key)
+            elif key in self._taken:
+                self.false_positives += 1
+                self._taken.discard(key)
+            self._remember(key, exists)
+        return exists
+
+    def stats(self):
+        """ the numbers for monitoring as a dict """
+        with self._lock:
+            return {
+                'taken': len(self._taken),
+                'cached': len(self._cache),
+                'local_answers': self.local_answers,
+                'cache_hits': self.cache_hits,
+                'exists_calls': self.exists_calls,
+                'false_positives': self.false_positives,
+            }
+
+    def _remember(self, key, exists):
+        """ cache an answer, called with the lock held """
+        now = time.monotonic()
+        if len(self._cache) >= self.max_cache_entries:
+            for old in [old for old, (expires, _) in self._cache.items()
+                        if expires <= now]:
+                del self._cache[old]
+            if len(self._cache) >= self.max_cache_entries:
+                self._cache.clear()
+        self._cache[key] = (now + self.cache_ttl, exists)
+
+    def watch(self, provisioning):
+        """ follow the changes made through the ShopConfigService """
+        provisioning.add_listener(self._changed)
+        return self
+
+    def unwatch(self, provisioning):
+        provisioning.remove_listener(self._changed)
+
+    def _changed(self, operation, shop, *arguments):
+        taken, free = [], []
+        if operation == 'create':
+            taken.append(shop.Alias)
+        elif operation == 'update' and getattr(shop, 'NewAlias', None):
+            taken.append(shop.NewAlias)
+            free.append(shop.Alias)
+        elif operation in ('delete', 'deleteShopRef'):
+            free.append(shop.Alias)
+        with self._lock:
+            for alias in taken:
+                self._taken.add(_key(alias))
+                self._cache.pop(_key(alias), None)
+            for alias in free:
+                self._taken.discard(_key(alias))
+                self._cache.pop(_key(alias), None)
+
+
+def _key(alias):
+    """ aliases differing only in case are treated as the same, a free
+    answer is then never wrong because of the case """
+    return alias.casefold()
@@ -0,0 +1,135 @@
+"""
+Running one operation over many shops
+
+run_bulk calls a function for every item of an iterable on a thread pool,
+with at most concurrency calls running at the same time. The items are read
+from the iterable as the calls finish, so it can be a generator over
+thousands of aliases. Exceptions are returned with the item instead of
+stopping the run:
+
+    for result in run_bulk(sc.alias_exists, aliases, concurrency=16):
+        if result.error is None:
+            print(result.item, result.result)
+
+The services call it through ShopConfigService.map_operation and bulk. The
+async services use run_bulk_async, which runs the coroutines on the event
+loop instead:
+
+    async for result in run_bulk_async(sc.alias_exists, aliases, 16):
+        ...
+"""
+import asyncio
+import inspect
+import logging
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 10
+
+
+class BulkResult(namedtuple('BulkResult', ('index', 'item', 'result',
+                                           'error'))):
+    """ outcome of one item: its position in the input, the item, the value
+    returned and the exception raised, if any """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def run_bulk(func, items, concurrency=DEFAULT_CONCURRENCY, ordered=True):
+    """ call func(item) for every item on a thread pool, yields BulkResults
+
+    :param func: called with every item
+    :param items: iterable of the items, read as the calls finish
+    :param concurrency: max calls running at the same time, keep it at or
+                        below the pool_maxsize of the TransportConfig
+    :param ordered: yield in the order of items, False yields the results
+                    as the calls finish
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    def call(index, item):
+        try:
+            return BulkResult(index, item, func(item), None)
+        except Exception as error:
+            logger.debug('Bulk call failed for %r: %s', item, error)
+            return BulkResult(index, item, None, error)
+
+    items = enumerate(items)
+    # a few more than concurrency so the workers do not wait for the
+    # consumer, in order mode a slow call holds back the ones after it
+    window = concurrency * 2
+    pending = deque()
+    executor = ThreadPoolExecutor(
+        concurrency, thread_name_prefix='epages-bulk')
+    try:
+        while True:
+            for index, item in items:
+                pending.append(executor.submit(call, index, item))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            if ordered:
+                yield pending.popleft().result()
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
+    finally:
+        # stopped early, do not start the calls not yet running
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_bulk_async(func, items, concurrency=DEFAULT_CONCURRENCY,
+                         ordered=True):
+    """ run_bulk for functions returning awaitables, an async generator of
+    BulkResults running the calls as tasks of the event loop
+
+    The parameters are the ones of run_bulk. """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(index, item):
+        async with semaphore:
+            try:
+                result = func(item)
+                if inspect.isawaitable(result):
+                    result = await result
+                return BulkResult(index, item, result, None)
+            except Exception as error:
+                logger.debug('Bulk call failed for %r: %s', item, error)
+                return BulkResult(index, item, None, error)
+
+    items = enumerate(items)
+    window = concurrency * 2
+    pending = deque()
+    try:
+        while True:
+            for index, item in items:
+                pending.append(asyncio.ensure_future(call(index, item)))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            if ordered:
+                yield await pending.popleft()
+                continue
+            done, _ = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.remove(task)
+                yield task.result()
+    finally:
+        # stopped early, cancel the calls still running
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,138 @@
+"""
+Offline copies of the ePages wsdl files
+
+The services can load their wsdl from local files instead of the servers
+/WebRoot/WSDL/ with ``wsdl_source``:
+
+* ``"server"``: load from the server (default)
+* a directory: load from copies made with ``epages-bundle``
+
+No copies come with the package, make them from a server of the ePages
+version you talk to. The copies are already patched by LocalSchemaTransport
+and their imports point to the neighbouring files, so nothing is fetched
+over the network. The files are kept side by side under their own names,
+documents with the same name in different places are refused.
+
+Make a copy of the wsdl files with::
+
+    epages-bundle --server example.com --output /var/lib/epages/wsdl/
+"""
+import argparse
+import logging
+import os
+import posixpath
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+from zeep import Client, Settings
+
+from .zeep_utils import LocalSchemaTransport, SOAP_ENCODING_URL
+
+logger = logging.getLogger(__name__)
+
+#: wsdl files of the known service versions
+BUNDLE_FILES = (
+    'ShopConfigService12.wsdl',
+    'SimpleProvisioningService6.wsdl',
+    'FeaturePackService.wsdl',
+)
+
+
+def local_wsdl_path(filename, directory):
+    """ path of the wsdl file in a directory made with epages-bundle """
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        raise ValueError(
+            "No local copy of {} in {}, make one with epages-bundle".format(
+                filename, directory))
+    return path
+
+
+class _RecordingTransport(LocalSchemaTransport):
+    """ keeps the (patched) content of every remote document loaded """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.documents = {}
+
+    def load(self, url):
+        content = super().load(url)
+        if url != SOAP_ENCODING_URL and \
+                urlparse(url).scheme in ('http', 'https'):
+            self.documents[url] = content
+        return content
+
+
+def _local_names(urls):
+    """ the file name of every document url, raises ValueError when two
+    of them would overwrite each other """
+    names = {}
+    seen = {}
+    for url in urls:
+        name = posixpath.basename(urlparse(url).path)
+        if name in seen:
+            raise ValueError("{} and {} would both be written to {}".format(
+                seen[name], url, name))
+        seen[name] = url
+        names[url] = name
+    return names
+
+
+def _localize(url, content, names):
+    """ point the imports of the document to the local file names """
+    doc = etree.fromstring(content)
+    for element in doc.iter(etree.Element):
+        for attribute in ('schemaLocation', 'location'):
+            location = element.get(attribute)
+            if location is None:
+                continue
+            target = urljoin(url, location)
+            if target in names:
+                element.set(attribute, names[target])
+    return etree.tostring(doc, xml_declaration=True, encoding='UTF-8')
+
+
+def build_bundle(server, directory, files=BUNDLE_FILES):
+    """ download the wsdl files and everything they import to directory
+
+    returns the list of files written """
+    if urlparse(server).scheme == "":
+        server = "https://{}".format(server)
+    os.makedirs(directory, exist_ok=True)
+
+    transport = _RecordingTransport()
+    for filename in files:
+        url = "{}/WebRoot/WSDL/{}".format(server, filename)
+        logger.debug('Bundling %s', url)
+        Client(wsdl=url, transport=transport,
+               settings=Settings(strict=False))
+
+    names = _local_names(transport.documents)
+    written = []
+    for url, content in transport.documents.items():
+        path = os.path.join(directory, names[url])
+        with open(path, 'wb') as fh:
+            fh.write(_localize(url, content, names))
+        written.append(path)
+    return written
+
+
+def main(argv=None):
+    """ copy the wsdl files from the command line """
+    parser = argparse.ArgumentParser(
+        description="Copy the ePages wsdl files for offline use")
+    parser.add_argument('--server', required=True)
+    parser.add_argument('--output', required=True,
+                        help="directory for the files")
+    parser.add_argument('--file', action='append',
+                        help="wsdl file to copy, defaults to {}".format(
+                            ", ".join(BUNDLE_FILES)))
+    args = parser.parse_args(argv)
+
+    for path in build_bundle(args.server, args.output,
+                             args.file or BUNDLE_FILES):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
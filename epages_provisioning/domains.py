@@ -0,0 +1,249 @@
+"""
+Hostnames to shops
+
+DomainIndex maps the DomainName and SecondaryDomains of the shops to their
+aliases, for routing incoming requests. The domains are kept in a trie of
+their labels from the right, so that besides the exact domains it can find
+wildcard domains and the nearest parent domain of a hostname:
+
+    domains = DomainIndex().load(sc)
+    domains.resolve('www.demo.example')          # exact or *.demo.example
+    domains.resolve('x.demo.example', suffix=True)
+    domains.duplicates()
+
+With watch the index follows the changes made through the service, also
+the ones of Shop.apply and rename:
+
+    domains.watch(sc)
+    sc.set_secondary_domains(shopref, sc.get_secondarydomains_obj([...]))
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = '*'
+
+
+class _Node(object):
+    """ one label, the aliases of the domain ending here and the labels
+    before it """
+
+    __slots__ = ('children', 'aliases')
+
+    def __init__(self):
+        self.children = {}
+        # used as an ordered set, the first alias wins
+        self.aliases = {}
+
+
+class DomainIndex(object):
+    """ domains of the shops, by labels from the right
+
+    Wildcard domains like ``*.demo.example`` match any hostname below
+    demo.example, the one closest to the hostname wins. Domains held by more
+    than one shop resolve to the shop that got it first and are listed by
+    duplicates.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        # alias to (DomainName, SecondaryDomains) as indexed
+        self._shops = {}
+        self._duplicates = set()
+        self._lock = threading.RLock()
+
+    def load(self, provisioning):
+        """ add the domains of all shops, streamed from getAllInfo """
+        self.add_shops(provisioning.iter_all_info(
+            ['Alias', 'DomainName', 'SecondaryDomains']))
+        return self
+
+    def add_shops(self, shops):
+        """ add ShopRecords, getInfo/getAllInfo results or dicts of them """
+        for shop in shops:
+            if isinstance(shop, dict):
+                self.set_shop(shop.get('Alias'), shop.get('DomainName'),
+                              shop.get('SecondaryDomains'))
+            else:
+                self.set_shop(shop.Alias, shop.DomainName,
+                              shop.SecondaryDomains)
+
+    def set_shop(self, alias, domain_name=None, secondary_domains=None):
+        """ index the domains of the shop in place of the ones it had """
+        secondary = tuple(secondary_domains or ())
+        with self._lock:
+            self._remove(alias)
+            self._shops[alias] = (domain_name, secondary)
+            for domain in _shop_domains(domain_name, secondary):
+                self._add(domain, alias)
+
+    def set_domain_name(self, alias, domain_name):
+        with self._lock:
+            _, secondary = self._shops.get(alias, (None, ()))
+            self.set_shop(alias, domain_name, secondary)
+
+    def set_secondary_domains(self, alias, secondary_domains):
+        with self._lock:
+            domain_name, _ = self._shops.get(alias, (None, ()))
+            self.set_shop(alias, domain_name, secondary_domains)
+
+    def rename_shop(self, alias, new_alias):
+        with self._lock:
+            domains = self._shops.get(alias)
+            if domains is not None:
+                self._remove(alias)
+                self.set_shop(new_alias, *domains)
+
+    def remove_shop(self, alias):
+        with self._lock:
+            self._remove(alias)
+
+    def domains_of(self, alias):
+        """ the DomainName and SecondaryDomains indexed for the shop """
+        return self._shops.get(alias)
+
+    def __len__(self):
+        """ number of shops """
+        return len(self._shops)
+
+    def resolve(self, hostname, wildcard=True, suffix=False):
+        """ alias of the shop for the hostname, None if there is none
+
+        :param wildcard: fall back to the closest wildcard domain
+        :param suffix: fall back to the closest parent domain of a shop,
+                       e.g. demo.example for shop.demo.example
+        """
+        labels = _labels(hostname)
+        with self._lock:
+            node = self._root
+            closest_wildcard = closest_parent = None
+            for depth, label in enumerate(labels):
+                if node.aliases and depth:
+                    closest_parent = node
+                star = node.children.get(WILDCARD)
+                if star is not None and star.aliases:
+                    closest_wildcard = star
+                node = node.children.get(label)
+                if node is None:
+                    break
+            else:
+                if node.aliases:
+                    return next(iter(node.aliases))
+            if wildcard and closest_wildcard is not None:
+                return next(iter(closest_wildcard.aliases))
+            if suffix and closest_parent is not None:
+                return next(iter(closest_parent.aliases))
+        return None
+
+    def aliases(self, domain):
+        """ all shops with exactly this domain """
+        with self._lock:
+            node = self._node(_labels(domain))
+            return list(node.aliases) if node is not None else []
+
+    def under(self, domain):
+        """ the domains at and below domain, as a dict of the domains to
+        their aliases """
+        labels = _labels(domain)
+        found = {}
+        with self._lock:
+            node = self._node(labels)
+            if node is not None:
+                _collect(node, labels, found)
+        return found
+
+    def duplicates(self):
+        """ the domains of more than one shop, with their aliases """
+        with self._lock:
+            return {domain: self.aliases(domain)
+                    for domain in sorted(self._duplicates)}
+
+    def watch(self, provisioning):
+        """ follow the changes made through the ShopConfigService """
+        provisioning.add_listener(self._changed)
+        return self
+
+    def unwatch(self, provisioning):
+        provisioning.remove_listener(self._changed)
+
+    def _changed(self, operation, shop, *arguments):
+        alias = shop.Alias
+        if operation == 'create':
+            self.set_shop(alias, shop.DomainName, shop.SecondaryDomains)
+        elif operation == 'update':
+            if shop.DomainName is not None:
+                self.set_domain_name(alias, shop.DomainName)
+            if shop.SecondaryDomains is not None:
+                self.set_secondary_domains(alias, shop.SecondaryDomains)
+            new_alias = getattr(shop, 'NewAlias', None)
+            if new_alias:
+                self.rename_shop(alias, new_alias)
+        elif operation == 'setSecondaryDomains':
+            self.set_secondary_domains(alias, list(arguments[0]))
+        elif operation in ('delete', 'deleteShopRef'):
+            self.remove_shop(alias)
+
+    def _node(self, labels):
+        node = self._root
+        for label in labels:
+            node = node.children.get(label)
+            if node is None:
+                return None
+        return node
+
+    def _add(self, domain, alias):
+        node = self._root
+        for label in _labels(domain):
+            node = node.children.setdefault(label, _Node())
+        if node.aliases and alias not in node.aliases:
+            logger.warning('Domain %s of %s is already used by %s',
+                           domain, alias, ', '.join(node.aliases))
+            self._duplicates.add(domain)
+        node.aliases[alias] = None
+
+    def _remove(self, alias):
+        domains = self._shops.pop(alias, None)
+        if domains is None:
+            return
+        for domain in _shop_domains(*domains):
+            labels = _labels(domain)
+            path = [self._root]
+            for label in labels:
+                path.append(path[-1].children[label])
+            path[-1].aliases.pop(alias, None)
+            if len(path[-1].aliases) < 2:
+                self._duplicates.discard(domain)
+            # drop the nodes nothing ends at or below anymore
+            for parent, label, node in zip(
+                    reversed(path[:-1]), reversed(labels), reversed(path[1:])):
+                if node.aliases or node.children:
+                    break
+                del parent.children[label]
+
+
+def normalize(hostname):
+    """ hostname in lower case without port and trailing dot """
+    hostname = hostname.strip().lower()
+    if hostname.count(':') == 1:
+        hostname = hostname.split(':', 1)[0]
+    return hostname.rstrip('.')
+
+
+def _labels(domain):
+    """ the labels of the domain from the right """
+    return [label for label in reversed(normalize(domain).split('.'))
+            if label]
+
+
+def _shop_domains(domain_name, secondary_domains):
+    domains = [domain_name] + list(secondary_domains)
+    return list(dict.fromkeys(
+        normalize(domain) for domain in domains if domain))
+
+
+def _collect(node, labels, found):
+    if node.aliases:
+        found['.'.join(reversed(labels))] = list(node.aliases)
+    for label, child in node.children.items():
+        _collect(child, labels + [label], found)
@@ -1,43 +1,133 @@
 import logging
+import threading
 from zeep import Client, Settings
-from zeep.transports import Transport
+from zeep.helpers import serialize_object
+from zeep.wsdl import Document
 from requests.auth import HTTPBasicAuth
-from requests import Session
 
-from .zeep_utils import BooleanFixer, ArrayFixer, LocalSchemaTransport
+from .bundle import local_wsdl_path
+from .snapshot import load_document, save_document, snapshot_key
+from .templates import TemplateError, Templates, read_fields, select_fields
+from .transport import TransportConfig
+from .zeep_utils import EnvelopeFixer, schema_registry
 
 logger = logging.getLogger(__name__)
 
 class FeaturePackService:
-    def __init__(self, server, provider, username, password):
-        wsdl_url = f"{server}/WebRoot/WSDL/FeaturePackService.wsdl"
-        if not wsdl_url.startswith("http"):
-            wsdl_url = "https://" + wsdl_url
+    _client_class = Client
+
+    def __init__(self, server, provider, username, password, cache=None,
+                 snapshot=None, wsdl_source="server", lazy=False,
+                 shared=False, transport_config=None):
+        if not server:
+            raise ValueError("server is required")
+        if wsdl_source == "server":
+            wsdl_url = f"{server}/WebRoot/WSDL/FeaturePackService.wsdl"
+            if not wsdl_url.startswith("http"):
+                wsdl_url = "https://" + wsdl_url
+        else:
+            wsdl_url = local_wsdl_path("FeaturePackService.wsdl", wsdl_source)
+        self.wsdl = wsdl_url
         self.provider = provider
         self.username = username
         self.password = password
         self.userpath = self._build_full_username()
         self.server = server
+        self.cache = cache
+        self.snapshot = snapshot
+        self.wsdl_source = wsdl_source
+        self.lazy = lazy
+        self.shared = shared
+        self.transport_config = transport_config or TransportConfig()
         self.endpoint = self._build_endpoint_from_server()
-        session = Session()
-        session.auth = HTTPBasicAuth(self.userpath, self.password)
 
+        self._client = None
+        self._service2 = None
+        self._client_lock = threading.Lock()
+        self._types = {}
+        self._templates = Templates()
+
+        if not lazy:
+            self.warm_up()
+
+    @property
+    def client(self):
+        """ zeep client, loads the wsdl on first use in lazy mode """
+        if self._client is None:
+            self.warm_up()
+        return self._client
+
+    @property
+    def service2(self):
+        """ zeep service bound to our endpoint """
+        if self._service2 is None:
+            self.warm_up()
+        return self._service2
+
+    def warm_up(self):
+        """ load the wsdl and create the client now, if not done yet """
+        with self._client_lock:
+            if self._client is None:
+                self._create_client()
+        return self
+
+    def _create_client(self):
         settings = Settings(
             strict=False,
         )
         # Plugins instances
-        arrayfixer = ArrayFixer()
-        booleanfixer = BooleanFixer()
+        envelopefixer = EnvelopeFixer()
+
+        transport = self._create_transport()
+
+        def load():
+            # use the compiled wsdl from the snapshot if we have one
+            if self.snapshot:
+                return load_document(
+                    self.snapshot, self._snapshot_key(), transport, settings)
+            return Document(self.wsdl, transport, settings=settings)
 
-        self.client = Client(
-            wsdl=wsdl_url,
+        if self.shared:
+            wsdl = schema_registry.get((self.wsdl, "", self.snapshot), load)
+        else:
+            wsdl = load()
+
+        client = self._client_class(
+            wsdl=wsdl,
             settings=settings,
-            transport=LocalSchemaTransport(session=session),
-            plugins=[arrayfixer, booleanfixer]
+            transport=transport,
+            plugins=[envelopefixer]
         )
-        qname = next(iter(self.client.wsdl.bindings))
+        qname = next(iter(client.wsdl.bindings))
         logger.debug(f"Binding: {qname}")
-        self.service2 = self.client.create_service(qname, self.endpoint)
+        self._service2 = self._create_service(client, qname)
+        self._client = client
+
+    def _create_transport(self):
+        return self.transport_config.create_transport(
+            auth=HTTPBasicAuth(self.userpath, self.password), cache=self.cache)
+
+    def _create_service(self, client, qname):
+        return client.create_service(qname, self.endpoint)
+
+    def _get_type(self, name):
+        """ zeep type by its prefixed name, looked up once per service """
+        xsd_type = self._types.get(name)
+        if xsd_type is None:
+            xsd_type = self._types[name] = self.client.get_type(name)
+        return xsd_type
+
+    @classmethod
+    def from_snapshot(cls, path, **kwargs):
+        """ create the service from a snapshot built with save_snapshot """
+        return cls(snapshot=path, **kwargs)
+
+    def save_snapshot(self, path):
+        """ save the compiled wsdl to path for from_snapshot """
+        save_document(self.client.wsdl, path, self._snapshot_key())
+
+    def _snapshot_key(self):
+        return snapshot_key(self.server, self.__class__.__name__)
 
     def _build_endpoint_from_server(self):
         """ Build endpoint url from server """
@@ -52,34 +142,66 @@ class FeaturePackService:
 
     def getInfoMultiple(self, features: list[str], language: str | list[str] = ["en"]):
         """ Get information about multiple feature packs. Note that it still requires the aliases """
-        getinfo_type = self.client.get_type("ns0:type_GetInfo_In")
+        getinfo_type = self._get_type("ns0:type_GetInfo_In")
         path = [f"/Providers/{self.provider}/FeaturePacks/{feature}" for feature in features]
         getinfo = getinfo_type(path)
-        attributenames_type = self.client.get_type("ns0:type_AttributeNames_In")
+        attributenames_type = self._get_type("ns0:type_AttributeNames_In")
 
         # Can fetch more attributes, that ePages doesn't return by default.
         # By default it doesn't return the alias, so let's at least return that.
         attributenames = attributenames_type(['Alias'])
 
-        language_code_type = self.client.get_type("ns0:type_LanguageCodes_In")
+        language_code_type = self._get_type("ns0:type_LanguageCodes_In")
         language_code = language_code_type([language] if isinstance(language, str) else language)
         feature = self.service2.getInfo(getinfo, attributenames, language_code)
         return feature
 
+    def getInfoFields(self, feature: str, fields: list[str] | None = None,
+                      language: str | list[str] = "en"):
+        """ getInfo of one feature pack as a dict of the requested fields,
+        without building the envelope with zeep """
+        languages = [language] if isinstance(language, str) else list(language)
+        path = f"/Providers/{self.provider}/FeaturePacks/{feature}"
+        template = self._get_info_template(languages)
+        try:
+            if template is not None:
+                response = template.call(path)
+                item_type = template.result_type()._array_type.array_type
+                return read_fields(response[0][0], item_type, fields)
+        except TemplateError:
+            pass
+        info = self.getInfo(feature, languages)
+        return select_fields(serialize_object(info), fields)
+
+    def _get_info_template(self, languages):
+        """ getInfo template with the path as the value, the languages are
+        part of the template so there is one per language list """
+        def build(path):
+            return [
+                self._get_type("ns0:type_GetInfo_In")([path]),
+                self._get_type("ns0:type_AttributeNames_In")(['Alias']),
+                self._get_type("ns0:type_LanguageCodes_In")(languages),
+            ]
+
+        return self._templates.get(
+            ("getInfo", tuple(languages)), self.client, self.service2,
+            "getInfo", build)
+
     def applyToShop(self, feature: str, shop: str):
         """ Apply a feature pack to a specific shop. """
-        input_type = self.client.get_type("ns1:TApplyToShop_Input")
-        feature_path = f"/Providers/{self.provider}/FeaturePacks/{feature}"
-        shop_path = f"/Providers/{self.provider}/ShopRefs/{shop}"
-        pair = input_type(feature_path, shop_path)
+        input_type = self._get_type("ns1:TApplyToShop_Input")
+        pair = input_type(*self._feature_shop_paths(feature, shop))
         result = self.service2.applyToShop(pair)
         return result[0]
 
     def removeFromShop(self, feature: str, shop: str):
         """ Remove a feature pack from a specific shop. """
-        input_type = self.client.get_type("ns1:TRemoveFromShop_Input")
-        feature_path = f"/Providers/{self.provider}/FeaturePacks/{feature}"
-        shop_path = f"/Providers/{self.provider}/ShopRefs/{shop}"
-        pair = input_type(feature_path, shop_path)
+        input_type = self._get_type("ns1:TRemoveFromShop_Input")
+        pair = input_type(*self._feature_shop_paths(feature, shop))
         result = self.service2.removeFromShop(pair)
         return result[0]
+
+    def _feature_shop_paths(self, feature: str, shop: str):
+        """ object paths of the feature pack and the shop """
+        return (f"/Providers/{self.provider}/FeaturePacks/{feature}",
+                f"/Providers/{self.provider}/ShopRefs/{shop}")
@@ -0,0 +1,295 @@
+"""
+Deadlines and hedged requests
+
+A deadline is the time a whole call may take, waiting for the limiter
+included. The transports cap the connect and read timeouts of the call by
+what is left of it and raise DeadlineExceeded when it runs out:
+
+    config = TransportConfig(deadlines={'exists': 1, 'getInfo': 2})
+
+Hedging sends a second copy of a call that is taking longer than most calls
+of the same operation, and uses whichever answer comes first. It is only
+allowed for operations that can be sent twice without harm, exists and
+getInfo (also getInfoMultiple of the FeaturePackService) by default:
+
+    config = TransportConfig(deadlines={'exists': 1},
+                             hedging=Hedging(percentile=95))
+
+The second copy is sent after the given percentile of the latencies seen,
+at most for max_ratio of the calls so that a slow server does not get
+twice the load.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# operations that only read, sending them twice does no harm
+IDEMPOTENT_OPERATIONS = frozenset(('exists', 'getInfo'))
+
+# operations that change something, these are never hedged
+MUTATING_OPERATIONS = frozenset((
+    'create', 'update', 'delete', 'deleteShopRef', 'setSecondaryDomains',
+    'markForDeletion', 'rename', 'applyToShop', 'removeFromShop',
+))
+
+
+class DeadlineExceeded(TimeoutError):
+    """ the deadline of the operation ran out """
+
+
+def deadline_end(deadline):
+    """ time.monotonic when deadline seconds from now have passed """
+    if deadline is None:
+        return None
+    return time.monotonic() + deadline
+
+
+def remaining(end):
+    """ seconds left until end (time.monotonic), None for no deadline """
+    if end is None:
+        return None
+    left = end - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return left
+
+
+def cap_timeout(timeout, left):
+    """ timeout (seconds or a (connect, read) tuple) capped to left """
+    if left is None:
+        return timeout
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(min(value, left) for value in timeout)
+    return min(timeout, left)
+
+
+class Hedging(object):
+    """ send a second copy of slow idempotent calls
+
+    :param operations: operation names that may be hedged, mutating
+                       operations are refused
+    :param percentile: hedge after this percentile of the latencies of
+                       the operation
+    :param min_delay: never hedge sooner than this many seconds
+    :param initial_delay: delay until enough latencies have been seen
+    :param max_ratio: hedge at most this part of the calls
+    :param window: latencies kept per operation
+    :param max_workers: threads of the blocking services sending the calls,
+                        calls beyond wait for a free one, which counts
+                        towards their deadline but not the hedge delay
+    """
+
+    # latencies needed before the percentile is used
+    min_samples = 20
+
+    def __init__(
+            self,
+            operations=IDEMPOTENT_OPERATIONS,
+            percentile=95,
+            min_delay=0.005,
+            initial_delay=0.1,
+            max_ratio=0.1,
+            window=500,
+            max_workers=32):
+        mutating = MUTATING_OPERATIONS.intersection(operations)
+        if mutating:
+            raise ValueError("Mutating operations can not be hedged: {}"
+                             .format(', '.join(sorted(mutating))))
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        self.operations = frozenset(operations)
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.max_ratio = max_ratio
+        self.max_workers = max_workers
+
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._recorded = defaultdict(int)
+        self._delays = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadlines_exceeded = 0
+
+    def applies(self, operation):
+        """ may operation be hedged """
+        return operation in self.operations
+
+    def delay(self, operation):
+        """ seconds to wait before sending the second copy """
+        delay = self._delays.get(operation)
+        if delay is None:
+            return max(self.initial_delay, self.min_delay)
+        return delay
+
+    def record(self, operation, latency):
+        """ add the latency of a successful call """
+        with self._lock:
+            latencies = self._latencies[operation]
+            latencies.append(latency)
+            self._recorded[operation] += 1
+            # sorting on every call would cost more than it is worth
+            if len(latencies) >= self.min_samples and (
+                    operation not in self._delays or
+                    self._recorded[operation] % 10 == 0):
+                ordered = sorted(latencies)
+                index = int(len(ordered) * self.percentile / 100)
+                self._delays[operation] = max(
+                    ordered[min(index, len(ordered) - 1)], self.min_delay)
+
+    def stats(self):
+        """ the numbers for monitoring as a dict """
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'deadlines_exceeded': self.deadlines_exceeded,
+                'delays': dict(self._delays),
+            }
+
+    def _may_hedge(self):
+        """ count a hedge if there is room for one """
+        with self._lock:
+            if self.hedges < self.max_ratio * self.calls:
+                self.hedges += 1
+                return True
+        return False
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _timed(self, send, operation, started=None):
+        if started is not None:
+            started.set()
+        start = time.monotonic()
+        response = send()
+        self.record(operation, time.monotonic() - start)
+        return response
+
+    @property
+    def executor(self):
+        """ threads for the blocking calls, created on first use """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='epages-hedging')
+        return self._executor
+
+    def send(self, send, operation, end=None):
+        """ call send(), and again if it is slow, returns the first
+        response. end is the deadline as time.monotonic """
+        self._count('calls')
+        started = threading.Event()
+        primary = self.executor.submit(
+            self._timed, send, operation, started)
+        attempts = [primary]
+        try:
+            # the delay runs from when the primary is sent, waiting for a
+            # free thread of the executor does not make it slow
+            started.wait(remaining(end))
+            left = remaining(end)
+            delay = self.delay(operation)
+            done, _ = wait(attempts, timeout=(
+                delay if left is None else min(delay, left)))
+            if not done:
+                # raises when the deadline ran out meanwhile
+                remaining(end)
+                if self._may_hedge():
+                    logger.debug('Hedging %s after %.3f s', operation, delay)
+                    attempts.append(
+                        self.executor.submit(self._timed, send, operation))
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = wait(pending, timeout=remaining(end),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(
+                        "Deadline of {} exceeded".format(operation))
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            self._count('hedge_wins')
+                        for other in pending:
+                            other.add_done_callback(_close_response)
+                        return future.result()
+                    error = error or future.exception()
+            raise error
+        except DeadlineExceeded:
+            self._count('deadlines_exceeded')
+            for attempt in attempts:
+                # not sent yet if still waiting for a thread
+                attempt.cancel()
+                attempt.add_done_callback(_close_response)
+            raise
+
+    async def send_async(self, send, operation, end=None):
+        """ send for coroutines, send() returns an awaitable. The slower
+        copy is cancelled """
+        self._count('calls')
+
+        async def timed():
+            start = time.monotonic()
+            response = await send()
+            self.record(operation, time.monotonic() - start)
+            return response
+
+        primary = asyncio.ensure_future(timed())
+        attempts = [primary]
+        try:
+            left = remaining(end)
+            delay = self.delay(operation)
+            done, _ = await asyncio.wait(attempts, timeout=(
+                delay if left is None else min(delay, left)))
+            if not done:
+                remaining(end)
+                if self._may_hedge():
+                    logger.debug('Hedging %s after %.3f s', operation, delay)
+                    attempts.append(asyncio.ensure_future(timed()))
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining(end),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(
+                        "Deadline of {} exceeded".format(operation))
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count('hedge_wins')
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        except DeadlineExceeded:
+            self._count('deadlines_exceeded')
+            raise
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def close(self):
+        """ stop the threads """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _close_response(future):
+    """ close the response of a copy nobody waits for anymore """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
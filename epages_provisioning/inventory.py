@@ -0,0 +1,188 @@
+"""
+Indexed shops of a provider
+
+ShopInventory loads all shops with one getAllInfo and indexes them, so that
+questions like "the shops of type X" or "the shop of this domain" are
+dictionary lookups instead of a getAllInfo and a scan each:
+
+    inventory = ShopInventory(sc).load()
+    inventory.find(ShopType='MinDemo', IsClosed=False)
+    inventory.by_domain('www.demo.example')
+    inventory.by_email('owner@demo.example')
+
+The shops are kept as ShopRecords. After changing a shop through Shop put
+it back with update, or read one shop again with refresh:
+
+    shop.apply()
+    inventory.update(shop)
+    inventory.refresh('DemoShop')
+"""
+import threading
+
+from zeep.exceptions import Fault
+
+from .records import ShopRecord
+from .shop import Shop
+
+# keys find can look up, the domains and e-mail have their own indexes
+INDEXED_KEYS = frozenset((
+    'ShopType', 'IsClosed', 'IsClosedTemporarily', 'IsTrialShop',
+    'IsInternalTestShop', 'Provider', 'Database',
+))
+
+
+class ShopInventory(object):
+    """ ShopRecords with indexes on the alias, the domains, the merchant
+    e-mail, the shop type and the flags
+
+    :param provisioning: ShopConfigService used by load and refresh
+    :param records: ShopRecords to start with instead of calling load
+
+    Lookups of domains and e-mails ignore the case. The results of find
+    are in the order the shops were added.
+    """
+
+    def __init__(self, provisioning=None, records=()):
+        self.sc = provisioning
+        self._lock = threading.RLock()
+        self._clear()
+        for record in records:
+            self._add(record)
+
+    def _clear(self):
+        self._shops = {}
+        # value to the aliases, dicts are used as ordered sets
+        self._indexes = {key: {} for key in INDEXED_KEYS}
+        self._domains = {}
+        self._emails = {}
+
+    def load(self):
+        """ replace the shops with the ones getAllInfo returns """
+        records = [ShopRecord.from_info(shop)
+                   for shop in self.sc.iter_all_info()]
+        with self._lock:
+            self._clear()
+            for record in records:
+                self._add(record)
+        return self
+
+    def __len__(self):
+        return len(self._shops)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._shops.values()))
+
+    def __contains__(self, alias):
+        return alias in self._shops
+
+    def __getitem__(self, alias):
+        return self._shops[alias]
+
+    def get(self, alias, default=None):
+        """ the record of the alias """
+        return self._shops.get(alias, default)
+
+    def find(self, **criteria):
+        """ the shops with all the given values
+
+        inventory.find(ShopType='MinDemo', IsTrialShop=True)
+        """
+        unknown = set(criteria).difference(INDEXED_KEYS)
+        if unknown:
+            raise ValueError("Not indexed: {}".format(
+                ', '.join(sorted(unknown))))
+        with self._lock:
+            matches = sorted(
+                (self._indexes[key].get(value, {})
+                 for key, value in criteria.items()), key=len)
+            if not matches:
+                return list(self._shops.values())
+            smallest, others = matches[0], matches[1:]
+            return [self._shops[alias] for alias in smallest
+                    if all(alias in other for other in others)]
+
+    def by_domain(self, domain):
+        """ the shop with domain as DomainName or one of its
+        SecondaryDomains, None if there is none """
+        with self._lock:
+            aliases = self._domains.get(_normalize(domain))
+            return self._shops[next(iter(aliases))] if aliases else None
+
+    def by_email(self, email):
+        """ the shops of the merchant e-mail """
+        with self._lock:
+            return [self._shops[alias]
+                    for alias in self._emails.get(_normalize(email), ())]
+
+    def update(self, shop, previous_alias=None):
+        """ put the values of a Shop or ShopRecord in place of the ones
+        kept, without calls to the server. Pass previous_alias for a shop
+        that was renamed """
+        record = shop
+        if not isinstance(record, ShopRecord):
+            record = ShopRecord.from_shop(shop)
+        with self._lock:
+            if previous_alias is not None:
+                self._remove(previous_alias)
+            self._remove(record.Alias)
+            self._add(record)
+        return record
+
+    def refresh(self, alias):
+        """ read one shop from the server again, a shop that does not
+        exist anymore is removed. Returns the record or None """
+        try:
+            info = self.sc.get_info_fields(alias)
+        except Fault as error:
+            if not Shop.missing_fault.search(error.message or ''):
+                raise
+            self.remove(alias)
+            return None
+        return self.update(ShopRecord.from_info(info))
+
+    def remove(self, alias):
+        """ forget the shop, returns its record or None """
+        with self._lock:
+            return self._remove(alias)
+
+    def _add(self, record):
+        alias = record.Alias
+        self._shops[alias] = record
+        for key, index in self._indexes.items():
+            index.setdefault(getattr(record, key), {})[alias] = None
+        for domain in _domains(record):
+            self._domains.setdefault(domain, {})[alias] = None
+        if record.MerchantEMail:
+            self._emails.setdefault(
+                _normalize(record.MerchantEMail), {})[alias] = None
+
+    def _remove(self, alias):
+        record = self._shops.pop(alias, None)
+        if record is None:
+            return None
+        for key, index in self._indexes.items():
+            _discard(index, getattr(record, key), alias)
+        for domain in _domains(record):
+            _discard(self._domains, domain, alias)
+        if record.MerchantEMail:
+            _discard(self._emails, _normalize(record.MerchantEMail), alias)
+        return record
+
+
+def _normalize(value):
+    return value.strip().lower()
+
+
+def _domains(record):
+    domains = [record.DomainName] + list(record.SecondaryDomains)
+    return {_normalize(domain) for domain in domains if domain}
+
+
+def _discard(index, value, alias):
+    """ drop alias from the index, and the value once it has none """
+    aliases = index.get(value)
+    if aliases is not None:
+        aliases.pop(alias, None)
+        if not aliases:
+            del index[value]
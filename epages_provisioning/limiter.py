@@ -0,0 +1,284 @@
+"""
+Adaptive limit of the calls running at the same time
+
+ePages slows down badly when it gets more calls than it can handle. An
+AdaptiveLimiter in the TransportConfig lets only `limit` calls of its
+services run at the same time, the others wait for a free slot. The limit
+is adjusted with AIMD (additive increase, multiplicative decrease): every
+call that finishes in time while the limiter is busy raises it by
+1 / limit, so by about one per round of calls. Calls that fail (connection
+errors, timeouts, 429/502/503/504) halve it, calls slower than the latency
+threshold lower it by a tenth:
+
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=64)
+    config = TransportConfig(pool_maxsize=64, limiter=limiter)
+    sc = ShopConfigService(..., transport_config=config)
+
+    limiter.limit, limiter.in_flight, limiter.queue_depth
+
+Without a latency_threshold a call is slow when it takes tolerance times
+longer than the fastest call of the last few hundred, start with a limit the
+server can handle so that it sees some fast calls. SOAP faults are answers of a
+working server and do not lower the limit.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger(__name__)
+
+# statuses of an overloaded server or proxy, 500 is what ePages uses for
+# SOAP faults
+OVERLOAD_STATUSES = frozenset((429, 502, 503, 504))
+
+
+class LimiterTimeout(Exception):
+    """ no slot became free in time """
+
+
+class _Call(object):
+    """ one call holding a slot, set failed for answers that show the
+    server is overloaded """
+
+    __slots__ = ('epoch', 'busy', 'failed')
+
+    def __init__(self, epoch, busy):
+        self.epoch = epoch
+        self.busy = busy
+        self.failed = False
+
+    def record(self, status_code):
+        """ mark the call failed if the status shows overload """
+        self.failed = status_code in OVERLOAD_STATUSES
+
+
+class AdaptiveLimiter(object):
+    """ AIMD limit of the calls in flight, share it between the services
+    talking to the same server
+
+    :param initial_limit: limit to start with
+    :param min_limit: the limit never goes below this
+    :param max_limit: the limit never goes above this, keep the
+                      pool_maxsize of the TransportConfig at least as high
+    :param backoff: factor for the limit after a failed call
+    :param slow_backoff: factor for the limit after a slow call
+    :param latency_threshold: seconds after which a call is slow, by
+                              default tolerance times the baseline latency
+    :param tolerance: slow calls take this many times the baseline
+    """
+
+    # calls faster than this are never slow, so that a baseline of a few
+    # milliseconds does not make every bit of jitter look like overload
+    min_latency_threshold = 0.05
+    # calls per window of the baseline
+    baseline_window = 200
+
+    def __init__(
+            self,
+            initial_limit=10,
+            min_limit=1,
+            max_limit=100,
+            backoff=0.5,
+            slow_backoff=0.9,
+            latency_threshold=None,
+            tolerance=2.0):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(
+                "Limits must be 1 <= min_limit <= initial_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.slow_backoff = slow_backoff
+        self.latency_threshold = latency_threshold
+        self.tolerance = tolerance
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._async_waiters = deque()
+        # calls started before the last decrease do not decrease it again
+        self._epoch = 0
+        self._baseline = None
+        self._window_min = self._previous_min = None
+        self._window_calls = 0
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self._lock = threading.Lock()
+        self._free = threading.Condition(self._lock)
+
+    @property
+    def limit(self):
+        """ calls allowed in flight now """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        """ calls holding a slot """
+        return self._in_flight
+
+    @property
+    def queue_depth(self):
+        """ calls waiting for a slot """
+        return self._waiting + len(self._async_waiters)
+
+    @property
+    def baseline(self):
+        """ latency of the fast calls, None before the first call """
+        return self._baseline
+
+    def stats(self):
+        """ the numbers for monitoring as a dict """
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'queue_depth': self.queue_depth,
+                'baseline': self._baseline,
+                'calls': self.calls,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+            }
+
+    @contextmanager
+    def call(self, timeout=None):
+        """ hold a slot for the block, waits for one if needed
+
+        Exceptions raised in the block count as failed calls, so do
+        call.record(response.status_code) for the answers.
+
+        with limiter.call() as call:
+            response = session.post(...)
+            call.record(response.status_code)
+        """
+        call = self._acquire(timeout)
+        start = time.monotonic()
+        try:
+            yield call
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            self._release(call, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def call_async(self):
+        """ call for coroutines, waits without blocking the event loop """
+        call = await self._acquire_async()
+        start = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # given up by the caller, says nothing about the server
+            raise
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            self._release(call, time.monotonic() - start)
+
+    def _acquire(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.limit:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise LimiterTimeout(
+                                "No free slot in {} seconds".format(timeout))
+                    self._free.wait(remaining)
+            finally:
+                self._waiting -= 1
+            return self._take()
+
+    async def _acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._in_flight < self.limit:
+                    return self._take()
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._async_waiters.remove(waiter)
+                    except ValueError:
+                        # woken already, pass the slot on
+                        self._wake_waiters()
+                raise
+
+    def _take(self):
+        """ take a slot, called with the lock held """
+        self._in_flight += 1
+        # only calls made while the limit is nearly used up say anything
+        # about whether a higher limit would still work
+        busy = self._in_flight * 2 > self.limit
+        return _Call(self._epoch, busy)
+
+    def _release(self, call, latency):
+        with self._lock:
+            self._in_flight -= 1
+            self.calls += 1
+            self._adjust(call, latency)
+            self._wake_waiters()
+
+    def _wake_waiters(self):
+        """ wake the waiters for the free slots, called with the lock
+        held. The woken ones check again, so waking too many is fine """
+        free = self.limit - self._in_flight
+        if free > 0:
+            self._free.notify(free)
+            for _ in range(min(free, len(self._async_waiters))):
+                loop, future = self._async_waiters.popleft()
+                loop.call_soon_threadsafe(_wake, future)
+
+    def _adjust(self, call, latency):
+        """ AIMD step for one finished call, called with the lock held """
+        if call.failed:
+            self.failures += 1
+            self._decrease(call, self.backoff, 'failed call')
+            return
+
+        # the fastest call of the last one or two windows, so that a
+        # backend that got slower for good becomes the new normal
+        if self._window_min is None or latency < self._window_min:
+            self._window_min = latency
+        self._window_calls += 1
+        if self._window_calls >= self.baseline_window:
+            self._previous_min = self._window_min
+            self._window_min = None
+            self._window_calls = 0
+        self._baseline = min(
+            value for value in (self._previous_min, self._window_min)
+            if value is not None)
+
+        threshold = self.latency_threshold
+        if threshold is None:
+            threshold = max(self.tolerance * self._baseline,
+                            self.min_latency_threshold)
+        if latency > threshold:
+            self.slow_calls += 1
+            self._decrease(call, self.slow_backoff, 'slow call')
+        elif call.busy and self._limit < self.max_limit:
+            self._limit = min(self._limit + 1 / self._limit, self.max_limit)
+
+    def _decrease(self, call, factor, reason):
+        if call.epoch != self._epoch:
+            return
+        self._epoch += 1
+        self._limit = max(self._limit * factor, self.min_limit)
+        logger.debug('Limit lowered to %d after a %s', self.limit, reason)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
@@ -3,18 +3,32 @@
 ePages provisioning service
 
 """
+import inspect
 import logging
+import posixpath
+import threading
+from contextlib import closing
 
 try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
 
-from requests import Session
 from requests.auth import HTTPBasicAuth
 from zeep import Client, Settings
-
-from .zeep_utils import BooleanFixer, ArrayFixer, LocalSchemaTransport
+from zeep.helpers import serialize_object
+from zeep.wsdl import Document
+
+from .bulk import DEFAULT_CONCURRENCY, run_bulk
+from .bundle import local_wsdl_path
+from .resultcache import shop_aliases
+from .snapshot import load_document, save_document, snapshot_key
+from .templates import (
+    TemplateError, Templates, iter_array, parse_response, read_fields,
+    read_value, select_fields
+)
+from .transport import TransportConfig
+from .zeep_utils import EnvelopeFixer, schema_registry
 
 logger = logging.getLogger(__name__)
 
@@ -27,23 +41,48 @@ class BaseProvisioningService(object):
     :param username: username
     :param password: password
     :param version: wsdl version number, defaults to latest version available
+    :param cache: zeep cache for the wsdl and xsd documents, for example
+                  zeep_utils.DocumentCache() to keep them on disk
+    :param snapshot: path to a snapshot built with save_snapshot, the wsdl
+                     is loaded from it instead of the server
+    :param wsdl_source: "server" or a directory made with
+                        epages-bundle, see bundle.py
+    :param lazy: load the wsdl on the first call instead of here
+    :param shared: share the parsed wsdl with the other services of this
+                   process using the same wsdl and version
+    :param transport_config: TransportConfig with the connection pool and
+                             timeout settings, share one between services to
+                             share the connections
+    :param result_cache: ResultCache for the results of get_info,
+                         get_info_fields, exists and alias_exists, see
+                         resultcache.py
     """
 
+    _client_class = Client
+
+    # operations return coroutines, also the cached results have to
+    _awaitable_results = False
+
     def __init__(
             self,
             server="",
             provider="",
             username="",
             password="",
-            version=""):
-
-        # TODO: add checks
-        # for key, value in locals().items():
-        #     if value is "":
-        #         raise ValueError('Argument %s required', key)
+            version="",
+            cache=None,
+            snapshot=None,
+            wsdl_source="server",
+            lazy=False,
+            shared=False,
+            transport_config=None,
+            result_cache=None):
 
         super(BaseProvisioningService, self).__init__()
 
+        if not server:
+            raise ValueError("server is required")
+
         self.server = server
         self._add_scheme_to_server()
 
@@ -51,35 +90,232 @@ class BaseProvisioningService(object):
         self.username = username
         self.password = password
         self.version = version
+        self.cache = cache
+        self.snapshot = snapshot
+        self.wsdl_source = wsdl_source
+        self.lazy = lazy
+        self.shared = shared
+        self.transport_config = transport_config or TransportConfig()
+        self.result_cache = result_cache
 
         self.endpoint = self._build_endpoint_from_server()
-        self.wsdl = self._build_wsdl_url_from_endpoint()
+        self.wsdl = self._build_wsdl_location()
         self.userpath = self._build_full_username()
 
-        # plugin for fixing the arrays
-        arrayfixer = ArrayFixer()
-        booleanfixer = BooleanFixer()
+        self._client = None
+        self._service2 = None
+        self._client_lock = threading.Lock()
+        self._types = {}
+        self._type_classes = {}
+        self._templates = Templates()
+
+        if not self.lazy:
+            self.warm_up()
+
+    @property
+    def client(self):
+        """ zeep client, loads the wsdl on first use in lazy mode """
+        if self._client is None:
+            self.warm_up()
+        return self._client
+
+    @property
+    def service2(self):
+        """ zeep service bound to our endpoint """
+        if self._service2 is None:
+            self.warm_up()
+        return self._service2
+
+    def warm_up(self):
+        """ load the wsdl and create the client now, if not done yet
+
+        Safe to call from several threads, the wsdl is loaded only once. """
+        with self._client_lock:
+            if self._client is None:
+                self._create_client()
+        return self
+
+    def _create_client(self):
+        """ load the wsdl and create client and service2 """
+        # plugin for fixing the arrays and booleans
+        envelopefixer = EnvelopeFixer()
 
         # initialize our client using basic auth and with the wsdl file
-        session = Session()
-        session.auth = HTTPBasicAuth(self.userpath, self.password)
         settings = Settings(
             strict=False,  # ePages wsdl files are full of errors...
         )
-        client = Client(
-            wsdl=self.wsdl,
+        transport = self._create_transport()
+
+        def load():
+            # use the compiled wsdl from the snapshot if we have one
+            if self.snapshot:
+                return load_document(
+                    self.snapshot, self._snapshot_key(), transport, settings)
+            return Document(self.wsdl, transport, settings=settings)
+
+        if self.shared:
+            wsdl = schema_registry.get(
+                (self.wsdl, self.version, self.snapshot), load)
+        else:
+            wsdl = load()
+
+        client = self._client_class(
+            wsdl=wsdl,
             settings=settings,
-            transport=LocalSchemaTransport(session=session),
-            plugins=[arrayfixer, booleanfixer]
+            transport=transport,
+            plugins=[envelopefixer]
         )
-        self.client = client
 
         # get the binding name, there is only one so this should be ok
         qname = next(iter(client.wsdl.bindings))
 
         # and create new service with the name pointing to our endpoint
-        self.service2 = client.create_service(qname, self.endpoint)
-        logger.debug('Initialized new client: %s', self.client)
+        # service2 is set before client, client is what the others check
+        self._service2 = self._create_service(client, qname)
+        self._client = client
+        logger.debug('Initialized new client: %s', self._client)
+
+    def _create_transport(self):
+        """ transport for the wsdl and the operations """
+        return self.transport_config.create_transport(
+            auth=HTTPBasicAuth(self.userpath, self.password),
+            cache=self.cache, version=self.version)
+
+    def _create_service(self, client, qname):
+        """ service proxy of the binding qname, bound to our endpoint """
+        return client.create_service(qname, self.endpoint)
+
+    def _get_type(self, name):
+        """ zeep type by its prefixed name, looked up once per service """
+        xsd_type = self._types.get(name)
+        if xsd_type is None:
+            xsd_type = self._types[name] = self.client.get_type(name)
+        return xsd_type
+
+    def _type_class(self, name):
+        """ class of the objects created from type name, for the
+        isinstance checks of the operations """
+        cls = self._type_classes.get(name)
+        if cls is None:
+            xsd_type = self._get_type(name)
+            try:
+                cls = type(xsd_type())
+            except TypeError:
+                # arrays need the items
+                cls = type(xsd_type([]))
+            self._type_classes[name] = cls
+        return cls
+
+    def _template(self, operation, build):
+        """ EnvelopeTemplate for operation with the alias as the only
+        value, None if zeep has to be used """
+        return self._templates.get(
+            operation, self.client, self.service2, operation, build)
+
+    def _cached(self, operation, request, call):
+        """ call() through the result_cache, request is the argument of the
+        operation """
+        if self.result_cache is None:
+            return call()
+        # services of other servers, providers or wsdls sharing the cache
+        # get other results
+        operation = '{} {} {} {}'.format(
+            self.endpoint, self.provider, posixpath.basename(self.wsdl),
+            operation)
+        return self.result_cache.call(
+            operation, request, call, self._awaitable_results)
+
+    def _forget(self, call, *shops):
+        """ call() writing the shops and drop their cached results, also
+        when it fails as the server may have made the change anyway. After
+        the coroutine of the async service when there is one """
+        cache = self.result_cache
+        if cache is None:
+            return call()
+        aliases = shop_aliases(shops)
+        try:
+            result = call()
+        except BaseException:
+            cache.invalidate(*aliases)
+            raise
+        if inspect.isawaitable(result):
+            async def forget():
+                try:
+                    return await result
+                finally:
+                    cache.invalidate(*aliases)
+            return forget()
+        cache.invalidate(*aliases)
+        return result
+
+    def alias_exists(self, alias):
+        """ exists for an alias, without building the envelope with zeep
+
+        sc.alias_exists('DemoShop')
+        """
+        return self._cached('exists', {'Alias': alias},
+                            lambda: self._alias_exists(alias))
+
+    def _alias_exists(self, alias):
+        template = self._template(
+            'exists', lambda alias: [self.get_shopref_obj({'Alias': alias})])
+        try:
+            if template is not None:
+                response = template.call(alias)
+                return read_value(response[0], template.result_type())
+        except TemplateError:
+            # alias that can not be rendered, let zeep complain about it
+            pass
+        # service2 rather than exists, which would count the call in the
+        # result_cache a second time
+        shopref = self.get_shopref_obj({'Alias': alias})
+        return self.service2.exists(shopref)
+
+    def get_info_fields(self, alias, fields=None):
+        """ getInfo for an alias as a dict of the requested fields,
+        without building the envelope with zeep
+
+        sc.get_info_fields('DemoShop', ['IsClosed', 'DomainName'])
+        """
+        request = {'Alias': alias, 'Fields': fields and list(fields)}
+        return self._cached('getInfoFields', request,
+                            lambda: self._get_info_fields(alias, fields))
+
+    def _get_info_fields(self, alias, fields=None):
+        template = self._template(
+            'getInfo', lambda alias: [self._get_info_obj(alias)])
+        try:
+            if template is not None:
+                response = template.call(alias)
+                return read_fields(
+                    response[0], template.result_type(), fields)
+        except TemplateError:
+            pass
+        info = self.service2.getInfo(self._get_info_obj(alias))
+        return select_fields(serialize_object(info), fields)
+
+    def _get_info_obj(self, alias):
+        """ argument of getInfo for alias """
+        raise NotImplementedError
+
+    @classmethod
+    def from_snapshot(cls, path, **kwargs):
+        """ create the service from a snapshot built with save_snapshot
+
+        sc = ShopConfigService.from_snapshot(
+            'ShopConfigService12.snapshot', server='example.com', ...)
+        """
+        return cls(snapshot=path, **kwargs)
+
+    def save_snapshot(self, path):
+        """ save the compiled wsdl to path for from_snapshot """
+        save_document(self.client.wsdl, path, self._snapshot_key())
+
+    def _snapshot_key(self):
+        """ snapshots are only valid for the same server, service and
+        version """
+        return snapshot_key(
+            self.server, self.__class__.__name__, self.version)
 
     def _add_scheme_to_server(self):
         """ adds https:// to server if it is not there already """
@@ -91,6 +327,14 @@ class BaseProvisioningService(object):
         """ Build endpoint url from server """
         return "{}/epages/Site.soap".format(self.server)
 
+    def _build_wsdl_location(self):
+        """ wsdl url on the server or path to the local copy """
+        wsdlurl = self._build_wsdl_url_from_endpoint()
+        if self.wsdl_source == 'server':
+            return wsdlurl
+        return local_wsdl_path(
+            posixpath.basename(urlparse(wsdlurl).path), self.wsdl_source)
+
     def _build_wsdl_url_from_endpoint(self):
         """ you need to implement this method in subclasses, each service has
         different wsdl file locations """
@@ -106,19 +350,82 @@ class ShopConfigService(BaseProvisioningService):
     ShopConfig service, handles more than simple provisioning service
     """
 
+    # get_*_obj factories of the arguments of the operations, used by
+    # map_operation and bulk to build them from aliases, dicts and lists
+    _bulk_arguments = {
+        'exists': ('get_shopref_obj',),
+        'get_info': ('get_infoshop_obj',),
+        'create': ('get_createshop_obj',),
+        'update': ('get_updateshop_obj',),
+        'delete': ('get_shopref_obj',),
+        'delete_shopref': ('get_shopref_obj',),
+        'set_secondary_domains': ('get_shopref_obj',
+                                  'get_secondarydomains_obj'),
+    }
+
     def __init__(self,
                  server="",
                  provider="",
                  username="",
                  password="",
-                 version="12"):
+                 version="12",
+                 cache=None,
+                 snapshot=None,
+                 wsdl_source="server",
+                 lazy=False,
+                 shared=False,
+                 transport_config=None,
+                 result_cache=None):
         super(ShopConfigService, self).__init__(
             server=server,
             provider=provider,
             username=username,
             password=password,
             version=version,
+            cache=cache,
+            snapshot=snapshot,
+            wsdl_source=wsdl_source,
+            lazy=lazy,
+            shared=shared,
+            transport_config=transport_config,
+            result_cache=result_cache,
         )
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """ call listener(operation, *arguments) after every create,
+        update, setSecondaryDomains, delete and deleteShopRef that
+        succeeded, with the objects the operation was called with
+
+        Exceptions of the listeners are logged, the change is made
+        already. """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _changed(self, call, operation, *arguments):
+        """ call() and tell the listeners about the change, after the
+        coroutine of the async service when there is one """
+        result = self._forget(call, *arguments)
+        if not self._listeners:
+            return result
+        if inspect.isawaitable(result):
+            async def notify():
+                value = await result
+                self._notify(operation, arguments)
+                return value
+            return notify()
+        self._notify(operation, arguments)
+        return result
+
+    def _notify(self, operation, arguments):
+        for listener in list(self._listeners):
+            try:
+                listener(operation, *arguments)
+            except Exception:
+                logger.exception('Listener %r failed for %s',
+                                 listener, operation)
 
     def _build_wsdl_url_from_endpoint(self):
         """ Builds url to the wsdl from endpoint and version number """
@@ -134,39 +441,72 @@ class ShopConfigService(BaseProvisioningService):
         """ infoshop object, used with get_info """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TInfoShop_Input')(**data)
+        return self._get_type('ns0:TInfoShop_Input')(**data)
 
     def get_shopref_obj(self, data=None):
         """ returns a shopref object
         use this when calling exists, delete etc. """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TShopRef')(**data)
+        return self._get_type('ns0:TShopRef')(**data)
 
     def get_all_info(self):
         """ Get info about all shops """
         return self.service2.getAllInfo()
 
+    def iter_all_info(self, fields=None, predicate=None):
+        """ getAllInfo one shop at a time, as dicts of the fields
+
+        The response is parsed while it is downloaded and every shop is
+        dropped after it has been yielded, so memory use does not grow
+        with the number of shops.
+
+        :param fields: names of the fields to read, all by default
+        :param predicate: called with all the fields of every shop, also
+                          the ones not in fields, shops for which it
+                          returns False are skipped
+
+        for shop in sc.iter_all_info(['Alias'],
+                                     lambda shop: not shop['IsClosed']):
+            print(shop['Alias'])
+        """
+        template = self._templates.get(
+            'getAllInfo', self.client, self.service2, 'getAllInfo',
+            lambda: [], slots=0)
+        if template is None:
+            for shop in self.get_all_info() or []:
+                values = serialize_object(shop)
+                if predicate is None or predicate(values):
+                    yield select_fields(values, fields)
+            return
+
+        item_type = template.result_type()._array_type.array_type
+        with closing(template.open()) as response:
+            if response.status_code != 200:
+                # faults are small, read them whole
+                parse_response(response)
+            yield from iter_array(response.raw, item_type, fields, predicate)
+
     def get_createshop_obj(self, data=None):
         """ createshop obj
         use this when calling create """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TCreateShop')(**data)
+        return self._get_type('ns0:TCreateShop')(**data)
 
     def get_updateshop_obj(self, data=None):
         """ updateshop obj
         use this when calling update """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TUpdateShop')(**data)
+        return self._get_type('ns0:TUpdateShop')(**data)
 
     def get_attribute_obj(self, data=None):
         """ attribute obj
         use this with extra attributes setting """
         if data is None:
             data = {}
-        return self.client.get_type('ns1:TAttribute')(**data)
+        return self._get_type('ns1:TAttribute')(**data)
 
     def get_secondarydomains_obj(self, domains):
         """ get secondarydomains obj, used with set_secondary_domains """
@@ -174,29 +514,34 @@ class ShopConfigService(BaseProvisioningService):
             raise TypeError(
                 "domains should be a list of domains"
             )
-        return self.client.get_type('ns0:TSecondaryDomains')(domains)
+        return self._get_type('ns0:TSecondaryDomains')(domains)
+
+    def _get_info_obj(self, alias):
+        return self.get_infoshop_obj({'Alias': alias})
 
     def get_info(self, shop):
         """ get information about one shop
 
         sc.get_info(sc.get_infoshop_obj({'Alias': 'DemoShop'}))
         """
-        if not isinstance(shop, type(self.get_infoshop_obj())):
+        if not isinstance(shop, self._type_class('ns0:TInfoShop_Input')):
             raise TypeError(
                 "Get shop from get_infoshop_obj and call with that")
 
-        return self.service2.getInfo(shop)
+        return self._cached('getInfo', shop,
+                            lambda: self.service2.getInfo(shop))
 
     def exists(self, shop):
         """ Check if a shop exists
 
         sc.exists(sc.get_shopref_obj({'Alias': 'DemoShop'}))
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError(
                 "Get shop from get_shopref_obj and call with that")
 
-        return self.service2.exists(shop)
+        return self._cached('exists', shop,
+                            lambda: self.service2.exists(shop))
 
     def create(self, shop):
         """ create new shop
@@ -206,11 +551,12 @@ class ShopConfigService(BaseProvisioningService):
         shop.ShopType = "MinDemo"
         sc.create(shop)
         """
-        if not isinstance(shop, type(self.get_createshop_obj())):
+        if not isinstance(shop, self._type_class('ns0:TCreateShop')):
             raise TypeError(
                 "Get shop from get_createshop_obj and call with that")
 
-        return self.service2.create(shop)
+        return self._changed(
+            lambda: self.service2.create(shop), 'create', shop)
 
     def update(self, shop):
         """ update shop
@@ -220,11 +566,12 @@ class ShopConfigService(BaseProvisioningService):
         shop.IsTrial = False
         sc.update(shop)
         """
-        if not isinstance(shop, type(self.get_updateshop_obj())):
+        if not isinstance(shop, self._type_class('ns0:TUpdateShop')):
             raise TypeError(
                 "Get shop from get_updateshop_obj and call with that")
 
-        return self.service2.update(shop)
+        return self._changed(
+            lambda: self.service2.update(shop), 'update', shop)
 
     def set_secondary_domains(self, shop, domains):
         """ set secondary domains for the shop
@@ -234,36 +581,118 @@ class ShopConfigService(BaseProvisioningService):
         domains = sc.get_secondarydomains_obj(['test.fi', 'test2.fi'])
         sc.set_secondary_domains(shopref, domains)
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError(
                 "Get shop from get_shopref_obj and call with that")
-        if not isinstance(domains, type(self.get_secondarydomains_obj([]))):
+        if not isinstance(domains, self._type_class('ns0:TSecondaryDomains')):
             raise TypeError(
                 "Get shop from get_secondarydomains_obj and call with that")
 
-        return self.service2.setSecondaryDomains(shop, domains)
+        return self._changed(
+            lambda: self.service2.setSecondaryDomains(shop, domains),
+            'setSecondaryDomains', shop, domains)
 
     def delete(self, shop):
         """ delete a shop
 
         sc.delete(sc.get_shopref_obj({'Alias': 'DemoShop'}))
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError(
                 "Get shop from get_shopref_obj and call with that")
 
-        return self.service2.delete(shop)
+        return self._changed(
+            lambda: self.service2.delete(shop), 'delete', shop)
 
     def delete_shopref(self, shop):
         """ delete a shop
 
         sc.delete_shopref(sc.get_shopref_obj({'Alias': 'DemoShop'}))
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError(
                 "Get shop from get_shopref_obj and call with that")
 
-        return self.service2.deleteShopRef(shop)
+        return self._changed(lambda: self.service2.deleteShopRef(shop),
+                             'deleteShopRef', shop)
+
+    def map_operation(self, operation, items,
+                      concurrency=DEFAULT_CONCURRENCY, ordered=True):
+        """ run one operation for every item on a thread pool
+
+        Items are the arguments of the operation: an alias, a dict for the
+        get_*_obj factory, an object from the factory or a tuple of these
+        for operations with more than one argument. Yields a BulkResult per
+        item, errors are returned in it instead of raised.
+
+        :param operation: method name, e.g. 'exists', 'get_info',
+                          'update', 'set_secondary_domains' or
+                          'alias_exists', or a callable
+        :param items: iterable of the arguments, read as the calls finish
+        :param concurrency: max calls running at the same time
+        :param ordered: yield in the order of items instead of as the
+                        calls finish
+
+        for result in sc.map_operation('exists', aliases, concurrency=16):
+            print(result.item, result.result)
+
+        sc.map_operation('set_secondary_domains',
+                         [('DemoShop', ['www.demo.example'])])
+        """
+        func = self._bulk_call(operation)
+        # load the wsdl here rather than in the first worker
+        self.warm_up()
+        return run_bulk(func, items, concurrency, ordered)
+
+    def bulk(self, calls, concurrency=DEFAULT_CONCURRENCY, ordered=True):
+        """ map_operation for different operations, calls are
+        (operation, item) pairs and the item of the results is the pair
+
+        sc.bulk([('update', {'Alias': 'DemoShop', 'IsClosed': True}),
+                 ('get_info', 'OtherShop')])
+        """
+        self.warm_up()
+        return run_bulk(self._bulk_pair_call(), calls, concurrency, ordered)
+
+    def _bulk_pair_call(self):
+        """ function calling the operation of an (operation, item) pair """
+        funcs = {}
+
+        def call(pair):
+            operation, item = pair
+            func = funcs.get(operation)
+            if func is None:
+                func = funcs[operation] = self._bulk_call(operation)
+            return func(item)
+        return call
+
+    def _bulk_call(self, operation):
+        """ function calling operation with one bulk item """
+        if callable(operation):
+            func, factories = operation, ()
+        elif not operation.startswith('_') and \
+                callable(getattr(self, operation, None)):
+            func = getattr(self, operation)
+            factories = self._bulk_arguments.get(operation, ())
+        else:
+            raise ValueError("Unknown operation {}".format(operation))
+
+        def call(item):
+            args = item if isinstance(item, tuple) else (item,)
+            converted = [
+                self._bulk_argument(getattr(self, factory), value)
+                for factory, value in zip(factories, args)]
+            return func(*converted, *args[len(converted):])
+        return call
+
+    @staticmethod
+    def _bulk_argument(factory, value):
+        """ argument for the operation from an alias, dict or list """
+        if isinstance(value, str):
+            value = {'Alias': value}
+        if isinstance(value, (dict, list)):
+            return factory(value)
+        return value
 
 
 class SimpleProvisioningService(BaseProvisioningService):
@@ -285,13 +714,27 @@ class SimpleProvisioningService(BaseProvisioningService):
                  provider="",
                  username="",
                  password="",
-                 version="6"):
+                 version="6",
+                 cache=None,
+                 snapshot=None,
+                 wsdl_source="server",
+                 lazy=False,
+                 shared=False,
+                 transport_config=None,
+                 result_cache=None):
         super(SimpleProvisioningService, self).__init__(
             server=server,
             provider=provider,
             username=username,
             password=password,
-            version=version
+            version=version,
+            cache=cache,
+            snapshot=snapshot,
+            wsdl_source=wsdl_source,
+            lazy=lazy,
+            shared=shared,
+            transport_config=transport_config,
+            result_cache=result_cache,
         )
 
     def _build_wsdl_url_from_endpoint(self):
@@ -308,25 +751,25 @@ class SimpleProvisioningService(BaseProvisioningService):
         """ get shop object for creation """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TCreateShop')(**data)
+        return self._get_type('ns0:TCreateShop')(**data)
 
     def get_shopref_obj(self, data=None):
         """ get shop object for exists, getinfo and markfor deletion calls """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TShopRef')(**data)
+        return self._get_type('ns0:TShopRef')(**data)
 
     def get_updateshop_obj(self, data=None):
         """ get shop object for update call """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TUpdateShop')(**data)
+        return self._get_type('ns0:TUpdateShop')(**data)
 
     def get_rename_obj(self, data=None):
         """ get rename object """
         if data is None:
             data = {}
-        return self.client.get_type('ns0:TRename_Input')(**data)
+        return self._get_type('ns0:TRename_Input')(**data)
 
     def create(self, shop):
         """ Creates new shop
@@ -339,12 +782,12 @@ class SimpleProvisioningService(BaseProvisioningService):
 
         returns None when everything is ok.
         """
-        if not isinstance(shop, type(self.get_createshop_obj())):
+        if not isinstance(shop, self._type_class('ns0:TCreateShop')):
             raise TypeError(
                 "Get shop from get_createshop_obj and call with that")
 
         logger.info('Creating new shop with data: %s', shop)
-        return self.service2.create(shop)
+        return self._forget(lambda: self.service2.create(shop), shop)
 
     def exists(self, shop):
         """ Check if shop exists
@@ -354,10 +797,14 @@ class SimpleProvisioningService(BaseProvisioningService):
         exists = sp.get_info(shopref)
 
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError("Get shop from get_shopref_obj and call with that")
 
-        return self.service2.exists(shop)
+        return self._cached('exists', shop,
+                            lambda: self.service2.exists(shop))
+
+    def _get_info_obj(self, alias):
+        return self.get_shopref_obj({'Alias': alias})
 
     def get_info(self, shop):
         """ Get shop information
@@ -367,11 +814,12 @@ class SimpleProvisioningService(BaseProvisioningService):
         info = sp.get_info(shopref)
 
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError(
                 "Get shop from get_shopref_obj and call with that")
 
-        return self.service2.getInfo(shop)
+        return self._cached('getInfo', shop,
+                            lambda: self.service2.getInfo(shop))
 
     def mark_for_deletion(self, shop):
         """ Mark the shop for deletion
@@ -387,12 +835,13 @@ class SimpleProvisioningService(BaseProvisioningService):
 
         returns None if the operation was successfull
         """
-        if not isinstance(shop, type(self.get_shopref_obj())):
+        if not isinstance(shop, self._type_class('ns0:TShopRef')):
             raise TypeError(
                 "Get shop from get_shopref_obj and call with that")
 
         if self.service2.exists(shop):
-            return self.service2.markForDeletion(shop)
+            return self._forget(
+                lambda: self.service2.markForDeletion(shop), shop)
         else:
             return False
 
@@ -409,11 +858,11 @@ class SimpleProvisioningService(BaseProvisioningService):
 
         returns None if the operation was successfull
         """
-        if not isinstance(shop, type(self.get_rename_obj())):
+        if not isinstance(shop, self._type_class('ns0:TRename_Input')):
             raise TypeError(
                 "Get shop from get_rename_obj and call with that")
 
-        return self.service2.rename(shop)
+        return self._forget(lambda: self.service2.rename(shop), shop)
 
     def update(self, shop):
         """ Update shop information.
@@ -425,8 +874,8 @@ class SimpleProvisioningService(BaseProvisioningService):
 
         returns None if the operation was successfull
         """
-        if not isinstance(shop, type(self.get_updateshop_obj())):
+        if not isinstance(shop, self._type_class('ns0:TUpdateShop')):
             raise TypeError(
                 "Get shop from get_updateshop_obj and call with that")
 
-        return self.service2.update(shop)
+        return self._forget(lambda: self.service2.update(shop), shop)
@@ -0,0 +1,150 @@
+"""
+Compact read only shops
+
+A Shop keeps its keys in a __dict__, the whole getInfo response and the
+request objects it was loaded with. For reports over tens of thousands of
+shops ShopRecord keeps only the values, in __slots__, with the values that
+repeat between shops (shop type, provider, country, ...) interned so that
+all records share one string:
+
+    records = [ShopRecord.from_info(shop) for shop in sc.iter_all_info()]
+    record = ShopRecord.from_info(sc.get_info(infoshopobj))
+    record = ShopRecord.from_shop(shop)
+    shop = record.to_shop(sc)
+
+SecondaryDomains and Attributes are tuples, the attributes ShopAttributes.
+"""
+import sys
+
+from .shop import Shop, ShopAttribute
+
+# values shared by many shops, kept once
+INTERNED_KEYS = frozenset((
+    'ShopType', 'Database', 'Provider', 'ShopAddress_CountryID',
+    'ShopAddress_State', 'ShopAddress_City',
+))
+
+
+class ShopRecord(object):
+    """ read only shop values, the keys of Shop.shopkeys as attributes
+
+    Use _replace for a record with other values:
+
+    closed = record._replace(IsClosed=True)
+
+    Records are equal when all their values are, and can be kept in sets
+    and used as dict keys.
+    """
+
+    __slots__ = Shop.shopkeys
+
+    def __init__(self, **values):
+        unknown = set(values).difference(self.__slots__)
+        if unknown:
+            raise TypeError("Unknown shop keys: {}".format(
+                ', '.join(sorted(unknown))))
+        for key in self.__slots__:
+            value = values.get(key)
+            if key == 'SecondaryDomains':
+                value = tuple(value or ())
+            elif key == 'Attributes':
+                value = tuple(_attribute(item) for item in value or ())
+            elif key in INTERNED_KEYS:
+                value = _intern(value)
+            object.__setattr__(self, key, value)
+
+    @classmethod
+    def from_info(cls, info):
+        """ record of a getInfo response, an item of getAllInfo or the
+        dicts of iter_all_info and get_info_fields """
+        if isinstance(info, dict):
+            get = info.get
+        else:
+            def get(key):
+                return getattr(info, key, None)
+        return cls(**{key: get(key) for key in cls.__slots__})
+
+    @classmethod
+    def from_shop(cls, shop):
+        """ record of the values of a Shop, a lazy shop is loaded """
+        return cls(**{key: getattr(shop, key) for key in cls.__slots__})
+
+    def to_shop(self, provisioning, shop_class=Shop):
+        """ Shop with the values of the record, without calls to the server
+
+        The values are taken as the ones on the server, so changes and
+        apply send only what is changed on the shop afterwards. """
+        shop = shop_class(self.Alias, provisioning, lazy=True)
+        for key in self.__slots__:
+            setattr(shop, key, getattr(self, key))
+        shop.SecondaryDomains = list(self.SecondaryDomains)
+        shop.Attributes = [
+            provisioning.get_attribute_obj({
+                'Name': attribute.name,
+                'Type': attribute.type,
+                'Value': attribute.value,
+                'LocalizedValues': [
+                    {'LanguageCode': language, 'Value': value}
+                    for language, value in
+                    attribute.localized_values.items()] or None,
+            })
+            for attribute in self.Attributes]
+        shop.exists = True
+        shop.shopinfo = None
+        shop._loaded = True
+        shop._mark_clean()
+        return shop
+
+    def as_dict(self):
+        """ the values as a dict """
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def _replace(self, **changes):
+        values = self.as_dict()
+        values.update(changes)
+        return type(self)(**values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read only".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is read only".format(type(self).__name__))
+
+    def __eq__(self, other):
+        if not isinstance(other, ShopRecord):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key)
+                   for key in self.__slots__)
+
+    def __hash__(self):
+        # equal records have the same Alias, the localized values of the
+        # attributes are dicts and do not hash
+        return hash(self.Alias)
+
+    def __reduce__(self):
+        return (_restore, (type(self), tuple(
+            getattr(self, key) for key in self.__slots__)))
+
+    def __repr__(self):
+        return '{}(Alias={!r})'.format(type(self).__name__, self.Alias)
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _attribute(attribute):
+    """ ShopAttribute of a TAttribute, as object or dict """
+    if isinstance(attribute, ShopAttribute):
+        return attribute
+    return ShopAttribute(
+        _intern(attribute['Name']), _intern(attribute['Type']),
+        attribute['Value'],
+        {_intern(localized['LanguageCode']): localized['Value']
+         for localized in attribute['LocalizedValues'] or ()})
+
+
+def _restore(cls, values):
+    return cls(**dict(zip(cls.__slots__, values)))
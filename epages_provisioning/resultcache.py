@@ -0,0 +1,328 @@
+"""
+Cached results of getInfo and exists
+
+Components asking the server about the same shop within seconds can share
+the answers through a ResultCache given to the service:
+
+    sc = ShopConfigService(..., result_cache=ResultCache(ttl=30))
+    sc.get_info_fields('DemoShop')   # getInfo
+    sc.get_info_fields('DemoShop')   # cached
+    sc.update(...)                   # drops the results of the shop
+
+get_info, get_info_fields, exists and alias_exists read through the cache,
+keyed by the operation and the request. The writes of the service drop the
+results of the shops they change, also the ones of a NewAlias. Faults are
+not cached.
+
+The results are kept in a MemoryBackend of this process, or shared between
+processes in a SQLiteBackend, which stores only what pickles: the results
+of exists and get_info_fields, not the objects get_info returns.
+"""
+import copy
+import inspect
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from zeep.helpers import serialize_object
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend(object):
+    """ results in a dict of this process, the least recently used are
+    dropped first
+
+    Results are copied in and out, so changing one does not change the
+    cached one. """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # tag to the keys of its entries
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ (expires, result) of key or None """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            expires, _, value = entry
+        return expires, copy.deepcopy(value)
+
+    def set(self, key, tag, expires, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (expires, tag, value)
+            self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tag):
+        """ drop the results of tag """
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._tags[entry[1]]
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry[1]]
+
+
+class SQLiteBackend(object):
+    """ results in a sqlite file shared by the processes using it, the
+    least recently used are dropped first
+
+    Results that do not pickle, like the zeep objects of get_info, are not
+    stored. """
+
+    def __init__(self, path, maxsize=10000):
+        if path == ":memory:":
+            raise ValueError("SQLiteBackend needs a file, not :memory:")
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result "
+                "(key TEXT PRIMARY KEY, tag TEXT NOT NULL, "
+                "expires REAL NOT NULL, used REAL NOT NULL, value BLOB)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS result_tag ON result (tag)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS result_used ON result (used)")
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            # connections do not survive a fork, open one per process
+            if self._pid != os.getpid():
+                self._db = sqlite3.connect(
+                    self.path, timeout=10, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._pid = os.getpid()
+            with self._db:
+                yield self._db
+
+    def get(self, key):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT expires, value FROM result WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE result SET used = ? WHERE key = ?",
+                         (time.time(), key))
+        return row[0], pickle.loads(row[1])
+
+    def set(self, key, tag, expires, value):
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            logger.debug("Not caching %s, the result does not pickle", key)
+            return
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result VALUES (?, ?, ?, ?, ?)",
+                (key, tag, expires, time.time(), sqlite3.Binary(data)))
+            excess = conn.execute(
+                "SELECT COUNT(*) FROM result").fetchone()[0] - self.maxsize
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM result WHERE key IN (SELECT key FROM result "
+                    "ORDER BY used LIMIT ?)", (excess,))
+
+    def invalidate(self, tag):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM result WHERE tag = ?", (tag,))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM result")
+
+    def __len__(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM result").fetchone()[0]
+
+
+class ResultCache(object):
+    """ results of the read operations of a service, see the module
+
+    :param ttl: seconds a result is used
+    :param maxsize: results kept by the default MemoryBackend
+    :param backend: MemoryBackend, SQLiteBackend or an object with their
+                    get, set, invalidate, clear and __len__
+
+    One cache can be shared by several services. Their results are kept
+    apart by server, provider and wsdl, a write through any of them drops
+    the results of the shop for all.
+    """
+
+    def __init__(self, ttl=30, maxsize=1024, backend=None):
+        self.ttl = ttl
+        self.backend = backend if backend is not None else MemoryBackend(
+            maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # tag to [reads in progress, version], the version is bumped by
+        # invalidate so that results read before are not stored after
+        self._reads = {}
+        self._lock = threading.Lock()
+
+    def call(self, operation, request, call, awaitable=False):
+        """ the cached result of operation for request, or the one of
+        call() which is then stored
+
+        :param request: the argument of the operation, an object of the
+                        get_*_obj factories or a dict
+        :param awaitable: return an awaitable also for a cached result, as
+                          call() does in the async services
+        """
+        values = _request_values(request)
+        key = _key(operation, values)
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] > time.time():
+            with self._lock:
+                self.hits += 1
+            return _ready(entry[1]) if awaitable else entry[1]
+
+        with self._lock:
+            self.misses += 1
+        tag = _tag(values.get('Alias'))
+        version = self._begin(tag)
+        try:
+            result = call()
+        except BaseException:
+            self._end(tag)
+            raise
+        if inspect.isawaitable(result):
+            async def store():
+                try:
+                    value = await result
+                    self._store(key, tag, value, version)
+                    return value
+                finally:
+                    self._end(tag)
+            return store()
+        try:
+            self._store(key, tag, result, version)
+        finally:
+            self._end(tag)
+        return result
+
+    def _begin(self, tag):
+        """ count a read of the results of tag, returns their version """
+        with self._lock:
+            reads = self._reads.setdefault(tag, [0, 0])
+            reads[0] += 1
+            return reads[1]
+
+    def _end(self, tag):
+        with self._lock:
+            reads = self._reads[tag]
+            reads[0] -= 1
+            if not reads[0]:
+                del self._reads[tag]
+
+    def _current(self, tag, version):
+        with self._lock:
+            return self._reads[tag][1] == version
+
+    def _store(self, key, tag, value, version):
+        if not self._current(tag, version):
+            # a write invalidated the shop while this was read
+            return
+        self.backend.set(key, tag, time.time() + self.ttl, value)
+        if not self._current(tag, version):
+            # and while this was stored
+            self.backend.invalidate(tag)
+
+    def _bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                reads = self._reads.get(tag)
+                if reads is not None:
+                    reads[1] += 1
+
+    def invalidate(self, *aliases):
+        """ drop the results of the shops """
+        tags = set(_tag(alias) for alias in aliases)
+        with self._lock:
+            self.invalidations += 1
+        self._bump(tags)
+        for tag in tags:
+            self.backend.invalidate(tag)
+
+    def clear(self):
+        with self._lock:
+            tags = list(self._reads)
+        self._bump(tags)
+        self.backend.clear()
+
+    def stats(self):
+        """ the numbers for monitoring as a dict """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'size': len(self.backend),
+            }
+
+
+def shop_aliases(shops):
+    """ Alias and NewAlias of the request objects of a write """
+    aliases = []
+    for shop in shops:
+        for name in ('Alias', 'NewAlias'):
+            alias = getattr(shop, name, None)
+            if isinstance(alias, str) and alias:
+                aliases.append(alias)
+    return aliases
+
+
+def _request_values(request):
+    if not isinstance(request, dict):
+        request = serialize_object(request)
+    return {name: value for name, value in dict(request).items()
+            if value is not None}
+
+
+def _key(operation, values):
+    return '{}:{}'.format(operation, json.dumps(
+        values, sort_keys=True, separators=(',', ':'), default=str))
+
+
+def _tag(alias):
+    """ results are dropped for every spelling of the alias, in case the
+    server ignores its case """
+    return alias.casefold() if isinstance(alias, str) else ''
+
+
+async def _ready(value):
+    return value
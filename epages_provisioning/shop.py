@@ -1,7 +1,15 @@
 """
 ePages shop
 """
+import copy
 import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from zeep.exceptions import Fault
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +29,35 @@ class ShopDisappearedError(ShopError):
     pass
 
 
+ShopAttribute = namedtuple(
+    'ShopAttribute', ('name', 'type', 'value', 'localized_values'))
+ShopAttribute.__doc__ = """ attribute of a shop, localized_values maps the
+language codes to the values """
+
+
 class Shop(object):
-    """ wrapper for shopconfig service to get it more pythonic """
+    """ wrapper for shopconfig service to get it more pythonic
+
+    By default the shop is loaded from the server when created, which costs
+    an exists call and the exists and getInfo calls of refresh. With
+    lazy=True nothing is loaded until an attribute is read, then one getInfo
+    loads everything; a shop that does not exist is recognized by the fault
+    getInfo returns for it:
+
+        shop = Shop('DemoShop', sc, lazy=True)  # no calls
+        shop.IsClosed                           # getInfo
+        shop.exists                             # no more calls
+    """
+
+    # language of the attributes when none is given
+    default_language = 'en'
+
+    # keys the server sets, never sent with update
+    readonly_keys = ('Provider', 'MarkedForDelOn', 'IsDeleted', 'Database')
+
+    # faults of getInfo meaning that the shop does not exist
+    missing_fault = re.compile(
+        r'not found|does not exist|doesn\'t exist|no such', re.IGNORECASE)
 
     # shop keys
     shopkeys = (
@@ -57,8 +92,36 @@ class Shop(object):
             self,
             Alias=None,
             provisioning=None,
+            lazy=False,
+            attribute_cache_ttl=None,
+            attribute_flush_delay=None,
     ):
-        """ ePages shop object """
+        """ ePages shop object
+
+        attribute_cache_ttl keeps the values read with get_shop_attributes
+        for that many seconds. With attribute_flush_delay the attributes
+        set within that many seconds of the first one are sent with one
+        update, see attribute_batch. They are sent from a daemon thread
+        that does not keep the interpreter running, call flush_attributes
+        before exiting. Failures of that thread are only logged """
+        self.lazy = lazy
+        self._loaded = False
+        self.attribute_cache_ttl = attribute_cache_ttl
+        self._attribute_cache = {}
+        self.attribute_flush_delay = attribute_flush_delay
+        self._init_attribute_writes()
+        # values of the keys as last loaded from the server, see changes
+        self._loaded_values = {}
+        self.sc = provisioning
+
+        if lazy:
+            # the other keys are loaded on first access, see __getattr__
+            self.Alias = Alias
+            self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
+            self.infoshopobj = self.sc.get_infoshop_obj(
+                {'Alias': self.Alias})
+            return
+
         # default to None
         for key in self.shopkeys:
             setattr(self, key, None)
@@ -69,8 +132,6 @@ class Shop(object):
         # set shoptype to None
         self.ShopType = None
 
-        self.sc = provisioning
-
         self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
         self.infoshopobj = self.sc.get_infoshop_obj({'Alias': self.Alias})
 
@@ -81,6 +142,35 @@ class Shop(object):
         if self.exists:
             self.refresh()
 
+    def __getattr__(self, name):
+        """ load a lazy shop when one of its keys is read first """
+        if name in self.shopkeys or name in ('exists', 'shopinfo'):
+            if self.__dict__.get('lazy') and not self.__dict__.get('_loaded'):
+                self._load()
+                return getattr(self, name)
+        raise AttributeError("{!r} object has no attribute {!r}".format(
+            type(self).__name__, name))
+
+    def _load(self, overwrite=False):
+        """ load the shop with one getInfo, the keys already set are kept
+        unless overwrite is True """
+        self.infoshopobj = self.sc.get_infoshop_obj({'Alias': self.Alias})
+        try:
+            info = self.sc.get_info(self.infoshopobj)
+        except Fault as error:
+            if not self.missing_fault.search(error.message or ''):
+                raise
+            info = None
+
+        self.exists = info is not None
+        self.shopinfo = info
+        for key in self.shopkeys:
+            value = getattr(info, key) if info is not None else None
+            if overwrite or key not in self.__dict__:
+                setattr(self, key, value)
+            self._loaded_values[key] = copy.deepcopy(value)
+        self._loaded = True
+
     def _to_dict(self):
         """ helper method for getting the shop attributes to a dict """
         data = {}
@@ -101,9 +191,46 @@ class Shop(object):
         """ helper method for updating the shop attributes from a dict """
         for key in self.shopkeys:
             setattr(self, key, getattr(data, key))
+        self._mark_clean()
+
+    def _mark_clean(self, keys=None):
+        """ remember the values of keys as the ones on the server """
+        values = self.__dict__.setdefault('_loaded_values', {})
+        for key in self.shopkeys if keys is None else keys:
+            values[key] = copy.deepcopy(self.__dict__.get(key))
+
+    def changes(self):
+        """ keys changed since the shop was loaded, with their new values
+
+        Lists changed in place count as well. Keys that can not be sent
+        with update (the read only keys, None and empty lists) are left
+        out. """
+        loaded = self.__dict__.get('_loaded_values', {})
+        changed = {}
+        for key in self.shopkeys:
+            if key == 'Alias' or key in self.readonly_keys:
+                continue
+            # not set on a lazy shop that has not been loaded yet
+            if key not in self.__dict__:
+                continue
+            value = self.__dict__[key]
+            if value is None or value == []:
+                continue
+            if key in loaded and loaded[key] == value:
+                continue
+            changed[key] = value
+        return changed
 
     def refresh(self):
         """ refresh the internal state from the server """
+        self._attribute_cache.clear()
+        if self.lazy:
+            self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
+            self._load(overwrite=True)
+            if not self.exists:
+                raise ShopDisappearedError("Could not find the shop anymore!")
+            return
+
         # exists state
         self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
         self.exists = self.sc.exists(self.shoprefobj)
@@ -122,11 +249,23 @@ class Shop(object):
 
         # refresh the exists information
         self.shoprefobj = self.sc.get_shopref_obj({'Alias': self.Alias})
-        self.exists = self.sc.exists(self.shoprefobj)
+        if self.lazy:
+            # getInfo tells it as well and loads the keys not set yet
+            if not self._loaded:
+                self._load()
+        else:
+            self.exists = self.sc.exists(self.shoprefobj)
 
         if self.exists:
             raise ShopExistsError("Shop already exists")
 
+        self.sc.create(self._createshop_obj())
+
+        # refresh the data
+        self.refresh()
+
+    def _createshop_obj(self):
+        """ createshop object with the data of the shop """
         if not self.ShopType:
             raise ValueError("Shoptype must be defined")
 
@@ -138,15 +277,34 @@ class Shop(object):
         if data['WebServerScriptNamePart'] is None:
             data['WebServerScriptNamePart'] = data['Alias']
 
-        shopcreateobj = self.sc.get_createshop_obj(
+        return self.sc.get_createshop_obj(
             {k: v for k, v in data.items() if v})
-        self.sc.create(shopcreateobj)
 
-        # refresh the data
-        self.refresh()
+    def apply(self, refresh=True):
+        """ apply the changes to the server
+
+        Only the keys changed since the shop was loaded are sent, nothing
+        is sent when there are none. With refresh=False the shop is not
+        loaded again afterwards, the values sent are taken as the ones on
+        the server. """
+        changes = self.changes()
+        if not changes:
+            return
 
-    def apply(self):
-        """ apply the changes to the server """
+        self.sc.update(self._updateshop_obj(changes))
+        self._attribute_cache.clear()
+
+        if refresh:
+            self.refresh()
+        else:
+            self._mark_clean(changes)
+
+    def _updateshop_obj(self, changes=None):
+        """ updateshop object with the changes, or all the data of the
+        shop """
+        if changes is not None:
+            data = dict(changes, Alias=self.Alias)
+            return self.sc.get_updateshop_obj(data)
 
         data = self._to_dict()
 
@@ -166,44 +324,253 @@ class Shop(object):
         if len(data['SecondaryDomains']) == 0:
             del data['SecondaryDomains']
 
-        updateshopobj = self.sc.get_updateshop_obj(data)
-
-        self.sc.update(updateshopobj)
-
-        self.refresh()
+        return self.sc.get_updateshop_obj(data)
 
     def get_shop_attribute(self, attributename, language=None):
         """ get one attribute value from the shop, supports only
             string attributes, will fetch the value realtime """
+        if self._attribute_writes:
+            self.flush_attributes()
+        data = self.sc.get_info(
+            self._attribute_infoshop_obj(attributename, language))
+
+        return data['Attributes'][0].Value
+
+    def _attribute_infoshop_obj(self, attributename, language=None):
+        """ infoshop object for reading one attribute """
         if language is None:
-            language = 'en'
-        infoshopobj = self.sc.get_infoshop_obj({
+            language = self.default_language
+        return self._attributes_infoshop_obj([attributename], [language])
+
+    def _attributes_infoshop_obj(self, names, languages):
+        """ infoshop object for reading the attributes """
+        return self.sc.get_infoshop_obj({
             'Alias': self.Alias,
-            'Attributes': [attributename],
-            'Languages': [language]
+            'Attributes': list(names),
+            'Languages': list(languages),
             })
-        data = self.sc.get_info(infoshopobj)
 
-        return data['Attributes'][0].Value
+    def get_shop_attributes(self, names, languages=None):
+        """ read attributes of the shop with one getInfo
+
+        Returns a dict of the names to ShopAttributes, with the localized
+        values in the languages given (default_language by default), None
+        for attributes the server did not return. With
+        attribute_cache_ttl set the attributes read before are taken from
+        the cache, only the others are read.
+
+        shop.get_shop_attributes(['CreationDate', 'Title'], ['en', 'de'])
+        # {'CreationDate': ShopAttribute(name='CreationDate', ...),
+        #  'Title': ShopAttribute(..., localized_values={'en': ...})}
+        """
+        if self._attribute_writes:
+            self.flush_attributes()
+        languages = self._attribute_languages(languages)
+        found, missing = self._cached_attributes(names, languages)
+        if missing:
+            data = self.sc.get_info(
+                self._attributes_infoshop_obj(missing, languages))
+            found.update(self._read_attributes(data, languages))
+        return {name: found.get(name) for name in names}
+
+    def _attribute_languages(self, languages):
+        if languages is None:
+            return (self.default_language,)
+        if isinstance(languages, str):
+            return (languages,)
+        return tuple(languages)
+
+    def _cached_attributes(self, names, languages):
+        """ attributes in the cache and the names not there """
+        found, missing = {}, []
+        now = time.monotonic()
+        for name in names:
+            entry = self._attribute_cache.get((name, languages))
+            if entry is not None and entry[0] > now:
+                found[name] = entry[1]
+            elif name not in missing:
+                missing.append(name)
+        return found, missing
+
+    def _read_attributes(self, data, languages):
+        """ ShopAttributes from the getInfo result, cached if enabled """
+        attributes = {}
+        for attribute in data['Attributes'] or []:
+            attributes[attribute.Name] = ShopAttribute(
+                attribute.Name, attribute.Type, attribute.Value,
+                {localized.LanguageCode: localized.Value
+                 for localized in attribute.LocalizedValues or []})
+        if self.attribute_cache_ttl:
+            expires = time.monotonic() + self.attribute_cache_ttl
+            for name, attribute in attributes.items():
+                self._attribute_cache[(name, languages)] = (
+                    expires, attribute)
+        return attributes
+
+    def _forget_attribute(self, name):
+        """ drop the cached values of an attribute """
+        for key in [key for key in self._attribute_cache if key[0] == name]:
+            del self._attribute_cache[key]
 
     def set_shop_attribute(self,
                            attributename,
                            value=None,
                            localized_values=None):
         """ set one attribute value from the shop, supports only
-            string attributes, will update immediately
+            string attributes, will update immediately unless called in
+            an attribute_batch or with attribute_flush_delay set
             localized_values need to be value, language pairs """
-        attributeobj = self.sc.get_attribute_obj()
-        attributeobj.Name = attributename
-        if value:
-            attributeobj.Value = value
-        if localized_values:
-            attributeobj.LocalizedValues = localized_values
-        updateshopobj = self.sc.get_updateshop_obj({
+        self._forget_attribute(attributename)
+        if self._attribute_batches or self.attribute_flush_delay:
+            self._buffer_attribute(attributename, value, localized_values)
+            if not self._attribute_batches:
+                self._schedule_flush()
+            return None
+        return self.sc.update(self._attribute_updateshop_obj(
+            attributename, value, localized_values))
+
+    def set_shop_attributes(self, attributes):
+        """ set several attributes with one update
+
+        attributes maps the names to the values, or to dicts of language
+        codes to the localized values:
+
+        shop.set_shop_attributes({
+            'GrantServiceAccessUntil': '2100-01-01',
+            'Title': {'en': 'Demo shop', 'de': 'Demoshop'},
+        })
+        """
+        with self.attribute_batch():
+            for name, value in attributes.items():
+                if isinstance(value, dict):
+                    self.set_shop_attribute(name, localized_values=value)
+                else:
+                    self.set_shop_attribute(name, value)
+
+    @contextmanager
+    def attribute_batch(self):
+        """ collect the set_shop_attribute calls of the block and send
+        them with one update at its end
+
+        The attributes set before an exception in the block are still
+        sent, like they would have been without the batch. Batches can be
+        nested, the outermost one sends.
+
+        with shop.attribute_batch():
+            shop.set_shop_attribute('Title', 'Demo shop')
+            shop.set_shop_attribute('Title', localized_values=[
+                {'LanguageCode': 'de', 'Value': 'Demoshop'}])
+        """
+        with self._attribute_lock:
+            self._attribute_batches += 1
+        try:
+            yield self
+        finally:
+            with self._attribute_lock:
+                self._attribute_batches -= 1
+                outermost = not self._attribute_batches
+            if outermost:
+                self.flush_attributes()
+
+    def flush_attributes(self):
+        """ send the attributes collected so far with one update, call it
+        before exiting when attribute_flush_delay is set
+
+        If the update fails the attributes are kept for the next flush """
+        writes = self._take_attribute_writes()
+        if not writes:
+            return
+        try:
+            self.sc.update(self._attributes_updateshop_obj(writes))
+        except BaseException:
+            self._restore_attribute_writes(writes)
+            raise
+
+    def _init_attribute_writes(self):
+        # attribute names to [value, {language: value}] not sent yet
+        self._attribute_writes = {}
+        self._attribute_batches = 0
+        self._attribute_timer = None
+        self._attribute_lock = threading.RLock()
+
+    def _buffer_attribute(self, name, value=None, localized_values=None):
+        """ add an attribute to the ones sent with the next flush, later
+        values replace earlier ones """
+        with self._attribute_lock:
+            write = self._attribute_writes.setdefault(name, [None, {}])
+            if value:
+                write[0] = value
+            if localized_values:
+                write[1].update(_localized_dict(localized_values))
+
+    def _take_attribute_writes(self):
+        with self._attribute_lock:
+            if self._attribute_timer is not None:
+                self._attribute_timer.cancel()
+                self._attribute_timer = None
+            writes, self._attribute_writes = self._attribute_writes, {}
+        return writes
+
+    def _restore_attribute_writes(self, writes):
+        """ put writes that could not be sent back, under the ones set
+        meanwhile """
+        with self._attribute_lock:
+            for name, (value, localized) in writes.items():
+                newer = self._attribute_writes.get(name)
+                if newer is None:
+                    self._attribute_writes[name] = [value, localized]
+                else:
+                    newer[0] = newer[0] or value
+                    newer[1] = dict(localized, **newer[1])
+
+    def _schedule_flush(self):
+        """ flush attribute_flush_delay seconds after the first write """
+        with self._attribute_lock:
+            if self._attribute_timer is None:
+                self._attribute_timer = threading.Timer(
+                    self.attribute_flush_delay, self._flush_later)
+                # a pending flush must not keep the interpreter alive
+                self._attribute_timer.daemon = True
+                self._attribute_timer.start()
+
+    def _flush_later(self):
+        try:
+            self.flush_attributes()
+        except Exception:
+            logger.exception("Sending the attributes of %s failed, they "
+                             "are sent with the next flush", self.Alias)
+
+    def _attribute_updateshop_obj(self,
+                                  attributename,
+                                  value=None,
+                                  localized_values=None):
+        """ updateshop object for setting one attribute """
+        return self.sc.get_updateshop_obj({
             'Alias': self.Alias,
-            'Attributes': [attributeobj],
+            'Attributes': [self._attribute_obj(
+                attributename, value, localized_values)],
             })
-        return self.sc.update(updateshopobj)
+
+    def _attributes_updateshop_obj(self, writes):
+        """ updateshop object for the collected attributes """
+        return self.sc.get_updateshop_obj({
+            'Alias': self.Alias,
+            'Attributes': [
+                self._attribute_obj(name, value, [
+                    {'LanguageCode': language, 'Value': localized_value}
+                    for language, localized_value in localized.items()])
+                for name, (value, localized) in writes.items()],
+            })
+
+    def _attribute_obj(self, attributename, value=None,
+                       localized_values=None):
+        data = {'Name': attributename}
+        if value:
+            data['Value'] = value
+        if localized_values:
+            # given to the constructor zeep turns dicts into the types
+            data['LocalizedValues'] = localized_values
+        return self.sc.get_attribute_obj(data)
 
     def reset_merchant_pass(self, newpass):
         """ reset the merchant password
@@ -276,3 +643,11 @@ class Shop(object):
             self.sc.delete(self.shoprefobj)
 
         self.exists = False
+
+
+def _localized_dict(localized_values):
+    """ language codes to values, from a dict or the value, language
+    pairs of set_shop_attribute """
+    if isinstance(localized_values, dict):
+        return dict(localized_values)
+    return {item['LanguageCode']: item['Value'] for item in localized_values}
@@ -0,0 +1,329 @@
+"""
+Shops in a read only binary file for many processes
+
+Web servers with many worker processes each keeping the shop list for
+alias and domain lookups hold as many copies of it. A shop file is written
+once from getAllInfo and opened by the workers with mmap, so all of them
+read the same pages of the page cache and a lookup only decodes the shop
+it finds:
+
+    export_shop_file(sc, '/var/lib/epages/shops.bin')
+
+    shops = ShopFile('/var/lib/epages/shops.bin', check_interval=60)
+    shops.get('DemoShop')
+    shops.by_domain('www.demo.example')
+    shops.alias_for_domain('www.demo.example')
+
+The file is replaced atomically, readers see the new one after reload, or
+on the first lookup check_interval seconds after the last check.
+
+Layout, all numbers little endian uint32:
+
+    header      magic, format, fields, shops, offsets and sizes below
+    rows        one row per shop, a number per key of Shop.shopkeys: the
+                offset of the string in the string table, 0 or 1 for the
+                flags, NONE for None
+    strings     length and utf-8 bytes of every distinct string
+    indexes     open addressing hash tables (crc32, linear probing) for
+                the aliases and the domains, slots of string offset and row
+"""
+import datetime
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+from collections import namedtuple
+
+from .inventory import _domains, _normalize
+from .records import ShopRecord
+from .shop import Shop, ShopAttribute
+
+MAGIC = b'EPSHOPS\x00'
+
+#: bump when the file layout changes
+FILE_FORMAT = 1
+
+NONE = 0xFFFFFFFF
+
+FIELDS = Shop.shopkeys
+
+# keys with the values 0, 1 or NONE instead of strings
+FLAG_KEYS = frozenset((
+    'IsClosed', 'IsClosedTemporarily', 'IsDeleted', 'IsTrialShop',
+    'IsInternalTestShop', 'HasSSLCertificate',
+))
+
+# magic, format, fields, shops, strings offset, alias index offset and
+# slots, domain index offset and slots
+_HEADER = struct.Struct('<8s8I')
+_ROW = struct.Struct('<{}I'.format(len(FIELDS)))
+_SLOT = struct.Struct('<II')
+_LENGTH = struct.Struct('<I')
+
+
+class ShopFileError(Exception):
+    """ shop file can not be read """
+    pass
+
+
+def write_shop_file(path, shops):
+    """ write the shops to path, replacing the file atomically
+
+    :param shops: ShopRecords, getInfo/getAllInfo results or the dicts of
+                  iter_all_info
+    """
+    records = [shop if isinstance(shop, ShopRecord)
+               else ShopRecord.from_info(shop) for shop in shops]
+    strings = _StringTable()
+    rows = bytearray()
+    for record in records:
+        rows += _ROW.pack(*(
+            _encode(strings, key, getattr(record, key)) for key in FIELDS))
+
+    alias_index = _build_index(
+        strings, ((record.Alias, row) for row, record in enumerate(records)))
+    domain_index = _build_index(strings, (
+        (domain, row) for row, record in enumerate(records)
+        for domain in sorted(_domains(record))))
+
+    strings_offset = _HEADER.size + len(rows)
+    alias_offset = strings_offset + len(strings.data)
+    domain_offset = alias_offset + len(alias_index)
+    header = _HEADER.pack(
+        MAGIC, FILE_FORMAT, len(FIELDS), len(records), strings_offset,
+        alias_offset, len(alias_index) // _SLOT.size,
+        domain_offset, len(domain_index) // _SLOT.size)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmppath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for part in (header, rows, strings.data, alias_index,
+                         domain_index):
+                fh.write(part)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmppath, 0o644)
+        os.replace(tmppath, path)
+    except BaseException:
+        os.unlink(tmppath)
+        raise
+    return len(records)
+
+
+def export_shop_file(provisioning, path):
+    """ write all shops of getAllInfo to path, returns the number of
+    shops """
+    return write_shop_file(path, provisioning.iter_all_info())
+
+
+class ShopFile(object):
+    """ reads a shop file through mmap
+
+    :param path: the file written with write_shop_file
+    :param check_interval: seconds after which a lookup checks whether the
+                           file was replaced, None checks only on reload
+    """
+
+    def __init__(self, path, check_interval=None):
+        self.path = path
+        self.check_interval = check_interval
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as fh:
+            stat = os.fstat(fh.fileno())
+            if stat.st_size < _HEADER.size:
+                raise ShopFileError("{} is not a shop file".format(self.path))
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, file_format, fields, count, strings, alias_offset,
+         alias_slots, domain_offset, domain_slots) = _HEADER.unpack_from(
+            mapped)
+        if magic != MAGIC:
+            raise ShopFileError("{} is not a shop file".format(self.path))
+        if file_format != FILE_FORMAT or fields != len(FIELDS):
+            raise ShopFileError(
+                "{} has format {} with {} fields, expected {} with {}".format(
+                    self.path, file_format, fields, FILE_FORMAT,
+                    len(FIELDS)))
+        # swapped as a whole, so a reload in another thread does not mix
+        # two files. The old map is left to the garbage collector, other
+        # threads may still be reading it
+        self._mapped = _Mapped(
+            mapped, memoryview(mapped), count, strings,
+            (alias_offset, alias_slots), (domain_offset, domain_slots))
+        self._identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        self._checked = time.monotonic()
+
+    def reload(self):
+        """ open the file again if it was replaced, returns whether it
+        was """
+        self._checked = time.monotonic()
+        stat = os.stat(self.path)
+        if (stat.st_dev, stat.st_ino, stat.st_mtime_ns) == self._identity:
+            return False
+        self._open()
+        return True
+
+    def _current(self):
+        """ the mapped file, checked for a new one every check_interval """
+        if self.check_interval is not None and \
+                time.monotonic() - self._checked >= self.check_interval:
+            self.reload()
+        return self._mapped
+
+    def __len__(self):
+        return self._current().count
+
+    def __contains__(self, alias):
+        mapped = self._current()
+        return _find(mapped, mapped.alias_index, alias) is not None
+
+    def __iter__(self):
+        mapped = self._current()
+        for row in range(mapped.count):
+            yield _record(mapped, row)
+
+    def get(self, alias, default=None):
+        """ the ShopRecord of the alias """
+        mapped = self._current()
+        row = _find(mapped, mapped.alias_index, alias)
+        return default if row is None else _record(mapped, row)
+
+    def by_domain(self, domain):
+        """ the ShopRecord with domain as DomainName or one of its
+        SecondaryDomains, None if there is none """
+        mapped = self._current()
+        row = _find(mapped, mapped.domain_index, _normalize(domain))
+        return None if row is None else _record(mapped, row)
+
+    def alias_for_domain(self, domain):
+        """ only the alias of by_domain, without decoding the rest """
+        mapped = self._current()
+        row = _find(mapped, mapped.domain_index, _normalize(domain))
+        if row is None:
+            return None
+        ref = _ROW.unpack_from(mapped.view, _HEADER.size + row * _ROW.size)
+        return _string(mapped, ref[0])
+
+    def close(self):
+        self._mapped.view.release()
+        self._mapped.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_Mapped = namedtuple('_Mapped', (
+    'mapped', 'view', 'count', 'strings', 'alias_index', 'domain_index'))
+
+
+def _find(mapped, index, key):
+    """ row of key in the index, None if it is not there """
+    view = mapped.view
+    offset, slots = index
+    data = key.encode('utf-8')
+    mask = slots - 1
+    slot = zlib.crc32(data) & mask
+    while True:
+        ref, row = _SLOT.unpack_from(view, offset + slot * _SLOT.size)
+        if ref == NONE:
+            return None
+        start = mapped.strings + ref
+        length = _LENGTH.unpack_from(view, start)[0]
+        start += _LENGTH.size
+        # compares the mapped bytes without copying them
+        if length == len(data) and view[start:start + length] == data:
+            return row
+        slot = (slot + 1) & mask
+
+
+def _string(mapped, ref):
+    start = mapped.strings + ref
+    length = _LENGTH.unpack_from(mapped.view, start)[0]
+    start += _LENGTH.size
+    return str(mapped.view[start:start + length], 'utf-8')
+
+
+def _record(mapped, row):
+    values = {}
+    refs = _ROW.unpack_from(mapped.view, _HEADER.size + row * _ROW.size)
+    for key, ref in zip(FIELDS, refs):
+        if ref == NONE:
+            value = None
+        elif key in FLAG_KEYS:
+            value = bool(ref)
+        else:
+            value = _decode(key, _string(mapped, ref))
+        values[key] = value
+    return ShopRecord(**values)
+
+
+class _StringTable(object):
+    """ distinct strings, each once """
+
+    def __init__(self):
+        self.data = bytearray()
+        self._offsets = {}
+
+    def add(self, value):
+        offset = self._offsets.get(value)
+        if offset is None:
+            encoded = value.encode('utf-8')
+            offset = self._offsets[value] = len(self.data)
+            self.data += _LENGTH.pack(len(encoded))
+            self.data += encoded
+        return offset
+
+
+def _encode(strings, key, value):
+    if value is None:
+        return NONE
+    if key in FLAG_KEYS:
+        return int(bool(value))
+    if key == 'SecondaryDomains':
+        if not value:
+            return NONE
+        value = '\n'.join(value)
+    elif key == 'Attributes':
+        if not value:
+            return NONE
+        value = json.dumps([list(attribute) for attribute in value],
+                           separators=(',', ':'))
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    return strings.add(value)
+
+
+def _decode(key, value):
+    if key == 'SecondaryDomains':
+        return value.split('\n')
+    if key == 'Attributes':
+        return [ShopAttribute(*attribute) for attribute in json.loads(value)]
+    if key == 'MarkedForDelOn':
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def _build_index(strings, items):
+    """ hash table of the keys to the rows, the first row of a key wins """
+    keys = {}
+    for key, row in items:
+        keys.setdefault(key, row)
+    slots = 8
+    while slots < 2 * len(keys):
+        slots *= 2
+    table = [(NONE, 0)] * slots
+    mask = slots - 1
+    for key, row in keys.items():
+        slot = zlib.crc32(key.encode('utf-8')) & mask
+        while table[slot][0] != NONE:
+            slot = (slot + 1) & mask
+        table[slot] = (strings.add(key), row)
+    return b''.join(_SLOT.pack(*entry) for entry in table)
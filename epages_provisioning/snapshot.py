@@ -0,0 +1,197 @@
+"""
+Snapshots of the compiled wsdl
+
+Parsing the wsdl and compiling the schema is the slowest part of creating a
+service. A snapshot stores the compiled zeep wsdl document in a file so the
+services can be created from it without loading or parsing anything.
+
+Build the snapshots at deploy time::
+
+    EP_PASSWORD=admin epages-snapshot --server example.com \
+        --provider Distributor --username admin --output /var/lib/epages/
+
+and use them with ``ShopConfigService.from_snapshot(path, ...)``.
+
+Snapshots are pickles, only load files you have built yourself.
+"""
+import argparse
+import copyreg
+import logging
+import os
+import pickle
+import sys
+
+import zeep
+from lxml import etree
+from zeep.settings import Settings
+from zeep.transports import Transport
+
+logger = logging.getLogger(__name__)
+
+#: bump when the file layout changes
+SNAPSHOT_FORMAT = 1
+
+# zeep creates these classes on the fly while parsing the schema
+DYNAMIC_MODULES = ('zeep.xsd.dynamic_types', 'zeep.objects')
+
+
+class SnapshotError(Exception):
+    """ snapshot can not be used """
+    pass
+
+
+def _rebuild_class(name, bases, attributes):
+    return type(name, bases, attributes)
+
+
+def _rebuild_element(content):
+    return etree.fromstring(content)
+
+
+class _DocumentPickler(pickle.Pickler):
+    """ pickles the zeep document without transport and settings """
+
+    dispatch_table = copyreg.dispatch_table.copy()
+    dispatch_table[etree.QName] = lambda qname: (etree.QName, (qname.text,))
+    dispatch_table[etree._Element] = lambda element: (
+        _rebuild_element, (etree.tostring(element),))
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Transport):
+            return 'transport'
+        if isinstance(obj, Settings):
+            return 'settings'
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, type) and obj.__module__ in DYNAMIC_MODULES:
+            attributes = {
+                key: value for key, value in vars(obj).items()
+                if not key.startswith('__') or key == '__module__'
+            }
+            return _rebuild_class, (obj.__name__, obj.__bases__, attributes)
+        return NotImplemented
+
+
+class _DocumentUnpickler(pickle.Unpickler):
+    """ attaches the given transport and settings to the loaded document """
+
+    def __init__(self, fh, transport, settings):
+        super().__init__(fh)
+        self._persistent = {'transport': transport, 'settings': settings}
+
+    def persistent_load(self, pid):
+        return self._persistent[pid]
+
+
+def snapshot_key(server, service, version=""):
+    """ key the snapshot is built for """
+    return {'server': server, 'service': service, 'version': str(version)}
+
+
+def snapshot_filename(service, version=""):
+    """ default file name for a snapshot """
+    return "{}{}.snapshot".format(service, version)
+
+
+def save_document(document, path, key):
+    """ write the compiled wsdl document to path """
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'zeep': zeep.__version__,
+        'key': key,
+    }
+    tmppath = "{}.tmp".format(path)
+    # deep schema graphs need more than the default recursion limit
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000))
+    try:
+        with open(tmppath, 'wb') as fh:
+            pickle.dump(header, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            _DocumentPickler(fh, protocol=pickle.HIGHEST_PROTOCOL).dump(
+                document)
+    finally:
+        sys.setrecursionlimit(limit)
+    os.replace(tmppath, path)
+    logger.debug('Saved snapshot %s for %s', path, key)
+
+
+def load_document(path, key, transport, settings):
+    """ read the compiled wsdl document from path
+
+    raises SnapshotError if the snapshot was built for another key or with
+    another zeep version """
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000))
+    try:
+        with open(path, 'rb') as fh:
+            header = pickle.load(fh)
+            if header.get('format') != SNAPSHOT_FORMAT:
+                raise SnapshotError(
+                    "Unknown snapshot format in {}".format(path))
+            if header.get('zeep') != zeep.__version__:
+                raise SnapshotError(
+                    "Snapshot {} was built with zeep {}, running {}".format(
+                        path, header.get('zeep'), zeep.__version__))
+            if header.get('key') != key:
+                raise SnapshotError(
+                    "Snapshot {} was built for {}, not {}".format(
+                        path, header.get('key'), key))
+            document = _DocumentUnpickler(fh, transport, settings).load()
+    finally:
+        sys.setrecursionlimit(limit)
+    logger.debug('Loaded snapshot %s for %s', path, key)
+    return document
+
+
+def main(argv=None):
+    """ build snapshots for the services from the command line """
+    # imported here, the services import this module
+    from .features import FeaturePackService
+    from .provisioning import ShopConfigService, SimpleProvisioningService
+
+    services = {
+        'ShopConfigService': ShopConfigService,
+        'SimpleProvisioningService': SimpleProvisioningService,
+        'FeaturePackService': FeaturePackService,
+    }
+
+    parser = argparse.ArgumentParser(
+        description="Build wsdl snapshots for the ePages services")
+    parser.add_argument('--server', required=True)
+    parser.add_argument('--output', default='.',
+                        help="directory for the snapshot files")
+    parser.add_argument('--service', action='append', choices=services,
+                        help="service to build, defaults to all")
+    parser.add_argument('--version', action='append', default=[],
+                        metavar='SERVICE=VERSION',
+                        help="wsdl version, e.g. ShopConfigService=12")
+    parser.add_argument('--provider', default=os.environ.get('EP_PROVIDER'),
+                        help="defaults to $EP_PROVIDER")
+    parser.add_argument('--username', default=os.environ.get('EP_USERNAME'),
+                        help="defaults to $EP_USERNAME")
+    parser.add_argument('--password', default=os.environ.get('EP_PASSWORD'),
+                        help="defaults to $EP_PASSWORD, which keeps it out "
+                        "of the process list")
+    args = parser.parse_args(argv)
+
+    versions = dict(item.split('=', 1) for item in args.version)
+    os.makedirs(args.output, exist_ok=True)
+
+    for name in args.service or services:
+        kwargs = {}
+        if name in versions:
+            kwargs['version'] = versions[name]
+        service = services[name](
+            server=args.server, provider=args.provider or "",
+            username=args.username or "", password=args.password or "",
+            **kwargs)
+        path = os.path.join(
+            args.output,
+            snapshot_filename(name, getattr(service, 'version', "")))
+        service.save_snapshot(path)
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Local SQLite copy of the shops
+
+Reports and dashboards that each call getAllInfo put a full scan on the
+server for every run. ShopStore keeps the shops in a SQLite file instead,
+sync updates it with one getAllInfo and stores only the shops that
+changed, recognized by a hash of their values. The queries then read the
+file:
+
+    store = ShopStore('/var/lib/epages/shops.sqlite', sc)
+    changes = store.sync()
+    changes.added, changes.modified, changes.deleted
+
+    store.find(ShopType='MinDemo', IsClosed=False)
+    store.by_domain('www.demo.example')
+
+When only some shops are known to be stale, refresh reads those with
+getInfo:
+
+    store.refresh(['DemoShop', 'OtherShop'])
+"""
+import datetime
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import namedtuple
+
+from zeep.exceptions import Fault
+
+from .bulk import DEFAULT_CONCURRENCY
+from .inventory import INDEXED_KEYS, ShopInventory, _domains, _normalize
+from .records import ShopRecord
+from .shop import Shop, ShopAttribute
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+# columns of the shops table besides the values as json, for the queries
+_COLUMNS = sorted(INDEXED_KEYS) + ['MerchantEMail']
+
+
+class ChangeSet(namedtuple('ChangeSet', ('added', 'modified', 'deleted'))):
+    """ aliases of the shops added, modified and deleted by a sync or
+    refresh """
+
+    __slots__ = ()
+
+    @property
+    def empty(self):
+        return not (self.added or self.modified or self.deleted)
+
+
+class ShopStore(object):
+    """ shops of a provider in a SQLite file
+
+    :param path: the database file, created if missing
+    :param provisioning: ShopConfigService used by sync and refresh, the
+                         queries work without
+    """
+
+    def __init__(self, path, provisioning=None):
+        self.path = path
+        self.sc = provisioning
+        self._db = sqlite3.connect(path)
+        self._create_schema()
+
+    def _create_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError("{} has schema version {}, expected {}".format(
+                self.path, version, SCHEMA_VERSION))
+        columns = ''.join(', "{}"'.format(column) for column in _COLUMNS)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS shops ('
+                'alias TEXT PRIMARY KEY, hash TEXT NOT NULL, '
+                'data TEXT NOT NULL{})'.format(columns))
+            for column in _COLUMNS:
+                self._db.execute(
+                    'CREATE INDEX IF NOT EXISTS "shops_{0}" '
+                    'ON shops ("{0}")'.format(column))
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS domains ('
+                'domain TEXT NOT NULL, alias TEXT NOT NULL)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS domains_domain '
+                'ON domains (domain)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS domains_alias '
+                'ON domains (alias)')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                'key TEXT PRIMARY KEY, value)')
+            self._db.execute(
+                'PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+    def sync(self):
+        """ read all shops with getAllInfo and store the changes
+
+        Nothing is stored when getAllInfo fails on the way, a shop is only
+        taken as deleted after a complete response without it. """
+        known = dict(self._db.execute('SELECT alias, hash FROM shops'))
+        added, modified = [], []
+        with self._db:
+            for info in self.sc.iter_all_info():
+                record = ShopRecord.from_info(info)
+                stored = known.pop(record.Alias, None)
+                if self._put(record, stored):
+                    (added if stored is None else modified).append(
+                        record.Alias)
+            deleted = sorted(known)
+            for alias in deleted:
+                self._delete(alias)
+            self._db.execute(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                ('synced_at', time.time()))
+        changes = ChangeSet(added, modified, deleted)
+        logger.debug('Synced %s: %d added, %d modified, %d deleted',
+                     self.path, len(added), len(modified), len(deleted))
+        return changes
+
+    def refresh(self, aliases, concurrency=DEFAULT_CONCURRENCY):
+        """ read the shops with getInfo and store the changes, shops the
+        server does not know anymore are deleted
+
+        The shops read are stored even when some calls fail, the first
+        error is raised afterwards. """
+        results = list(self.sc.map_operation(
+            'get_info_fields', aliases, concurrency=concurrency))
+        added, modified, deleted = [], [], []
+        errors = []
+        with self._db:
+            for result in results:
+                alias = result.item
+                if result.ok:
+                    record = ShopRecord.from_info(result.result)
+                    stored = self._stored_hash(record.Alias)
+                    if self._put(record, stored):
+                        (added if stored is None else modified).append(
+                            record.Alias)
+                elif isinstance(result.error, Fault) and \
+                        Shop.missing_fault.search(result.error.message or ''):
+                    if self._delete(alias):
+                        deleted.append(alias)
+                else:
+                    errors.append(result.error)
+        if errors:
+            raise errors[0]
+        return ChangeSet(added, modified, deleted)
+
+    def _stored_hash(self, alias):
+        row = self._db.execute(
+            'SELECT hash FROM shops WHERE alias = ?', (alias,)).fetchone()
+        return row[0] if row else None
+
+    def _put(self, record, stored=None):
+        """ store the record unless its hash is stored already, returns
+        whether it was stored """
+        data = _encode(record)
+        digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+        if digest == stored:
+            return False
+        values = [record.Alias, digest, data]
+        values.extend(_column_value(record, column) for column in _COLUMNS)
+        self._db.execute(
+            'INSERT OR REPLACE INTO shops VALUES ({})'.format(
+                ', '.join('?' * len(values))), values)
+        self._db.execute('DELETE FROM domains WHERE alias = ?',
+                         (record.Alias,))
+        self._db.executemany(
+            'INSERT INTO domains VALUES (?, ?)',
+            [(domain, record.Alias) for domain in sorted(_domains(record))])
+        return True
+
+    def _delete(self, alias):
+        self._db.execute('DELETE FROM domains WHERE alias = ?', (alias,))
+        return self._db.execute(
+            'DELETE FROM shops WHERE alias = ?', (alias,)).rowcount > 0
+
+    @property
+    def synced_at(self):
+        """ time.time of the last sync, None before the first """
+        row = self._db.execute(
+            'SELECT value FROM meta WHERE key = ?', ('synced_at',)
+        ).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM shops').fetchone()[0]
+
+    def __contains__(self, alias):
+        return self._stored_hash(alias) is not None
+
+    def __iter__(self):
+        return self._records('SELECT data FROM shops ORDER BY alias')
+
+    def get(self, alias, default=None):
+        """ the record of the alias """
+        row = self._db.execute(
+            'SELECT data FROM shops WHERE alias = ?', (alias,)).fetchone()
+        return _decode(row[0]) if row else default
+
+    def find(self, **criteria):
+        """ the shops with all the given values, the keys as for
+        ShopInventory.find
+
+        store.find(ShopType='MinDemo', IsTrialShop=True)
+        """
+        unknown = set(criteria).difference(INDEXED_KEYS)
+        if unknown:
+            raise ValueError("Not indexed: {}".format(
+                ', '.join(sorted(unknown))))
+        where, values = [], []
+        for key, value in sorted(criteria.items()):
+            if value is None:
+                where.append('"{}" IS NULL'.format(key))
+            else:
+                where.append('"{}" = ?'.format(key))
+                values.append(value)
+        query = 'SELECT data FROM shops'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        return list(self._records(query + ' ORDER BY alias', values))
+
+    def by_domain(self, domain):
+        """ the shop with domain as DomainName or one of its
+        SecondaryDomains, None if there is none """
+        row = self._db.execute(
+            'SELECT data FROM shops JOIN domains USING (alias) '
+            'WHERE domain = ? ORDER BY alias LIMIT 1',
+            (_normalize(domain),)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def by_email(self, email):
+        """ the shops of the merchant e-mail """
+        return list(self._records(
+            'SELECT data FROM shops WHERE "MerchantEMail" = ? '
+            'ORDER BY alias', (_normalize(email),)))
+
+    def inventory(self):
+        """ ShopInventory of the stored shops, without calls to the
+        server """
+        return ShopInventory(self.sc, records=self)
+
+    def _records(self, query, values=()):
+        for row in self._db.execute(query, values):
+            yield _decode(row[0])
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _column_value(record, column):
+    value = getattr(record, column)
+    if column == 'MerchantEMail' and value:
+        return _normalize(value)
+    return value
+
+
+def _encode(record):
+    """ the values of the record as json, with sorted keys so that equal
+    records give equal strings """
+    return json.dumps(record.as_dict(), sort_keys=True,
+                      separators=(',', ':'), default=_json_default)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError("Can not store {!r}".format(value))
+
+
+def _decode(data):
+    values = json.loads(data)
+    values['Attributes'] = [ShopAttribute(*attribute)
+                            for attribute in values['Attributes']]
+    if values.get('MarkedForDelOn'):
+        values['MarkedForDelOn'] = datetime.datetime.fromisoformat(
+            values['MarkedForDelOn'])
+    return ShopRecord(**values)
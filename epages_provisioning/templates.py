@@ -0,0 +1,297 @@
+"""
+Pre-rendered envelopes for the hot read operations
+
+exists and getInfo send the same envelope every time, only the alias or
+the feature pack path changes. An EnvelopeTemplate renders the envelope
+once through zeep, with placeholders for the changing values and with
+all the plugins applied, and keeps the bytes around it. A call then only
+joins the bytes with the escaped values and posts them over the transport
+of the client.
+
+The responses are read with lxml directly, only the requested fields are
+converted with the xsd types of the wsdl.
+"""
+import logging
+import re
+from xml.sax.saxutils import escape
+
+from lxml import etree
+from zeep.exceptions import Fault, TransportError
+from zeep.wsdl.utils import etree_to_string
+
+logger = logging.getLogger(__name__)
+
+SOAP_ENVELOPE_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+
+# text we can place in a template slot, anything else goes through zeep
+_VALID_TEXT = re.compile(
+    '^[\u0009\u000A\u000D\u0020-\uD7FF\uE000-\uFFFD'
+    '\U00010000-\U0010FFFF]*$')
+
+# lxml keeps carriage returns as a character reference
+_ENTITIES = {'\r': '&#13;'}
+
+
+class TemplateError(Exception):
+    """ the envelope of the operation or the value can not be used as a
+    template """
+    pass
+
+
+def escape_text(value):
+    """ value as utf-8 element text, like lxml would serialize it """
+    if not isinstance(value, str) or not _VALID_TEXT.match(value):
+        raise TemplateError("Can not use {!r} in a template".format(value))
+    return escape(value, _ENTITIES).encode('utf-8')
+
+
+class EnvelopeTemplate(object):
+    """ the envelope of one operation with slots for text values
+
+    :param client: zeep client with a LocalSchemaTransport, its plugins are
+        applied to the envelope
+    :param service: zeep service bound to the endpoint
+    :param operation: name of the operation
+    :param build: callable, gets one placeholder string per slot and
+        returns the arguments of the operation
+    :param slots: number of values rendered into the envelope
+    """
+
+    placeholder = "EPAGES-TEMPLATE-SLOT-{}"
+
+    def __init__(self, client, service, operation, build, slots=1):
+        self.client = client
+        self.operation = operation
+        binding = service._binding
+        self.address = service._binding_options['address']
+
+        placeholders = [self.placeholder.format(i) for i in range(slots)]
+        envelope, headers = binding._create(
+            operation, build(*placeholders), {},
+            client=client, options=service._binding_options)
+        self.headers = headers
+        self._operation = binding.get(operation)
+
+        content = etree_to_string(envelope)
+        self._parts = []
+        for placeholder in placeholders:
+            parts = content.split(placeholder.encode('ascii'))
+            if len(parts) != 2:
+                raise TemplateError(
+                    "{} appears {} times in the {} envelope".format(
+                        placeholder, len(parts) - 1, operation))
+            self._parts.append(parts[0])
+            content = parts[1]
+        self._parts.append(content)
+
+    def render(self, *values):
+        """ the envelope with values in the slots, as bytes """
+        if len(values) != len(self._parts) - 1:
+            raise TypeError("{} takes {} values, got {}".format(
+                self.operation, len(self._parts) - 1, len(values)))
+        chunks = [self._parts[0]]
+        for value, part in zip(values, self._parts[1:]):
+            chunks.append(escape_text(value))
+            chunks.append(part)
+        return b''.join(chunks)
+
+    def call(self, *values):
+        """ post the rendered envelope, returns the response element
+
+        SOAP faults are raised as zeep.exceptions.Fault, as zeep does. """
+        response = self.client.transport.post(
+            self.address, self.render(*values), self.headers)
+        return parse_response(response)
+
+    async def call_async(self, *values):
+        """ call for a client with an AsyncLocalSchemaTransport """
+        transport = self.client.transport
+        response = await transport.post(
+            self.address, self.render(*values), self.headers)
+        return parse_response(transport.new_response(response))
+
+    def open(self, *values):
+        """ post the rendered envelope, returns the streamed response
+
+        close the response when done with it, the limiter slot is only held
+        until the headers have arrived """
+        transport = self.client.transport
+        with transport.limited() as call:
+            response = transport.session.post(
+                self.address, data=self.render(*values),
+                headers=self.headers, auth=transport.auth,
+                timeout=transport.timeout_for(self.operation), stream=True)
+            call.record(response.status_code)
+        response.raw.decode_content = True
+        return response
+
+    def result_type(self, part=0):
+        """ xsd type of a part of the response """
+        return self._operation.output.body.type.elements[part][1].type
+
+
+def parse_response(response):
+    """ the operation element in the body of the response """
+    try:
+        document = etree.fromstring(response.content)
+    except etree.XMLSyntaxError:
+        raise TransportError(
+            status_code=response.status_code, content=response.content)
+    body = document.find('{%s}Body' % SOAP_ENVELOPE_NS)
+    if body is None or len(body) == 0:
+        raise TransportError(
+            status_code=response.status_code, content=response.content)
+
+    fault = body.find('{%s}Fault' % SOAP_ENVELOPE_NS)
+    if fault is not None:
+        raise _fault(fault)
+    if response.status_code != 200:
+        raise TransportError(
+            status_code=response.status_code, content=response.content)
+    return body[0]
+
+
+def iter_array(source, item_type, fields=None, predicate=None):
+    """ values of the items of the soap array in the response, one by one
+
+    source is a file like object with the response envelope, the return
+    value of the operation has to be an array like the Shops of getAllInfo.
+    Items are dicts of the (requested) fields. predicate is called with all
+    the fields of an item, before the requested ones are picked, and items
+    for which it returns False are skipped. Parsed items are removed from
+    the tree, so only one item is kept in memory at a time. """
+    reader = ArrayReader(item_type, fields, predicate)
+    yield from reader.read(etree.iterparse(
+        source, events=('start', 'end'), huge_tree=True))
+
+
+class ArrayReader(object):
+    """ picks the array items from start and end parse events, see
+    iter_array. Keeps its position between calls to read, so the events
+    can come in chunks as from an lxml.etree.XMLPullParser """
+
+    def __init__(self, item_type, fields=None, predicate=None):
+        self.item_type = item_type
+        self.fields = fields
+        self.predicate = predicate
+        if fields is not None:
+            # unknown fields fail now, not with the first item picked
+            select_fields(
+                dict.fromkeys(name for name, _ in item_type.elements), fields)
+        # Envelope is at depth 0, Header or Body 1, the operation or Fault
+        # 2, the array 3 and the items 4
+        self._depth = -1
+        self._in_body = False
+
+    def read(self, events):
+        """ values of the items completed by events """
+        for event, element in events:
+            if event == 'start':
+                self._depth += 1
+                if self._depth == 1:
+                    self._in_body = \
+                        element.tag == '{%s}Body' % SOAP_ENVELOPE_NS
+                continue
+
+            if self._depth == 4 and self._in_body:
+                # the predicate gets all the fields
+                values = read_fields(
+                    element, self.item_type,
+                    self.fields if self.predicate is None else None)
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+                if self.predicate is None:
+                    yield values
+                elif self.predicate(values):
+                    yield select_fields(values, self.fields)
+            elif self._depth == 2 and self._in_body and \
+                    element.tag == '{%s}Fault' % SOAP_ENVELOPE_NS:
+                raise _fault(element)
+            self._depth -= 1
+
+
+def _fault(fault):
+    """ zeep Fault for the soap Fault element """
+    return Fault(
+        message=fault.findtext('faultstring'),
+        code=fault.findtext('faultcode'),
+        actor=fault.findtext('faultactor'),
+        detail=fault.find('detail'),
+    )
+
+
+def read_value(element, xsd_type):
+    """ python value of element, like zeep would return it
+
+    complex types become dicts, soap arrays lists """
+    if element is None or element.get(XSI_NIL) in ('true', '1'):
+        return None
+
+    array_type = getattr(xsd_type, '_array_type', None)
+    if array_type is not None:
+        item_type = array_type.array_type
+        return [read_value(item, item_type) for item in element]
+
+    elements = getattr(xsd_type, 'elements', None)
+    if elements:
+        return read_fields(element, xsd_type)
+
+    if element.text is None:
+        return None
+    return xsd_type.pythonvalue(element.text)
+
+
+def read_fields(element, xsd_type, fields=None):
+    """ dict of the (requested) child elements of element """
+    children = {}
+    for child in element:
+        if isinstance(child.tag, str):
+            children.setdefault(etree.QName(child).localname, child)
+
+    values = {}
+    for name, child_element in xsd_type.elements:
+        if fields is not None and name not in fields:
+            continue
+        values[name] = read_value(children.get(name), child_element.type)
+    return select_fields(values, fields)
+
+
+def select_fields(values, fields=None):
+    """ the requested fields of values, ValueError for unknown fields """
+    if fields is None:
+        return dict(values)
+    unknown = set(fields).difference(values)
+    if unknown:
+        raise ValueError("Unknown fields {}".format(
+            ", ".join(sorted(unknown))))
+    return {name: values[name] for name in fields}
+
+
+class Templates(object):
+    """ templates of one service, built on first use
+
+    get returns None for operations that can not be templated, the caller
+    then uses zeep. """
+
+    def __init__(self):
+        self._templates = {}
+
+    def get(self, key, client, service, operation, build, slots=1):
+        try:
+            return self._templates[key]
+        except KeyError:
+            pass
+        try:
+            template = EnvelopeTemplate(
+                client, service, operation, build, slots)
+        except TemplateError as error:
+            logger.debug("No template for %s: %s", key, error)
+            template = None
+        self._templates[key] = template
+        return template
+
+    def clear(self):
+        self._templates.clear()
@@ -0,0 +1,190 @@
+"""
+HTTP settings of the services
+
+A TransportConfig holds the connection pool settings and timeouts and
+creates the sessions and transports of the services. Services created with
+the same TransportConfig share its connection pool, so connections (and TLS
+sessions) to the same server are reused between them:
+
+    config = TransportConfig(pool_maxsize=32, timeout=(3, 30),
+                             operation_timeouts={'getAllInfo': (3, 300)})
+    sc = ShopConfigService(..., transport_config=config)
+    fp = FeaturePackService(..., transport_config=config)
+
+Pass a session to use the same requests.Session in all of them. The
+credentials are sent with every request, so services with different users
+can still share it.
+
+The async services share one httpx.AsyncClient per TransportConfig, use
+them from one event loop.
+
+With a limiter.AdaptiveLimiter the calls of all services of the config are
+limited together, see limiter.py. Deadlines and hedging of the idempotent
+operations are in hedging.py.
+"""
+import threading
+
+from requests import Session
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, HTTPAdapter
+
+from .zeep_utils import AsyncLocalSchemaTransport, LocalSchemaTransport
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class TransportConfig(object):
+    """ connection pool and timeout settings, shared by the services
+    created with it
+
+    :param pool_connections: number of hosts to keep connection pools for
+    :param pool_maxsize: max connections kept open per host
+    :param pool_block: wait for a free connection instead of opening more
+                       than pool_maxsize connections to a host
+    :param keep_alive: reuse connections, False closes them after each call
+    :param timeout: timeout of the operations, seconds or a
+                    (connect, read) tuple, None waits forever
+    :param operation_timeouts: timeouts of single operations by name, for
+                               example {'getAllInfo': (3, 300)}
+    :param load_timeout: timeout for loading the wsdl and xsd documents
+    :param max_retries: retries of failed connections, see HTTPAdapter
+    :param session: requests.Session to use in all services, by default
+                    every service gets its own session on the shared pool
+    :param limiter: limiter.AdaptiveLimiter for the calls of all services
+                    created with this config
+    :param deadlines: seconds a whole call of an operation may take, by
+                      name, for example {'exists': 1}
+    :param hedging: hedging.Hedging to send slow idempotent calls twice
+    """
+
+    def __init__(
+            self,
+            pool_connections=DEFAULT_POOLSIZE,
+            pool_maxsize=DEFAULT_POOLSIZE,
+            pool_block=DEFAULT_POOLBLOCK,
+            keep_alive=True,
+            timeout=None,
+            operation_timeouts=None,
+            load_timeout=300,
+            max_retries=0,
+            session=None,
+            limiter=None,
+            deadlines=None,
+            hedging=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.operation_timeouts = dict(operation_timeouts or {})
+        self.load_timeout = load_timeout
+        self.max_retries = max_retries
+        self.session = session
+        self.limiter = limiter
+        self.deadlines = dict(deadlines or {})
+        self.hedging = hedging
+
+        self._adapter = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def adapter(self):
+        """ the HTTPAdapter with the connection pool, created on first use """
+        with self._lock:
+            if self._adapter is None:
+                self._adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=self.max_retries,
+                    pool_block=self.pool_block,
+                )
+        return self._adapter
+
+    @property
+    def async_client(self):
+        """ the httpx.AsyncClient of the async services, created on first
+        use. httpx limits the connections over all hosts, pool_maxsize
+        connections are kept open, pool_block caps all connections to it """
+        if httpx is None:
+            raise RuntimeError(
+                "The async services need httpx, install "
+                "epages_provisioning[async]")
+        with self._lock:
+            if self._async_client is None:
+                limits = httpx.Limits(
+                    max_connections=(
+                        self.pool_maxsize if self.pool_block else None),
+                    max_keepalive_connections=(
+                        self.pool_maxsize if self.keep_alive else 0),
+                )
+                self._async_client = httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(
+                        limits=limits, retries=self.max_retries),
+                )
+        return self._async_client
+
+    def create_session(self, auth=None):
+        """ the shared session, or a new session on the shared pool
+
+        auth is only set on new sessions, the transports send it with every
+        request anyway """
+        if self.session is not None:
+            return self.session
+        session = Session()
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        session.auth = auth
+        return session
+
+    def create_transport(self, auth=None, cache=None, version=""):
+        """ LocalSchemaTransport for a service with these settings """
+        return LocalSchemaTransport(
+            session=self.create_session(auth),
+            cache=cache,
+            timeout=self.load_timeout,
+            operation_timeout=self.timeout,
+            version=version,
+            auth=auth,
+            operation_timeouts=self.operation_timeouts,
+            limiter=self.limiter,
+            deadlines=self.deadlines,
+            hedging=self.hedging,
+        )
+
+    def create_async_transport(self, auth=None, cache=None, version=""):
+        """ AsyncLocalSchemaTransport for an async service, auth is the
+        requests HTTPBasicAuth of the service """
+        wsdl_transport = self.create_transport(auth, cache, version)
+        return AsyncLocalSchemaTransport(
+            self.async_client,
+            wsdl_transport,
+            auth=httpx.BasicAuth(auth.username, auth.password)
+            if auth is not None else None,
+            operation_timeout=self.timeout,
+            operation_timeouts=self.operation_timeouts,
+            limiter=self.limiter,
+            deadlines=self.deadlines,
+            hedging=self.hedging,
+        )
+
+    def close(self):
+        """ close the pooled connections """
+        if self.hedging is not None:
+            self.hedging.close()
+        with self._lock:
+            if self._adapter is not None:
+                self._adapter.close()
+                self._adapter = None
+
+    async def aclose(self):
+        """ close the pooled connections of the async services too """
+        self.close()
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
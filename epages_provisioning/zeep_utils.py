@@ -1,13 +1,194 @@
+import asyncio
 import logging
 import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import asynccontextmanager, closing, contextmanager
 from urllib.parse import urlparse
+
+import platformdirs
+import requests
 from lxml import etree
 
 from zeep import Plugin
-from zeep.transports import Transport
+from zeep.cache import Base
+from zeep.transports import AsyncTransport, Transport
+
+from .hedging import DeadlineExceeded, cap_timeout, deadline_end, remaining
+from .limiter import LimiterTimeout
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 logger = logging.getLogger(__name__)
 
+SOAP_ENCODING_URL = 'http://schemas.xmlsoap.org/soap/encoding/'
+FEATUREPACK_TYPES_NS = "urn://epages.de/WebService/FeaturePackTypes/2005/03"
+
+CachedDocument = namedtuple(
+    'CachedDocument', ('content', 'etag', 'last_modified', 'expired'))
+
+
+def _get_default_cache_path():
+    """ sqlite file in the users cache directory """
+    path = platformdirs.user_cache_dir('epages_provisioning', False)
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, 'documents.db')
+
+
+class DocumentCache(Base):
+    """
+    Persistent cache for wsdl and xsd documents, stored in a sqlite file
+
+    Documents are stored per url and wsdl version together with the ETag and
+    Last-Modified headers from the server. Inside the timeout the stored copy
+    is used as is, after that the document is revalidated with a conditional
+    GET and the stored copy is reused if the server answers 304.
+
+    The content stored is what LocalSchemaTransport returns, so the patched
+    FeaturePack documents are not patched again on every startup.
+
+    :param path: sqlite database file, defaults to the users cache directory
+    :param timeout: seconds to use a document without revalidation,
+                    None means forever
+    """
+
+    def __init__(self, path=None, timeout=3600):
+        if sqlite3 is None:
+            raise RuntimeError("sqlite3 module is required for DocumentCache")
+        if path == ":memory:":
+            raise ValueError("DocumentCache needs a file, not :memory:")
+
+        self._lock = threading.RLock()
+        self._timeout = timeout
+        self._db_path = path if path else _get_default_cache_path()
+
+        with self._connection() as conn:
+            conn.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS document
+                    (url TEXT, version TEXT, created REAL, etag TEXT,
+                     last_modified TEXT, content BLOB,
+                     PRIMARY KEY (url, version))
+                """
+            )
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            connection = sqlite3.connect(self._db_path)
+            try:
+                with connection:
+                    yield connection
+            finally:
+                connection.close()
+
+    def add(self, url, content, version="", etag=None, last_modified=None):
+        """ store the document, replacing the older copy """
+        logger.debug("Caching contents of %s (version %s)", url, version)
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO document "
+                "(url, version, created, etag, last_modified, content) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, version, time.time(), etag, last_modified,
+                 sqlite3.Binary(content)),
+            )
+
+    def lookup(self, url, version=""):
+        """ returns CachedDocument or None, also for expired documents """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT created, etag, last_modified, content FROM document "
+                "WHERE url = ? AND version = ?",
+                (url, version),
+            ).fetchone()
+        if row is None:
+            return None
+        created, etag, last_modified, content = row
+        expired = (self._timeout is not None
+                   and time.time() > created + self._timeout)
+        return CachedDocument(bytes(content), etag, last_modified, expired)
+
+    def get(self, url, version=""):
+        """ returns the document if it has not expired yet """
+        cached = self.lookup(url, version)
+        if cached is None or cached.expired:
+            logger.debug("Cache MISS for %s", url)
+            return None
+        logger.debug("Cache HIT for %s", url)
+        return cached.content
+
+    def touch(self, url, version=""):
+        """ mark the stored document as fresh again """
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE document SET created = ? "
+                "WHERE url = ? AND version = ?",
+                (time.time(), url, version),
+            )
+
+    def clear(self):
+        """ remove all stored documents """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM document")
+
+
+class SchemaRegistry(object):
+    """
+    Process wide store of parsed wsdl documents
+
+    Services created with shared=True get their zeep wsdl document (and the
+    type registry in it) from here, so the same wsdl is parsed and kept in
+    memory only once. Each service still has its own client, session,
+    credentials and endpoint.
+    """
+
+    def __init__(self):
+        self._documents = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """ returns the document for key, calling loader() only once """
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                return document
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                document = self._documents.get(key)
+            if document is None:
+                logger.debug("Loading shared wsdl document for %s", key)
+                document = loader()
+                with self._lock:
+                    self._documents[key] = document
+                    self._loading.pop(key, None)
+        return document
+
+    def clear(self):
+        """ forget all documents, the next services parse them again """
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self):
+        return len(self._documents)
+
+
+#: the registry used by the services
+schema_registry = SchemaRegistry()
+
+
 class LocalSchemaTransport(Transport):
     """
     Overrides Transport to accommodate local version of schema for http://schemas.xmlsoap.org/soap/encoding/
@@ -15,9 +196,89 @@ class LocalSchemaTransport(Transport):
     Thanks: https://github.com/mvantellingen/python-zeep/issues/1417
 
     If zeep starts to do this natively this can be removed
+
+    Also patches the FeaturePack wsdl and xsd namespaces and, when given
+    a DocumentCache as cache, revalidates the cached documents with
+    ETag/Last-Modified.
+
+    :param version: wsdl version, used as part of the cache key
+    :param auth: requests auth sent with every request, so that services
+                 with different users can share a session
+    :param operation_timeouts: timeouts of single operations by name, the
+                               others use operation_timeout
+    :param limiter: limiter.AdaptiveLimiter for the operations
+    :param deadlines: seconds a whole call of an operation may take, by name
+    :param hedging: hedging.Hedging for the idempotent operations
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, version="", auth=None, operation_timeouts=None,
+                 limiter=None, deadlines=None, hedging=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.version = version
+        self.auth = auth
+        self.operation_timeouts = operation_timeouts or {}
+        self.limiter = limiter
+        self.deadlines = deadlines or {}
+        self.hedging = hedging
+
+    def timeout_for(self, operation):
+        """ timeout of the operation """
+        return self.operation_timeouts.get(operation, self.operation_timeout)
+
+    def post(self, address, message, headers):
+        """ post with our auth, the timeout and deadline of the operation
+        and hedged if allowed, the operation is taken from the SOAPAction
+        header """
+        soapaction = headers.get('SOAPAction', '').strip('"')
+        operation = soapaction.rsplit('#', 1)[-1]
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("HTTP Post to %s:\n%s", address, message)
+
+        end = deadline_end(self.deadlines.get(operation))
+
+        def send():
+            return self._send(address, message, headers, operation, end)
+
+        if self.hedging is not None and self.hedging.applies(operation):
+            response = self.hedging.send(send, operation, end)
+        else:
+            response = send()
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "HTTP Response from %s (status: %d):\n%s",
+                address, response.status_code, response.content)
+        return response
+
+    def _send(self, address, message, headers, operation, end=None):
+        """ one post, end is the deadline as time.monotonic """
+        timeout = self.timeout_for(operation)
+        with self.limited(remaining(end)) as call:
+            capped = cap_timeout(timeout, remaining(end))
+            try:
+                response = self.session.post(
+                    address, data=message, headers=headers, auth=self.auth,
+                    timeout=capped)
+            except requests.exceptions.Timeout as error:
+                if capped != timeout:
+                    raise DeadlineExceeded(
+                        "Deadline of {} exceeded".format(operation)
+                    ) from error
+                raise
+            call.record(response.status_code)
+        return response
+
+    @contextmanager
+    def limited(self, timeout=None):
+        """ hold a slot of the limiter for the block, if there is one,
+        waiting at most timeout seconds for it """
+        if self.limiter is None:
+            yield _NoLimit()
+            return
+        try:
+            with self.limiter.call(timeout) as call:
+                yield call
+        except LimiterTimeout:
+            raise DeadlineExceeded("No free slot before the deadline")
 
     def load(self, url):
         """Load the content from the given URL"""
@@ -27,45 +288,22 @@ class LocalSchemaTransport(Transport):
         scheme = urlparse(url).scheme
         if scheme in ("http", "https", "file"):
 
-            if self.cache:
-                response = self.cache.get(url)
-                if response:
-                    return bytes(response)
-
-            # fix feature namespaces
-            if url.endswith("FeaturePackService.wsdl"):
-                logger.debug(f"Patching WSDL {url}")
-                parser = etree.XMLParser(ns_clean=True, recover=True)
-                content = super().load(url)
-                doc = etree.fromstring(content, parser=parser)
-
-                # Fix the import namespace in WSDL to match the XSD targetNamespace exactly
-                for imp in doc.xpath("//xsd:import", namespaces={'xsd': 'http://www.w3.org/2001/XMLSchema'}):
-                    imp.attrib['namespace'] = "urn://epages.de/WebService/FeaturePackTypes/2005/03"
-
-
-                return etree.tostring(doc)
-
-            elif url.endswith("FeaturePackTypes.xsd"):
-                logger.debug(f"Patching XSD {url}")
-                parser = etree.XMLParser(ns_clean=True, recover=True)
-                content = super().load(url)
-                doc = etree.fromstring(content, parser=parser)
-
-                expected_ns = "urn://epages.de/WebService/FeaturePackTypes/2005/03"
-                current_ns = doc.attrib.get('targetNamespace', '')
-                if current_ns != expected_ns:
-                    doc.attrib['targetNamespace'] = expected_ns
-                return etree.tostring(doc)
-
             # this url was causing some issues (404 errors); it is now saved locally for fast retrieval when needed
-            if url == 'http://schemas.xmlsoap.org/soap/encoding/':
+            if url == SOAP_ENCODING_URL:
                 DIR_ABS_PATH = os.path.dirname(__file__)
                 soap_encodings_file = os.path.join(DIR_ABS_PATH, 'data', 'soap-encodings.xml')
                 with open(soap_encodings_file, 'rb') as fh:
                     return fh.read()
 
-            content = self._load_remote_data(url)
+            if isinstance(self.cache, DocumentCache):
+                return self._load_revalidated(url)
+
+            if self.cache:
+                response = self.cache.get(url)
+                if response:
+                    return bytes(response)
+
+            content = self._patch_document(url, self._load_remote_data(url))
 
             if self.cache:
                 self.cache.add(url, content)
@@ -75,6 +313,183 @@ class LocalSchemaTransport(Transport):
             with open(os.path.expanduser(url), "rb") as fh:
                 return fh.read()
 
+    def _load_revalidated(self, url):
+        """ load through the DocumentCache, revalidating expired copies """
+        cached = self.cache.lookup(url, self.version)
+        if cached is not None and not cached.expired:
+            logger.debug("Cache HIT for %s", url)
+            return cached.content
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        logger.debug("Loading remote data from: %s", url)
+        response = self.session.get(
+            url, headers=headers, auth=self.auth, timeout=self.load_timeout)
+        with closing(response):
+            if cached is not None and response.status_code == 304:
+                logger.debug("Not modified, reusing cached %s", url)
+                self.cache.touch(url, self.version)
+                return cached.content
+            response.raise_for_status()
+            content = self._patch_document(url, response.content)
+            self.cache.add(
+                url, content, self.version,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+        return content
+
+    def _load_remote_data(self, url):
+        logger.debug("Loading remote data from: %s", url)
+        response = self.session.get(
+            url, auth=self.auth, timeout=self.load_timeout)
+        response.raise_for_status()
+        return response.content
+
+    def _patch_document(self, url, content):
+        """ fix feature namespaces, other documents are returned as is """
+        if url.endswith("FeaturePackService.wsdl"):
+            logger.debug(f"Patching WSDL {url}")
+            parser = etree.XMLParser(ns_clean=True, recover=True)
+            doc = etree.fromstring(content, parser=parser)
+
+            # Fix the import namespace in WSDL to match the XSD targetNamespace exactly
+            for imp in doc.xpath("//xsd:import", namespaces={'xsd': 'http://www.w3.org/2001/XMLSchema'}):
+                imp.attrib['namespace'] = FEATUREPACK_TYPES_NS
+
+            return etree.tostring(doc)
+
+        elif url.endswith("FeaturePackTypes.xsd"):
+            logger.debug(f"Patching XSD {url}")
+            parser = etree.XMLParser(ns_clean=True, recover=True)
+            doc = etree.fromstring(content, parser=parser)
+
+            current_ns = doc.attrib.get('targetNamespace', '')
+            if current_ns != FEATUREPACK_TYPES_NS:
+                doc.attrib['targetNamespace'] = FEATUREPACK_TYPES_NS
+            return etree.tostring(doc)
+
+        return content
+
+
+class AsyncLocalSchemaTransport(AsyncTransport):
+    """ AsyncTransport for the operations, the documents are loaded with
+    a LocalSchemaTransport so they get the same patching and caching
+
+    :param client: httpx.AsyncClient for the operations, can be shared
+    :param wsdl_transport: LocalSchemaTransport for loading the documents
+    :param auth: httpx auth sent with every request
+    :param operation_timeout: timeout of the operations, seconds or a
+                              (connect, read) tuple
+    :param operation_timeouts: timeouts of single operations by name
+    :param limiter: limiter.AdaptiveLimiter for the operations
+    :param deadlines: seconds a whole call of an operation may take, by name
+    :param hedging: hedging.Hedging for the idempotent operations
+    """
+    def __init__(self, client, wsdl_transport, auth=None,
+                 operation_timeout=None, operation_timeouts=None,
+                 limiter=None, deadlines=None, hedging=None):
+        if httpx is None:
+            raise RuntimeError(
+                "The async services need httpx, install "
+                "epages_provisioning[async]")
+        # AsyncTransport.__init__ would create clients of its own
+        self._close_session = False
+        self.client = client
+        self.wsdl_transport = wsdl_transport
+        self.cache = wsdl_transport.cache
+        self.load_timeout = wsdl_transport.load_timeout
+        self.operation_timeout = operation_timeout
+        self.operation_timeouts = operation_timeouts or {}
+        self.auth = auth
+        self.limiter = limiter
+        self.deadlines = deadlines or {}
+        self.hedging = hedging
+        self.logger = logging.getLogger(__name__)
+
+    def load(self, url):
+        return self.wsdl_transport.load(url)
+
+    def timeout_for(self, operation, left=None):
+        """ httpx timeout of the operation, capped to left seconds """
+        timeout = cap_timeout(self.operation_timeouts.get(
+            operation, self.operation_timeout), left)
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return timeout
+
+    async def post(self, address, message, headers):
+        """ post with our auth, the timeout and deadline of the operation
+        and hedged if allowed """
+        soapaction = headers.get('SOAPAction', '').strip('"')
+        operation = soapaction.rsplit('#', 1)[-1]
+        self.logger.debug("HTTP Post to %s:\n%s", address, message)
+
+        end = deadline_end(self.deadlines.get(operation))
+
+        def send():
+            return self._send(address, message, headers, operation, end)
+
+        if self.hedging is not None and self.hedging.applies(operation):
+            response = await self.hedging.send_async(send, operation, end)
+        elif end is not None:
+            try:
+                response = await asyncio.wait_for(send(), remaining(end))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(
+                    "Deadline of {} exceeded".format(operation))
+        else:
+            response = await send()
+        self.logger.debug(
+            "HTTP Response from %s (status: %d):\n%s",
+            address, response.status_code, response.content)
+        return response
+
+    async def _send(self, address, message, headers, operation, end=None):
+        """ one post, end is the deadline as time.monotonic """
+        async with self.limited() as call:
+            left = remaining(end)
+            try:
+                response = await self.client.post(
+                    address, content=message, headers=headers,
+                    auth=self.auth, timeout=self.timeout_for(operation, left))
+            except httpx.TimeoutException as error:
+                timeout = self.operation_timeouts.get(
+                    operation, self.operation_timeout)
+                if cap_timeout(timeout, left) != timeout:
+                    raise DeadlineExceeded(
+                        "Deadline of {} exceeded".format(operation)
+                    ) from error
+                raise
+            call.record(response.status_code)
+        return response
+
+    @asynccontextmanager
+    async def limited(self):
+        """ hold a slot of the limiter for the block, if there is one """
+        if self.limiter is None:
+            yield _NoLimit()
+        else:
+            async with self.limiter.call_async() as call:
+                yield call
+
+    async def aclose(self):
+        # the client belongs to the TransportConfig
+        pass
+
+
+class _NoLimit(object):
+    """ stands in for the limiter call without a limiter """
+
+    def record(self, status_code):
+        pass
+
 
 class BooleanFixer(Plugin):
     """ ePages does not like boolean values as being "false"
@@ -118,6 +533,38 @@ class ArrayFixer(Plugin):
     def ingress(self, envelope, http_headers, operation):
         return envelope, http_headers
 
+    @staticmethod
+    def wrap_feature_packs(feature_packs):
+        """ wrap the FeaturePacks children into array/item elements """
+        logger.debug("Mangling FeaturePacks element, to arraytype")
+        # Create a new wrapper element array
+        array = etree.Element(
+            "{http://schemas.xmlsoap.org/soap/encoding/}Array",
+            nsmap={
+                "soapenc": "http://schemas.xmlsoap.org/soap/encoding/",
+                "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+                "xsd": "http://www.w3.org/2001/XMLSchema",
+            },
+        )
+        array.attrib[
+            "{http://www.w3.org/2001/XMLSchema-instance}type"
+        ] = "soapenc:Array"
+        array.attrib[
+            "{http://schemas.xmlsoap.org/soap/encoding/}arrayType"
+        ] = "xsd:anyType[1]"
+
+        # Create <item> and move FeaturePacks' children into it
+        item = etree.Element("item")
+        for child in list(feature_packs):
+            feature_packs.remove(child)
+            item.append(child)
+
+        array.append(item)
+
+        parent = feature_packs.getparent()
+        if parent is not None:
+            parent.replace(feature_packs, array)
+
     def egress(self, envelope, http_headers, operation, binding_options):
         """ force array type to SecondaryDomains, AdditionalAttributes
         Attributes and Languages elements. And remove xsitype from items """
@@ -218,34 +665,150 @@ class ArrayFixer(Plugin):
         # There is probably a better way to do this, but I couldn't find it.
         # Wrap the feature pair in array/item elements. It requires the TApplyToShop_Input type, which only acceps strings...
         if((operation.name == 'applyToShop' or operation.name == 'removeFromShop') and feature_packs is not None):
-            logger.debug("Mangling FeaturePacks element, to arraytype")
-            # Create a new wrapper element array
-            array = etree.Element(
-                "{http://schemas.xmlsoap.org/soap/encoding/}Array",
-                nsmap={
-                    "soapenc": "http://schemas.xmlsoap.org/soap/encoding/",
-                    "xsi": "http://www.w3.org/2001/XMLSchema-instance",
-                    "xsd": "http://www.w3.org/2001/XMLSchema",
-                },
-            )
-            array.attrib[
-                "{http://www.w3.org/2001/XMLSchema-instance}type"
-            ] = "soapenc:Array"
-            array.attrib[
-                "{http://schemas.xmlsoap.org/soap/encoding/}arrayType"
-            ] = "xsd:anyType[1]"
+            self.wrap_feature_packs(feature_packs)
+
+        return envelope, http_headers
+
+
+SOAP_ENCODING_ARRAYTYPE = "{http://schemas.xmlsoap.org/soap/encoding/}arrayType"
+
+
+class EnvelopeFixer(Plugin):
+    """ ArrayFixer and BooleanFixer in one pass over the envelope
+
+    Produces the same envelopes as ArrayFixer followed by BooleanFixer, but
+    collects all the elements to fix with one walk of the tree instead of a
+    search per element name. The element names an operation can send are
+    looked up once per operation from the wsdl, operations without arrays
+    or booleans are not walked at all.
+    """
+
+    # element name, arrayType of the items, in the order of ArrayFixer.
+    # The arrayType of Attributes and FeaturePacks depend on the envelope.
+    arrays = (
+        ('SecondaryDomains', 'ns1:string'),
+        ('AdditionalAttributes', 'ns1:anyType'),
+        ('Attributes', None),
+        ('Languages', 'ns2:string'),
+        ('LanguageCodes', 'ns2:string'),
+        ('AttributeNames', 'ns2:string'),
+        ('FeaturePacks', None),
+    )
 
-            # Create <item> and move FeaturePacks' children into it
-            item = etree.Element("item")
-            for child in list(feature_packs):
-                feature_packs.remove(child)
-                item.append(child)
+    booleans = BooleanFixer.elements
 
-            array.append(item)
+    # operations that want the feature pair wrapped in an array
+    wrap_operations = ('applyToShop', 'removeFromShop')
 
-            parent = feature_packs.getparent()
-            if parent is not None:
-                parent.replace(feature_packs, array)
+    def __init__(self):
+        self._tags = {}
+        self._all_tags = frozenset(
+            [name for name, _ in self.arrays] + list(self.booleans))
 
+    def ingress(self, envelope, http_headers, operation):
+        return envelope, http_headers
+
+    def egress(self, envelope, http_headers, operation, binding_options):
+        tags = self._tags_for(operation)
+        if not tags:
+            return envelope, http_headers
+
+        # first element of each name, as envelope.find(".//name") would.
+        # TAttribute items are only looked for to choose the arrayType
+        found = {}
+        for element in envelope.iter(*tags):
+            if element.tag not in found:
+                found[element.tag] = element
+                if len(found) == len(tags):
+                    break
+
+        self._fix_arrays(envelope, found, operation)
+
+        for elementkey in self.booleans:
+            element = found.get(elementkey)
+            if element is not None and element.text == "false":
+                element.text = "0"
 
         return envelope, http_headers
+
+    def _tags_for(self, operation):
+        """ element names to look for in the envelopes of operation """
+        try:
+            return self._tags[operation]
+        except (KeyError, TypeError):
+            pass
+        try:
+            names = set()
+            self._collect_names(operation.input.body.type, names, set())
+            tags = self._all_tags.intersection(names)
+        except _UnknownContent:
+            tags = self._all_tags
+        except Exception:
+            logger.debug("Could not analyze %s, using all rules", operation)
+            tags = self._all_tags
+        if 'Attributes' in tags:
+            # the arrayType of Attributes depends on TAttribute items
+            tags = tags.union(('TAttribute',))
+        tags = tuple(sorted(tags))
+        try:
+            self._tags[operation] = tags
+        except TypeError:
+            pass
+        logger.debug("Envelope rules for %s: %s", operation, tags)
+        return tags
+
+    def _collect_names(self, xsd_type, names, seen):
+        """ all element names the type can produce in the envelope """
+        if xsd_type is None or id(xsd_type) in seen:
+            return
+        seen.add(id(xsd_type))
+
+        array_type = getattr(xsd_type, '_array_type', None)
+        if array_type is not None:
+            # soapenc array items are named after their type
+            item_type = array_type.array_type
+            if getattr(item_type, 'qname', None) is not None:
+                names.add(etree.QName(item_type.qname).localname)
+            self._collect_names(item_type, names, seen)
+            return
+
+        for name, element in getattr(xsd_type, 'elements', ()):
+            if name is None or getattr(element, 'type', None) is None:
+                # xsd:any, could be anything
+                raise _UnknownContent(name)
+            names.add(name)
+            self._collect_names(element.type, names, seen)
+
+    def _fix_arrays(self, envelope, found, operation):
+        """ same changes as ArrayFixer.egress, in the same order so that the
+        generated namespace prefixes match """
+        for name, arraytype in self.arrays:
+            element = found.get(name)
+            if element is None:
+                continue
+            logger.debug("Mangling %s element, to arraytype", name)
+            if name == 'Attributes':
+                # getinfo and update want different types...
+                if 'TAttribute' in found:
+                    arraytype = 'ns1:Tattribute'
+                else:
+                    arraytype = 'ns1:string'
+            elif name == 'FeaturePacks':
+                if operation.name in self.wrap_operations:
+                    arraytype = 'ns2:string'
+                else:
+                    arraytype = 'ns3:string'
+            element.attrib[SOAP_ENCODING_ARRAYTYPE] = "{}[{}]".format(
+                arraytype, len(element))
+            for item in element:
+                item.attrib.clear()
+
+        feature_packs = found.get('FeaturePacks')
+        if feature_packs is not None and \
+                operation.name in self.wrap_operations:
+            ArrayFixer.wrap_feature_packs(feature_packs)
+
+
+class _UnknownContent(Exception):
+    """ the type allows elements we can not know beforehand """
+    pass
@@ -13,8 +13,15 @@ with open('HISTORY.rst') as history_file:
 
 requirements = [
     'zeep==4.2.1',
+    # DocumentCache keeps its file in the users cache directory
+    'platformdirs',
 ]
 
+extras_requirements = {
+    # AsyncShopConfigService and the other async services
+    'async': ['httpx'],
+}
+
 setup_requirements = [
     # TODO: put setup requirements (distutils extensions, etc.) here
 ]
@@ -35,6 +42,13 @@ setup(
     packages=find_packages(include=['epages_provisioning']),
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
+    entry_points={
+        'console_scripts': [
+            'epages-snapshot=epages_provisioning.snapshot:main',
+            'epages-bundle=epages_provisioning.bundle:main',
+        ],
+    },
     license="MIT license",
     zip_safe=False,
     keywords='epages_provisioning',
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""Local stand-in for an ePages server, used by the offline tests.
+
+Serves the reduced wsdl files from tests/data under /WebRoot/WSDL/ and
+answers SOAP calls posted to /epages/Site.soap with the handler registered
+for the operation.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+ENVELOPE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<soap:Envelope'
+    ' xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"'
+    ' xmlns:soapenc="http://schemas.xmlsoap.org/soap/encoding/"'
+    ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+    ' xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+    '<soap:Body>{}</soap:Body></soap:Envelope>'
+)
+
+SHOPCONFIG_NS = 'urn://epages.de/WebService/ShopConfigService/2011/04'
+
+
+def soap_response(operation, body, namespace=SHOPCONFIG_NS):
+    """ wrap body into a rpc response envelope """
+    return ENVELOPE.format(
+        '<ns:{op}Response xmlns:ns="{ns}">{body}</ns:{op}Response>'.format(
+            op=operation, ns=namespace, body=body)
+    ).encode('utf-8')
+
+
+def soap_fault(message):
+    """ SOAP fault envelope, as ePages returns for unknown objects """
+    return ENVELOPE.format(
+        '<soap:Fault><faultcode>soap:Server</faultcode>'
+        '<faultstring>{}</faultstring></soap:Fault>'.format(message)
+    ).encode('utf-8')
+
+
+class InFlight(object):
+    """ handler wrapper counting the calls running at the same time
+
+    delay is seconds or a function of the calls running, to play a server
+    that slows down under load """
+
+    def __init__(self, handler, delay=0.02):
+        self.handler = handler
+        self.delay = delay
+        self.current = self.max = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, body):
+        with self.lock:
+            self.current += 1
+            self.max = max(self.max, self.current)
+            current = self.current
+        try:
+            time.sleep(self.delay(current) if callable(self.delay)
+                       else self.delay)
+            return self.handler(body)
+        finally:
+            with self.lock:
+                self.current -= 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this every keep-alive
+    # response waits for the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        name = self.path.rsplit('/', 1)[-1]
+        path = os.path.join(DATA_DIR, name)
+        if not self.path.startswith('/WebRoot/WSDL/') or \
+                not os.path.exists(path):
+            self._send(404, b'')
+            return
+        self.server.fake.wsdl_requests[name] += 1
+        with open(path, 'rb') as fh:
+            self._send(200, fh.read())
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        operation = self.headers.get('SOAPAction', '').strip('"')
+        operation = operation.rsplit('#', 1)[-1]
+        fake = self.server.fake
+        with fake.lock:
+            fake.calls[operation] += 1
+            fake.requests.append((operation, body))
+            fake.headers.append(self.headers)
+        handler = fake.handlers.get(operation)
+        if handler is None:
+            self._send(500, soap_fault("No handler for " + operation))
+            return
+        status, content = handler(body)
+        self._send(status, content)
+
+    def _send(self, status, content):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # the benchmarks open many connections at once, the default backlog of
+    # 5 resets them
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeEpages(object):
+    """ threaded local server, use as a context manager
+
+    with FakeEpages() as fake:
+        fake.handlers['exists'] = lambda body: (200, soap_response(...))
+        sc = ShopConfigService(server=fake.server, ...)
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.calls = Counter()
+        self.wsdl_requests = Counter()
+        self.requests = []
+        self.headers = []
+        self.lock = threading.Lock()
+        self._httpd = _Server(('127.0.0.1', 0), _Handler)
+        self._httpd.fake = self
+        self.server = 'http://127.0.0.1:{}'.format(self._httpd.server_port)
+
+    def start(self):
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.requests.clear()
+            self.headers.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.aio`, these run without ePages."""
+
+import asyncio
+import unittest
+
+from zeep.exceptions import Fault
+
+from epages_provisioning.hedging import DeadlineExceeded, Hedging
+from epages_provisioning.limiter import AdaptiveLimiter
+from epages_provisioning.resultcache import ResultCache
+from epages_provisioning.transport import TransportConfig
+
+from .fake_epages import FakeEpages, InFlight, soap_response
+from .test_hedging import slow, slow_first
+from .test_templates import (
+    all_info_handler, exists_handler, feature_handler, info_handler
+)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+else:
+    from epages_provisioning.aio import (
+        AsyncFeaturePackService, AsyncShop, AsyncShopConfigService
+    )
+
+
+def update_handler(body):
+    return 200, soap_response('update', '')
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestAsyncServices(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'exists': exists_handler,
+            'getInfo': info_handler,
+            'update': update_handler,
+            'getAllInfo': all_info_handler(20),
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    async def asyncSetUp(self):
+        self._fake.reset()
+        self._config = TransportConfig()
+        self._sc = AsyncShopConfigService(
+            server=self._fake.server, provider='Distributor',
+            username='admin', password='admin',
+            transport_config=self._config)
+
+    async def asyncTearDown(self):
+        await self._config.aclose()
+
+    async def test_operations(self):
+        shopref = self._sc.get_shopref_obj({'Alias': 'DemoShop'})
+        self.assertIs(await self._sc.exists(shopref), True)
+        info = await self._sc.get_info(
+            self._sc.get_infoshop_obj({'Alias': 'DemoShop'}))
+        self.assertEqual(info.DomainName, 'demo.example')
+        with self.assertRaises(Fault):
+            await self._sc.get_info(
+                self._sc.get_infoshop_obj({'Alias': 'Missing'}))
+        with self.assertRaises(TypeError):
+            await self._sc.exists(
+                self._sc.get_infoshop_obj({'Alias': 'DemoShop'}))
+
+    async def test_same_envelopes(self):
+        await self._sc.exists(self._sc.get_shopref_obj({'Alias': 'DemoShop'}))
+        await self._sc.alias_exists('DemoShop')
+        (_, zeep_body), (_, template_body) = self._fake.requests
+        self.assertEqual(zeep_body, template_body)
+
+    async def test_fast_paths(self):
+        self.assertIs(await self._sc.alias_exists('DemoShop'), True)
+        self.assertIs(await self._sc.alias_exists('Other'), False)
+        self.assertEqual(
+            await self._sc.get_info_fields('DemoShop', ['IsClosed']),
+            {'IsClosed': True})
+
+    async def test_iter_all_info(self):
+        shops = [shop async for shop in self._sc.iter_all_info(
+            ['Alias'], lambda shop: shop['Alias'] != 'Shop1')]
+        self.assertEqual(len(shops), 19)
+        self.assertEqual(shops[0], {'Alias': 'Shop0'})
+
+    async def test_map_operation(self):
+        in_flight = InFlight(exists_handler, 0.05)
+        self._fake.handlers['exists'] = in_flight
+        try:
+            results = [result async for result in self._sc.map_operation(
+                'exists', ['DemoShop', 'Other'] * 5, concurrency=3)]
+        finally:
+            self._fake.handlers['exists'] = exists_handler
+        self.assertEqual([result.index for result in results],
+                         list(range(10)))
+        self.assertEqual([result.result for result in results],
+                         [True, False] * 5)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertLessEqual(in_flight.max, 3)
+        self.assertEqual(self._fake.calls['exists'], 10)
+
+    async def test_bulk(self):
+        results = [result async for result in self._sc.bulk(
+            [('exists', 'DemoShop'), ('get_info', 'Missing'),
+             ('get_info', 'DemoShop')], ordered=False)]
+        results.sort(key=lambda result: result.index)
+        self.assertIs(results[0].result, True)
+        self.assertIsInstance(results[1].error, Fault)
+        self.assertEqual(results[2].result.DomainName, 'demo.example')
+
+    async def test_concurrent(self):
+        results = await asyncio.gather(*[
+            self._sc.alias_exists('DemoShop') for i in range(50)])
+        self.assertEqual(results, [True] * 50)
+        self.assertEqual(self._fake.calls['exists'], 50)
+
+    async def test_limiter(self):
+        in_flight = InFlight(exists_handler, 0.1)
+        self._fake.handlers['exists'] = in_flight
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+        config = TransportConfig(limiter=limiter)
+        try:
+            sc = AsyncShopConfigService(
+                server=self._fake.server, transport_config=config)
+            calls = [asyncio.ensure_future(sc.alias_exists('DemoShop'))
+                     for i in range(10)]
+            await asyncio.sleep(0.05)
+            self.assertEqual(limiter.in_flight, 2)
+            self.assertEqual(limiter.queue_depth, 8)
+            self.assertEqual(await asyncio.gather(*calls), [True] * 10)
+            self.assertEqual(in_flight.max, 2)
+            self.assertEqual(limiter.queue_depth, 0)
+        finally:
+            self._fake.handlers['exists'] = exists_handler
+            await config.aclose()
+
+    async def test_hedging(self):
+        self._fake.handlers['exists'] = slow_first(
+            'exists', '<exists>1</exists>')
+        hedging = Hedging(initial_delay=0.05, max_ratio=1)
+        config = TransportConfig(hedging=hedging)
+        try:
+            sc = AsyncShopConfigService(
+                server=self._fake.server, transport_config=config)
+            self.assertIs(
+                await asyncio.wait_for(sc.alias_exists('DemoShop'), 0.5),
+                True)
+            self.assertEqual(self._fake.calls['exists'], 2)
+            self.assertEqual(hedging.stats()['hedge_wins'], 1)
+        finally:
+            self._fake.handlers['exists'] = exists_handler
+            await config.aclose()
+
+    async def test_deadline(self):
+        self._fake.handlers['exists'] = slow('exists', '<exists>1</exists>')
+        config = TransportConfig(deadlines={'exists': 0.1})
+        try:
+            sc = AsyncShopConfigService(
+                server=self._fake.server, transport_config=config)
+            with self.assertRaises(DeadlineExceeded):
+                await asyncio.wait_for(sc.alias_exists('DemoShop'), 0.4)
+        finally:
+            self._fake.handlers['exists'] = exists_handler
+            await config.aclose()
+
+    async def test_shared_client(self):
+        other = AsyncShopConfigService(
+            server=self._fake.server, transport_config=self._config)
+        self.assertIs(other.client.transport.client,
+                      self._sc.client.transport.client)
+
+    async def test_shop(self):
+        shop = await AsyncShop.open('DemoShop', self._sc)
+        self.assertTrue(shop.exists)
+        self.assertEqual(shop.DomainName, 'demo.example')
+        self.assertEqual(shop.SecondaryDomains, ['a.example', 'b.example'])
+
+        shop.IsClosed = False
+        await shop.apply()
+        self.assertIn(b'<IsClosed>0</IsClosed>', self._fake.requests[-3][1])
+
+    async def test_attribute_batch(self):
+        shop = AsyncShop('DemoShop', self._sc)
+        async with shop.attribute_batch():
+            await shop.set_shop_attribute('Title', 'Demo')
+            await shop.set_shop_attributes({'Path': 'new'})
+            self.assertEqual(self._fake.calls['update'], 0)
+        self.assertEqual(self._fake.calls['update'], 1)
+        body = self._fake.requests[-1][1]
+        self.assertIn(b'<Name>Title</Name><Value>Demo</Value>', body)
+        self.assertIn(b'<Name>Path</Name><Value>new</Value>', body)
+
+    async def test_listener(self):
+        changes = []
+        self._sc.add_listener(lambda *arguments: changes.append(arguments))
+        call = self._sc.update(
+            self._sc.get_updateshop_obj({'Alias': 'DemoShop'}))
+        self.assertEqual(changes, [])
+        await call
+        self.assertEqual([change[0] for change in changes], ['update'])
+
+    async def test_result_cache(self):
+        sc = AsyncShopConfigService(
+            server=self._fake.server, transport_config=self._config,
+            result_cache=ResultCache())
+        self.assertIs(await sc.alias_exists('DemoShop'), True)
+        self.assertIs(await sc.exists(
+            sc.get_shopref_obj({'Alias': 'DemoShop'})), True)
+        self.assertEqual(await sc.get_info_fields('DemoShop', ['IsClosed']),
+                         {'IsClosed': True})
+        await sc.get_info_fields('DemoShop', ['IsClosed'])
+        call = sc.update(sc.get_updateshop_obj({'Alias': 'DemoShop'}))
+        await sc.alias_exists('DemoShop')
+        await call
+        await sc.alias_exists('DemoShop')
+        self.assertEqual(self._fake.calls['exists'], 2)
+        self.assertEqual(self._fake.calls['getInfo'], 1)
+
+    async def test_feature_pack(self):
+        self._fake.handlers['getInfo'] = feature_handler
+        try:
+            fp = AsyncFeaturePackService(
+                self._fake.server, 'Distributor', 'admin', 'admin',
+                transport_config=self._config)
+            info = await fp.getInfo('Blog')
+            self.assertEqual(info.ShopCount, 12)
+            self.assertEqual(
+                await fp.getInfoFields('Blog', ['IsActive']),
+                {'IsActive': True})
+        finally:
+            self._fake.handlers['getInfo'] = info_handler
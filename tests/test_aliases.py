@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.aliases`, these run without ePages."""
+
+import re
+import unittest
+from unittest import mock
+
+from epages_provisioning.aliases import AliasRegistry, BloomFilter
+from epages_provisioning.provisioning import ShopConfigService
+
+from .fake_epages import FakeEpages, soap_response
+from .test_domains import empty_handler
+from .test_templates import all_info_handler
+
+# the aliases the fake server knows, besides the ones of getAllInfo
+SERVER_ALIASES = {'Shop0', 'Shop1', 'Shop2', 'Shop3', 'Shop4'}
+
+
+def exists_handler(body):
+    alias = re.search(rb'<Alias>([^<]*)</Alias>', body).group(1).decode()
+    return 200, soap_response('exists', '<exists>{}</exists>'.format(
+        int(alias in SERVER_ALIASES)))
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_members(self):
+        bloom = BloomFilter(1000, 0.01)
+        keys = ['shop{}'.format(i) for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertEqual(len(bloom), 1000)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum('other{}'.format(i) in bloom
+                              for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_error_rate(self):
+        with self.assertRaises(ValueError):
+            BloomFilter(10, 0)
+
+
+class TestAliasRegistry(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'getAllInfo': all_info_handler(5),
+            'exists': exists_handler,
+            'create': empty_handler('create'),
+            'update': empty_handler('update'),
+            'delete': empty_handler('delete'),
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+        self.registry = AliasRegistry(self._sc).load()
+
+    def test_load(self):
+        self.assertEqual(self._fake.calls['getAllInfo'], 1)
+        self.assertEqual(self.registry.stats()['taken'], 5)
+        self.assertIsNotNone(self.registry.loaded_at)
+
+    def test_free_without_call(self):
+        for prefix in ('N', 'Ne', 'New', 'NewS', 'NewShop'):
+            self.assertTrue(self.registry.is_available(prefix))
+        self.assertEqual(self._fake.calls['exists'], 0)
+        self.assertEqual(self.registry.local_answers, 5)
+
+    def test_taken_is_confirmed_and_cached(self):
+        self.assertFalse(self.registry.is_available('Shop1'))
+        self.assertTrue(self.registry.is_taken('shop1'))
+        self.assertEqual(self._fake.calls['exists'], 1)
+        self.assertEqual(self.registry.cache_hits, 1)
+
+    def test_stale_taken(self):
+        # deleted on the server after the load
+        SERVER_ALIASES.discard('Shop2')
+        self.addCleanup(SERVER_ALIASES.add, 'Shop2')
+        self.assertTrue(self.registry.is_available('Shop2'))
+        self.assertEqual(self.registry.false_positives, 1)
+        self.assertEqual(self.registry.stats()['taken'], 4)
+
+    def test_strict(self):
+        SERVER_ALIASES.add('Elsewhere')
+        self.addCleanup(SERVER_ALIASES.discard, 'Elsewhere')
+        self.assertTrue(self.registry.is_available('Elsewhere'))
+        self.assertFalse(self.registry.is_available('Elsewhere', strict=True))
+        self.assertEqual(self._fake.calls['exists'], 1)
+        # the answer of the strict check is used from now on
+        self.assertFalse(self.registry.is_available('Elsewhere'))
+
+        strict = AliasRegistry(self._sc, strict=True).load(['Shop0'])
+        self.assertTrue(strict.is_available('NewShop'))
+        self.assertEqual(self._fake.calls['exists'], 2)
+
+    def test_cache_ttl(self):
+        registry = AliasRegistry(self._sc, cache_ttl=10).load()
+        with mock.patch('epages_provisioning.aliases.time.monotonic',
+                        return_value=100.0):
+            registry.is_taken('Shop1')
+            registry.is_taken('Shop1')
+        with mock.patch('epages_provisioning.aliases.time.monotonic',
+                        return_value=111.0):
+            registry.is_taken('Shop1')
+        self.assertEqual(self._fake.calls['exists'], 2)
+
+    def test_max_cache_entries(self):
+        registry = AliasRegistry(
+            self._sc, strict=True, max_cache_entries=3).load()
+        for alias in ('A', 'B', 'C', 'D'):
+            registry.is_available(alias)
+        self.assertLessEqual(registry.stats()['cached'], 3)
+
+    def test_bloom_filter(self):
+        registry = AliasRegistry(self._sc, error_rate=0.01).load()
+        self.assertIsInstance(registry._taken, BloomFilter)
+        self.assertTrue(registry.is_available('NewShop'))
+        self.assertFalse(registry.is_available('Shop3'))
+        self.assertEqual(self._fake.calls['exists'], 1)
+
+    def test_watch(self):
+        sc = self._sc
+        self.registry.watch(sc)
+        self.addCleanup(self.registry.unwatch, sc)
+
+        sc.create(sc.get_createshop_obj({
+            'Alias': 'NewShop', 'ShopType': 'MinDemo'}))
+        SERVER_ALIASES.add('NewShop')
+        self.addCleanup(SERVER_ALIASES.discard, 'NewShop')
+        self.assertFalse(self.registry.is_available('NewShop'))
+
+        sc.update(sc.get_updateshop_obj({
+            'Alias': 'Shop1', 'NewAlias': 'Renamed'}))
+        self.assertTrue(self.registry.is_available('Shop1'))
+
+        sc.delete(sc.get_shopref_obj({'Alias': 'Shop2'}))
+        self.assertTrue(self.registry.is_available('Shop2'))
+        self.assertEqual(self._fake.calls['exists'], 1)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.bulk`, these run without ePages."""
+
+import re
+import time
+import unittest
+
+from zeep.exceptions import Fault
+
+from epages_provisioning.bulk import run_bulk
+from epages_provisioning.provisioning import ShopConfigService
+
+from .fake_epages import FakeEpages, InFlight, soap_fault, soap_response
+
+
+def exists_handler(body):
+    # shops with even numbers exist
+    number = int(re.search(rb'<Alias>Shop(\d+)</Alias>', body).group(1))
+    return 200, soap_response(
+        'exists', '<exists>{}</exists>'.format(int(number % 2 == 0)))
+
+
+def info_handler(body):
+    if b'<Alias>Missing</Alias>' in body:
+        return 500, soap_fault('Object not found')
+    return 200, soap_response(
+        'getInfo', '<Shop><Alias>DemoShop</Alias></Shop>')
+
+
+class TestRunBulk(unittest.TestCase):
+
+    def test_ordered(self):
+        def func(item):
+            time.sleep(0.01 * (item % 3))
+            return item * 2
+        results = list(run_bulk(func, range(20), concurrency=4))
+        self.assertEqual([r.index for r in results], list(range(20)))
+        self.assertEqual([r.result for r in results],
+                         [i * 2 for i in range(20)])
+
+    def test_completion_order(self):
+        def func(item):
+            time.sleep(0.2 if item == 0 else 0)
+            return item
+        results = list(run_bulk(func, range(5), concurrency=5,
+                                ordered=False))
+        self.assertEqual(results[-1].item, 0)
+        self.assertEqual(sorted(r.index for r in results), list(range(5)))
+
+    def test_errors(self):
+        def func(item):
+            if item == 2:
+                raise KeyError(item)
+            return item
+        results = list(run_bulk(func, range(4), concurrency=2))
+        self.assertEqual([r.ok for r in results], [True, True, False, True])
+        self.assertIsInstance(results[2].error, KeyError)
+        self.assertIsNone(results[2].result)
+
+    def test_reads_items_as_needed(self):
+        read = []
+
+        def items():
+            for i in range(1000):
+                read.append(i)
+                yield i
+
+        results = run_bulk(lambda item: item, items(), concurrency=2)
+        self.assertEqual(next(results).result, 0)
+        results.close()
+        self.assertLess(len(read), 10)
+
+    def test_concurrency(self):
+        with self.assertRaises(ValueError):
+            list(run_bulk(str, [1], concurrency=0))
+
+
+class TestMapOperation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+
+    def test_exists(self):
+        in_flight = InFlight(exists_handler)
+        self._fake.handlers['exists'] = in_flight
+        aliases = ['Shop{}'.format(i) for i in range(30)]
+        results = list(self._sc.map_operation(
+            'exists', aliases, concurrency=5))
+        self.assertEqual([r.item for r in results], aliases)
+        self.assertEqual([r.result for r in results],
+                         [i % 2 == 0 for i in range(30)])
+        self.assertLessEqual(in_flight.max, 5)
+        self.assertGreater(in_flight.max, 1)
+
+    def test_alias_exists_unordered(self):
+        self._fake.handlers['exists'] = exists_handler
+        aliases = ['Shop{}'.format(i) for i in range(10)]
+        results = list(self._sc.map_operation(
+            'alias_exists', aliases, ordered=False))
+        self.assertEqual(sorted(r.index for r in results), list(range(10)))
+        for result in results:
+            self.assertEqual(result.item, aliases[result.index])
+
+    def test_errors(self):
+        self._fake.handlers['getInfo'] = info_handler
+        results = list(self._sc.map_operation(
+            'get_info', ['DemoShop', 'Missing', {'Alias': 'DemoShop'}]))
+        self.assertEqual([r.ok for r in results], [True, False, True])
+        self.assertIsInstance(results[1].error, Fault)
+        self.assertEqual(results[0].result.Alias, 'DemoShop')
+
+    def test_arguments(self):
+        self._fake.handlers['setSecondaryDomains'] = lambda body: (
+            200, soap_response('setSecondaryDomains', ''))
+        shopref = self._sc.get_shopref_obj({'Alias': 'Shop2'})
+        results = list(self._sc.map_operation('set_secondary_domains', [
+            ('Shop1', ['www.shop1.example']),
+            (shopref, self._sc.get_secondarydomains_obj(['b.example'])),
+            ('Shop3', 'not a list'),
+        ]))
+        self.assertEqual([r.ok for r in results], [True, True, False])
+        self.assertIsInstance(results[2].error, TypeError)
+        self.assertEqual(self._fake.calls['setSecondaryDomains'], 2)
+        self.assertIn(b'www.shop1.example',
+                      b''.join(body for _, body in self._fake.requests))
+
+    def test_bulk(self):
+        self._fake.handlers.update({
+            'exists': exists_handler,
+            'update': lambda body: (200, soap_response('update', '')),
+        })
+        calls = [
+            ('exists', 'Shop2'),
+            ('update', {'Alias': 'Shop2', 'IsClosed': True}),
+            ('nope', 'Shop2'),
+        ]
+        results = list(self._sc.bulk(calls))
+        self.assertEqual([r.item for r in results], calls)
+        self.assertIs(results[0].result, True)
+        self.assertTrue(results[1].ok)
+        self.assertIsInstance(results[2].error, ValueError)
+        update = [body for operation, body in self._fake.requests
+                  if operation == 'update']
+        self.assertIn(b'<IsClosed>true</IsClosed>', update[0])
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            self._sc.map_operation('_create_client', [])
+        with self.assertRaises(ValueError):
+            self._sc.map_operation('nope', [])
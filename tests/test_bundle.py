@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.bundle`, these run without ePages."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from epages_provisioning.bundle import _local_names, build_bundle
+from epages_provisioning.provisioning import ShopConfigService
+
+from .fake_epages import FakeEpages
+
+
+class TestBundle(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_offline(self):
+        written = build_bundle(
+            self._fake.server, self._dir, ['ShopConfigService12.wsdl'])
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in written),
+            ['EpagesTypes.xsd', 'ShopConfigService12.wsdl'])
+
+        self._fake.wsdl_requests.clear()
+        sc = ShopConfigService(
+            server=self._fake.server,
+            provider='Distributor',
+            username='admin',
+            password='admin',
+            wsdl_source=self._dir,
+        )
+        self.assertEqual(sum(self._fake.wsdl_requests.values()), 0)
+        self.assertEqual(sc.get_shopref_obj({'Alias': 'a'}).Alias, 'a')
+
+    def test_missing(self):
+        with self.assertRaises(ValueError):
+            ShopConfigService(server=self._fake.server,
+                              wsdl_source=self._dir)
+
+    def test_same_names(self):
+        self.assertEqual(
+            _local_names(['http://x/WebRoot/WSDL/A.wsdl',
+                          'http://x/WebRoot/WSDL/Types.xsd']),
+            {'http://x/WebRoot/WSDL/A.wsdl': 'A.wsdl',
+             'http://x/WebRoot/WSDL/Types.xsd': 'Types.xsd'})
+        with self.assertRaises(ValueError):
+            _local_names(['http://x/WebRoot/WSDL/Types.xsd',
+                          'http://x/WebRoot/WSDL/v2/Types.xsd'])
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.domains`, these run without ePages."""
+
+import unittest
+
+from zeep.exceptions import TransportError
+
+from epages_provisioning.domains import DomainIndex, normalize
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.records import ShopRecord
+from epages_provisioning.shop import Shop
+
+from .fake_epages import FakeEpages, soap_response
+from .test_templates import all_info_handler, info_handler
+
+
+def empty_handler(operation):
+    return lambda body: (200, soap_response(operation, ''))
+
+
+class TestDomainIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = DomainIndex()
+        self.index.add_shops([
+            ShopRecord(Alias='Demo', DomainName='demo.example',
+                       SecondaryDomains=['www.demo.example']),
+            {'Alias': 'Wild', 'DomainName': 'Wild.Example.',
+             'SecondaryDomains': ['*.wild.example', '*.demo.example']},
+            ShopRecord(Alias='Deep', DomainName='a.b.demo.example'),
+        ])
+
+    def test_normalize(self):
+        self.assertEqual(normalize(' WWW.Demo.Example.:8080 '),
+                         'www.demo.example')
+
+    def test_exact(self):
+        self.assertEqual(self.index.resolve('demo.example'), 'Demo')
+        self.assertEqual(self.index.resolve('WWW.demo.example:443'), 'Demo')
+        self.assertEqual(self.index.resolve('wild.example'), 'Wild')
+        self.assertEqual(self.index.resolve('a.b.demo.example'), 'Deep')
+        self.assertIsNone(self.index.resolve('other.example'))
+        self.assertIsNone(self.index.resolve('example'))
+
+    def test_wildcard(self):
+        self.assertEqual(self.index.resolve('shop.wild.example'), 'Wild')
+        self.assertEqual(self.index.resolve('x.y.wild.example'), 'Wild')
+        self.assertEqual(self.index.resolve('shop.demo.example'), 'Wild')
+        self.assertEqual(self.index.resolve('x.b.demo.example'), 'Wild')
+        self.assertIsNone(
+            self.index.resolve('shop.wild.example', wildcard=False))
+
+    def test_suffix(self):
+        self.index.remove_shop('Wild')
+        self.assertIsNone(self.index.resolve('shop.demo.example'))
+        self.assertEqual(
+            self.index.resolve('shop.demo.example', suffix=True), 'Demo')
+        self.assertEqual(
+            self.index.resolve('x.a.b.demo.example', suffix=True), 'Deep')
+        self.assertEqual(
+            self.index.resolve('x.b.demo.example', suffix=True), 'Demo')
+        self.assertIsNone(self.index.resolve('demo.other', suffix=True))
+
+    def test_under(self):
+        self.assertEqual(self.index.under('demo.example'), {
+            'demo.example': ['Demo'],
+            'www.demo.example': ['Demo'],
+            '*.demo.example': ['Wild'],
+            'a.b.demo.example': ['Deep'],
+        })
+        self.assertEqual(self.index.under('nothing.example'), {})
+
+    def test_duplicates(self):
+        self.assertEqual(self.index.duplicates(), {})
+        with self.assertLogs('epages_provisioning.domains', 'WARNING'):
+            self.index.set_shop('Copy', 'www.demo.example')
+        self.assertEqual(self.index.duplicates(),
+                         {'www.demo.example': ['Demo', 'Copy']})
+        self.assertEqual(self.index.resolve('www.demo.example'), 'Demo')
+        self.index.remove_shop('Demo')
+        self.assertEqual(self.index.duplicates(), {})
+        self.assertEqual(self.index.resolve('www.demo.example'), 'Copy')
+
+    def test_updates(self):
+        self.index.set_secondary_domains('Demo', ['shop.demo.example'])
+        self.assertEqual(self.index.resolve('www.demo.example'), 'Wild')
+        self.assertEqual(self.index.resolve('shop.demo.example'), 'Demo')
+        self.assertEqual(self.index.resolve('demo.example'), 'Demo')
+
+        self.index.set_domain_name('Demo', 'new.example')
+        self.assertIsNone(self.index.resolve('demo.example'))
+        self.assertEqual(self.index.domains_of('Demo'),
+                         ('new.example', ('shop.demo.example',)))
+
+        self.index.rename_shop('Demo', 'Renamed')
+        self.assertEqual(self.index.resolve('new.example'), 'Renamed')
+        self.assertIsNone(self.index.domains_of('Demo'))
+
+        self.index.remove_shop('Renamed')
+        self.index.remove_shop('Wild')
+        self.index.remove_shop('Deep')
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index._root.children, {})
+
+
+class TestWatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'getAllInfo': all_info_handler(5),
+            'getInfo': info_handler,
+            'create': empty_handler('create'),
+            'update': empty_handler('update'),
+            'setSecondaryDomains': empty_handler('setSecondaryDomains'),
+            'delete': empty_handler('delete'),
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self.index = DomainIndex().load(self._sc).watch(self._sc)
+        self.addCleanup(self.index.unwatch, self._sc)
+
+    def test_load(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.resolve('www.shop3.example'), 'Shop3')
+
+    def test_operations(self):
+        sc = self._sc
+        sc.set_secondary_domains(
+            sc.get_shopref_obj({'Alias': 'Shop1'}),
+            sc.get_secondarydomains_obj(['new.shop1.example']))
+        self.assertIsNone(self.index.resolve('www.shop1.example'))
+        self.assertEqual(self.index.resolve('new.shop1.example'), 'Shop1')
+
+        sc.create(sc.get_createshop_obj({
+            'Alias': 'NewShop', 'ShopType': 'MinDemo',
+            'DomainName': 'newshop.example'}))
+        self.assertEqual(self.index.resolve('newshop.example'), 'NewShop')
+
+        sc.update(sc.get_updateshop_obj({
+            'Alias': 'NewShop', 'NewAlias': 'Renamed'}))
+        self.assertEqual(self.index.resolve('newshop.example'), 'Renamed')
+
+        sc.delete(sc.get_shopref_obj({'Alias': 'Renamed'}))
+        self.assertIsNone(self.index.resolve('newshop.example'))
+
+    def test_failed_operation(self):
+        self._fake.handlers['delete'] = lambda body: (500, b'')
+        try:
+            with self.assertRaises(TransportError):
+                self._sc.delete(self._sc.get_shopref_obj({'Alias': 'Shop1'}))
+        finally:
+            self._fake.handlers['delete'] = empty_handler('delete')
+        self.assertEqual(self.index.resolve('shop1.example'), 'Shop1')
+
+    def test_shop_apply(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.DomainName = 'moved.example'
+        shop.SecondaryDomains.append('c.example')
+        shop.apply(refresh=False)
+        self.assertEqual(self.index.resolve('moved.example'), 'DemoShop')
+        self.assertEqual(self.index.resolve('c.example'), 'DemoShop')
+        self.assertEqual(self.index.resolve('a.example'), 'DemoShop')
@@ -4,11 +4,15 @@
 """Tests for `epages_provisioning` package."""
 
 import os
+import threading
 import unittest
 from datetime import datetime
 
 from zeep.exceptions import ValidationError
 from epages_provisioning import provisioning
+from epages_provisioning.zeep_utils import schema_registry
+
+from .fake_epages import FakeEpages
 
 # import logging
 if os.environ.get('EP_TRACE', False):
@@ -349,3 +353,79 @@ class TestSimpleProvisioning(unittest.TestCase):
             }
         )
         self.assertIsNone(self._sp.mark_for_deletion(shop))
+
+
+class TestLazyService(unittest.TestCase):
+    """ lazy mode against the local fake server, runs without ePages """
+
+    def test_lazy(self):
+        with FakeEpages() as fake:
+            sc = provisioning.ShopConfigService(
+                server=fake.server,
+                provider='Distributor',
+                username='admin',
+                password='admin',
+                lazy=True,
+            )
+            self.assertEqual(sum(fake.wsdl_requests.values()), 0)
+            self.assertEqual(sc.get_shopref_obj({'Alias': 'a'}).Alias, 'a')
+            self.assertEqual(fake.wsdl_requests['ShopConfigService12.wsdl'], 1)
+            # already loaded, warm_up does nothing
+            sc.warm_up()
+            self.assertEqual(fake.wsdl_requests['ShopConfigService12.wsdl'], 1)
+
+    def test_warm_up_threads(self):
+        with FakeEpages() as fake:
+            sc = provisioning.ShopConfigService(server=fake.server, lazy=True)
+            threads = [threading.Thread(target=sc.warm_up) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(fake.wsdl_requests['ShopConfigService12.wsdl'], 1)
+
+    def test_server_required(self):
+        with self.assertRaises(ValueError):
+            provisioning.ShopConfigService(lazy=True)
+
+
+class TestSharedService(unittest.TestCase):
+    """ shared wsdl documents, runs without ePages """
+
+    def tearDown(self):
+        schema_registry.clear()
+
+    def test_shared(self):
+        with FakeEpages() as fake:
+            first = provisioning.ShopConfigService(
+                server=fake.server, provider='Distributor',
+                username='first', password='a', shared=True)
+            second = provisioning.ShopConfigService(
+                server=fake.server, provider='Distributor',
+                username='second', password='b', shared=True)
+            self.assertEqual(fake.wsdl_requests['ShopConfigService12.wsdl'], 1)
+            self.assertIs(first.client.wsdl, second.client.wsdl)
+            self.assertIsNot(first.client.transport, second.client.transport)
+            self.assertEqual(second.client.transport.session.auth.username,
+                             '/Providers/Distributor/Users/second')
+
+    def test_not_shared(self):
+        with FakeEpages() as fake:
+            first = provisioning.ShopConfigService(server=fake.server)
+            second = provisioning.ShopConfigService(server=fake.server)
+            self.assertIsNot(first.client.wsdl, second.client.wsdl)
+
+
+class TestTypeChecks(unittest.TestCase):
+    """ operation type checks, runs without ePages """
+
+    def test_wrong_type(self):
+        with FakeEpages() as fake:
+            sc = provisioning.ShopConfigService(server=fake.server)
+        with self.assertRaises(TypeError):
+            sc.exists(sc.get_infoshop_obj({'Alias': 'DemoShop'}))
+        with self.assertRaises(TypeError):
+            sc.set_secondary_domains(
+                sc.get_shopref_obj({'Alias': 'DemoShop'}), ['a.example'])
+        self.assertIs(sc._type_class('ns0:TShopRef'),
+                      type(sc.get_shopref_obj()))
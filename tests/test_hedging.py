@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.hedging`, these run without ePages."""
+
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+from epages_provisioning.hedging import DeadlineExceeded, Hedging
+from epages_provisioning.limiter import AdaptiveLimiter
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.transport import TransportConfig
+
+from .fake_epages import FakeEpages, soap_response
+
+
+def slow_first(operation, body='', delay=1.0):
+    """ handler taking delay seconds for the first call, like a stuck
+    server worker """
+    counter = itertools.count()
+
+    def handler(request):
+        if next(counter) == 0:
+            time.sleep(delay)
+        return 200, soap_response(operation, body)
+    return handler
+
+
+def slow(operation, body='', delay=0.5):
+    def handler(request):
+        time.sleep(delay)
+        return 200, soap_response(operation, body)
+    return handler
+
+
+class TestHedging(unittest.TestCase):
+
+    def test_refuses_mutating(self):
+        for operation in ('create', 'update', 'delete', 'applyToShop',
+                          'markForDeletion'):
+            with self.assertRaises(ValueError):
+                Hedging(operations=['exists', operation])
+        self.assertFalse(Hedging().applies('update'))
+        self.assertTrue(Hedging().applies('getInfo'))
+
+    def test_delay(self):
+        hedging = Hedging(initial_delay=0.2, min_delay=0.001)
+        for latency in range(1, Hedging.min_samples):
+            hedging.record('exists', latency / 1000)
+        self.assertEqual(hedging.delay('exists'), 0.2)
+        for latency in range(Hedging.min_samples, 101):
+            hedging.record('exists', latency / 1000)
+        self.assertAlmostEqual(hedging.delay('exists'), 0.1, places=2)
+        self.assertEqual(hedging.delay('getInfo'), 0.2)
+
+
+class TestHedgedTransport(unittest.TestCase):
+
+    def setUp(self):
+        self._fake = FakeEpages().start()
+
+    def tearDown(self):
+        self._fake.stop()
+
+    def service(self, **kwargs):
+        return ShopConfigService(
+            server=self._fake.server,
+            transport_config=TransportConfig(**kwargs))
+
+    def test_hedges_slow_read(self):
+        self._fake.handlers['exists'] = slow_first(
+            'exists', '<exists>1</exists>')
+        hedging = Hedging(initial_delay=0.05, max_ratio=1)
+        sc = self.service(hedging=hedging)
+        start = time.monotonic()
+        self.assertIs(sc.alias_exists('DemoShop'), True)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(self._fake.calls['exists'], 2)
+        self.assertEqual(hedging.stats()['hedge_wins'], 1)
+
+    def test_fast_read(self):
+        self._fake.handlers['exists'] = slow('exists', '<exists>1</exists>',
+                                             delay=0)
+        hedging = Hedging(initial_delay=0.5, max_ratio=1)
+        sc = self.service(hedging=hedging)
+        for _ in range(5):
+            sc.alias_exists('DemoShop')
+        self.assertEqual(self._fake.calls['exists'], 5)
+        self.assertEqual(hedging.stats()['hedges'], 0)
+
+    def test_waiting_for_a_thread(self):
+        self._fake.handlers['exists'] = slow(
+            'exists', '<exists>1</exists>', delay=0.02)
+        hedging = Hedging(initial_delay=0.06, max_ratio=1, max_workers=1)
+        sc = self.service(hedging=hedging)
+        with ThreadPoolExecutor(5) as executor:
+            results = list(executor.map(sc.alias_exists, ['DemoShop'] * 5))
+        self.assertEqual(results, [True] * 5)
+        self.assertEqual(hedging.stats()['hedges'], 0)
+        self.assertEqual(self._fake.calls['exists'], 5)
+
+    def test_max_ratio(self):
+        self._fake.handlers['exists'] = slow_first(
+            'exists', '<exists>1</exists>', delay=0.2)
+        sc = self.service(hedging=Hedging(initial_delay=0.01, max_ratio=0))
+        self.assertIs(sc.alias_exists('DemoShop'), True)
+        self.assertEqual(self._fake.calls['exists'], 1)
+
+    def test_never_hedges_mutating(self):
+        self._fake.handlers['update'] = slow('update', delay=0.2)
+        sc = self.service(hedging=Hedging(initial_delay=0.01, max_ratio=1))
+        sc.update(sc.get_updateshop_obj({'Alias': 'DemoShop'}))
+        self.assertEqual(self._fake.calls['update'], 1)
+
+    def test_deadline(self):
+        self._fake.handlers['exists'] = slow('exists', '<exists>1</exists>')
+        self._fake.handlers['getInfo'] = slow(
+            'getInfo', '<Shop><Alias>DemoShop</Alias></Shop>', delay=0)
+        sc = self.service(deadlines={'exists': 0.1}, timeout=5)
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            sc.alias_exists('DemoShop')
+        self.assertLess(time.monotonic() - start, 0.4)
+        # other operations are not affected
+        sc.get_info_fields('DemoShop')
+
+    def test_deadline_hedged(self):
+        self._fake.handlers['exists'] = slow('exists', '<exists>1</exists>')
+        hedging = Hedging(initial_delay=0.02, max_ratio=1)
+        sc = self.service(deadlines={'exists': 0.1}, hedging=hedging)
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            sc.alias_exists('DemoShop')
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(self._fake.calls['exists'], 2)
+        self.assertEqual(hedging.stats()['deadlines_exceeded'], 1)
+
+    def test_deadline_includes_limiter_wait(self):
+        self._fake.handlers['exists'] = slow('exists', '<exists>1</exists>')
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+        sc = self.service(deadlines={'exists': 0.1}, limiter=limiter)
+        with limiter.call():
+            with self.assertRaises(DeadlineExceeded):
+                sc.alias_exists('DemoShop')
+        self.assertEqual(self._fake.calls['exists'], 0)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.inventory`, these run without ePages."""
+
+import unittest
+
+from epages_provisioning.inventory import ShopInventory
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.records import ShopRecord
+from epages_provisioning.shop import Shop
+
+from .fake_epages import FakeEpages, soap_response
+from .test_templates import info_handler
+
+SHOP = (
+    '<item><Alias>Shop{0}</Alias><ShopType>{1}</ShopType>'
+    '<IsClosed>{2}</IsClosed><IsTrialShop>{3}</IsTrialShop>'
+    '<DomainName>shop{0}.example</DomainName>'
+    '<MerchantEMail>{4}</MerchantEMail>'
+    '<SecondaryDomains soapenc:arrayType="xsd:string[1]">'
+    '<item>www.shop{0}.example</item></SecondaryDomains>'
+    '</item>'
+)
+
+
+def all_info_handler(body):
+    shops = ''.join(
+        SHOP.format(i, 'MinDemo' if i % 3 else 'Big', i % 2, int(i < 4),
+                    'owner{}@example.com'.format(i // 2))
+        for i in range(10))
+    return 200, soap_response(
+        'getAllInfo',
+        '<Shops soapenc:arrayType="ns0:TInfoShop_Return[10]">{}</Shops>'
+        .format(shops))
+
+
+def aliases(records):
+    return [record.Alias for record in records]
+
+
+class TestShopInventory(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'getAllInfo': all_info_handler,
+            'getInfo': info_handler,
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+        self.inventory = ShopInventory(self._sc).load()
+
+    def test_load(self):
+        self.assertEqual(len(self.inventory), 10)
+        self.assertEqual(dict(self._fake.calls), {'getAllInfo': 1})
+        self.assertIn('Shop3', self.inventory)
+        self.assertEqual(self.inventory['Shop4'].ShopType, 'MinDemo')
+        self.assertIsNone(self.inventory.get('Shop10'))
+
+    def test_find(self):
+        self.assertEqual(aliases(self.inventory.find(ShopType='Big')),
+                         ['Shop0', 'Shop3', 'Shop6', 'Shop9'])
+        self.assertEqual(
+            aliases(self.inventory.find(ShopType='Big', IsClosed=True)),
+            ['Shop3', 'Shop9'])
+        self.assertEqual(
+            aliases(self.inventory.find(IsTrialShop=True, IsClosed=False)),
+            ['Shop0', 'Shop2'])
+        self.assertEqual(self.inventory.find(ShopType='Other'), [])
+        self.assertEqual(len(self.inventory.find()), 10)
+        with self.assertRaises(ValueError):
+            self.inventory.find(DomainName='shop1.example')
+
+    def test_domains_and_emails(self):
+        self.assertEqual(self.inventory.by_domain('shop4.example').Alias,
+                         'Shop4')
+        self.assertEqual(self.inventory.by_domain('WWW.Shop4.example').Alias,
+                         'Shop4')
+        self.assertIsNone(self.inventory.by_domain('shop10.example'))
+        self.assertEqual(
+            aliases(self.inventory.by_email('Owner2@example.com')),
+            ['Shop4', 'Shop5'])
+
+    def test_update(self):
+        record = self.inventory['Shop4']
+        shop = record.to_shop(self._sc)
+        shop.ShopType = 'Big'
+        shop.DomainName = 'new.example'
+        self.inventory.update(shop)
+        self.assertIn('Shop4', aliases(self.inventory.find(ShopType='Big')))
+        self.assertNotIn('Shop4',
+                         aliases(self.inventory.find(ShopType='MinDemo')))
+        self.assertEqual(self.inventory.by_domain('new.example').Alias,
+                         'Shop4')
+        self.assertIsNone(self.inventory.by_domain('shop4.example'))
+        self.assertEqual(len(self.inventory), 10)
+
+        # renamed
+        self.inventory.update(record._replace(Alias='Renamed'),
+                              previous_alias='Shop4')
+        self.assertNotIn('Shop4', self.inventory)
+        self.assertEqual(self.inventory.by_domain('shop4.example').Alias,
+                         'Renamed')
+        self.assertEqual(dict(self._fake.calls), {'getAllInfo': 1})
+
+    def test_refresh(self):
+        self.inventory.update(ShopRecord(Alias='DemoShop'))
+        record = self.inventory.refresh('DemoShop')
+        self.assertEqual(record.DomainName, 'demo.example')
+        self.assertIs(self.inventory.by_domain('a.example'), record)
+
+        # gone from the server
+        self.assertIsNone(self.inventory.refresh('Shop1'))
+        self.assertNotIn('Shop1', self.inventory)
+        self.assertIsNone(self.inventory.by_domain('shop1.example'))
+        self.assertEqual(aliases(self.inventory.by_email(
+            'owner0@example.com')), ['Shop0'])
+
+    def test_from_shop(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        inventory = ShopInventory(records=[ShopRecord.from_shop(shop)])
+        self.assertEqual(aliases(inventory.find(IsClosed=True)),
+                         ['DemoShop'])
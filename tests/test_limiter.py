@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.limiter`, these run without ePages."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from epages_provisioning.limiter import AdaptiveLimiter, LimiterTimeout
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.transport import TransportConfig
+
+from .fake_epages import FakeEpages, InFlight, soap_response
+
+CAPACITY = 4
+
+
+def exists_handler(body):
+    return 200, soap_response('exists', '<exists>1</exists>')
+
+
+def overloaded_latency(current):
+    """ fast up to CAPACITY calls, then slower with every extra call """
+    return 0.002 + 0.03 * max(0, current - CAPACITY)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def calls(self, limiter, count, status=200):
+        """ count calls at the same time """
+        calls = [limiter.call() for _ in range(count)]
+        for call in calls:
+            call.__enter__().record(status)
+        for call in calls:
+            call.__exit__(None, None, None)
+
+    def test_increases_when_busy(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+        for _ in range(20):
+            self.calls(limiter, 2)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_not_busy(self):
+        limiter = AdaptiveLimiter(initial_limit=10)
+        for _ in range(50):
+            self.calls(limiter, 1)
+        self.assertEqual(limiter.limit, 10)
+        self.assertEqual(limiter.stats()['calls'], 50)
+
+    def test_failures_halve_once(self):
+        limiter = AdaptiveLimiter(initial_limit=8)
+        self.calls(limiter, 4, status=503)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.stats()['failures'], 4)
+        self.calls(limiter, 1, status=500)
+        self.assertEqual(limiter.limit, 4)
+
+        with self.assertRaises(ConnectionError):
+            with limiter.call():
+                raise ConnectionError()
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.min_limit, 1)
+
+    def test_slow(self):
+        limiter = AdaptiveLimiter(initial_limit=10, latency_threshold=0.01)
+        with limiter.call():
+            time.sleep(0.02)
+        self.assertEqual(limiter.limit, 9)
+        self.assertEqual(limiter.stats()['slow_calls'], 1)
+
+    def test_queue(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+        done = []
+
+        def wait_for_slot():
+            with limiter.call():
+                done.append(True)
+
+        with limiter.call():
+            thread = threading.Thread(target=wait_for_slot)
+            thread.start()
+            deadline = time.monotonic() + 5
+            while limiter.queue_depth == 0 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            self.assertEqual(limiter.queue_depth, 1)
+            self.assertEqual(limiter.in_flight, 1)
+            with self.assertRaises(LimiterTimeout):
+                with limiter.call(timeout=0.01):
+                    pass
+            self.assertEqual(done, [])
+        thread.join(5)
+        self.assertEqual(done, [True])
+        self.assertEqual(limiter.queue_depth, 0)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            AdaptiveLimiter(initial_limit=10, max_limit=5)
+
+    def simulate(self, limiter, latency, status=lambda current: 200,
+                 rounds=200):
+        """ rounds of limit calls at the same time on a fake clock,
+        latency and status are functions of the calls in flight. Returns
+        the limit after every round """
+        clock = [0.0]
+        limits = []
+        with mock.patch('epages_provisioning.limiter.time.monotonic',
+                        lambda: clock[0]):
+            for _ in range(rounds):
+                calls = [limiter.call() for _ in range(limiter.limit)]
+                for call in calls:
+                    call.__enter__().record(status(len(calls)))
+                clock[0] += latency(len(calls))
+                for call in calls:
+                    call.__exit__(None, None, None)
+                limits.append(limiter.limit)
+        return limits
+
+    def test_finds_capacity(self):
+        limiter = AdaptiveLimiter(
+            initial_limit=2, max_limit=32, latency_threshold=0.02)
+        limits = self.simulate(limiter, overloaded_latency)
+        self.assertEqual(limits[:8], [2, 2, 3, 3, 4, 4, 5, 4])
+        self.assertEqual(set(limits[8:]), {CAPACITY, CAPACITY + 1})
+        self.assertGreater(limiter.stats()['slow_calls'], 0)
+
+    def test_backs_off_on_overload(self):
+        limiter = AdaptiveLimiter(initial_limit=16, max_limit=32)
+        limits = self.simulate(
+            limiter, lambda current: 0.005,
+            lambda current: 503 if current > CAPACITY else 200)
+        self.assertEqual(limits[0], 8)
+        # AIMD keeps probing just above the capacity
+        self.assertLessEqual(max(limits[1:]), CAPACITY + 1)
+        self.assertGreaterEqual(min(limits[1:]), CAPACITY // 2)
+        self.assertGreater(limiter.stats()['failures'], 0)
+
+
+class TestLimitedTransport(unittest.TestCase):
+    """ the limiter in the transport against servers with latency curves """
+
+    def setUp(self):
+        self._fake = FakeEpages().start()
+
+    def tearDown(self):
+        self._fake.stop()
+
+    def run_calls(self, limiter, count=300):
+        sc = ShopConfigService(
+            server=self._fake.server,
+            transport_config=TransportConfig(pool_maxsize=32,
+                                             limiter=limiter))
+        results = list(sc.map_operation(
+            'alias_exists', ['DemoShop'] * count, concurrency=32))
+        return [result.error for result in results if not result.ok]
+
+    def test_finds_capacity(self):
+        in_flight = InFlight(exists_handler, overloaded_latency)
+        self._fake.handlers['exists'] = in_flight
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=32)
+        self.assertEqual(self.run_calls(limiter), [])
+        self.assertGreater(limiter.stats()['slow_calls'], 0)
+        # the final limit depends on the timing of the threads, the
+        # simulation in TestAdaptiveLimiter checks the values
+        self.assertLess(in_flight.max, 32)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_backs_off_on_overload(self):
+        in_flight = InFlight(None, 0.005)
+
+        def overloaded(body):
+            if in_flight.current > CAPACITY:
+                return 503, b''
+            return exists_handler(body)
+
+        in_flight.handler = overloaded
+        self._fake.handlers['exists'] = in_flight
+        limiter = AdaptiveLimiter(initial_limit=16, max_limit=32)
+        errors = self.run_calls(limiter)
+        self.assertTrue(errors)
+        self.assertLess(len(errors), 100)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_grows_when_fast(self):
+        self._fake.handlers['exists'] = InFlight(exists_handler, 0.002)
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=32)
+        self.assertEqual(self.run_calls(limiter), [])
+        self.assertGreater(limiter.limit, 2)
+        self.assertEqual(limiter.stats()['failures'], 0)
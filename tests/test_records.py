@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.records`, these run without ePages."""
+
+import pickle
+import unittest
+
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.records import ShopRecord
+from epages_provisioning.shop import Shop, ShopAttribute
+
+from .fake_epages import FakeEpages
+from .test_templates import all_info_handler, exists_handler, info_handler
+
+
+class TestShopRecord(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'exists': exists_handler,
+            'getInfo': info_handler,
+            'getAllInfo': all_info_handler(3),
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+
+    def info(self):
+        return self._sc.get_info(
+            self._sc.get_infoshop_obj({'Alias': 'DemoShop'}))
+
+    def test_from_info(self):
+        record = ShopRecord.from_info(self.info())
+        self.assertEqual(record.Alias, 'DemoShop')
+        self.assertIs(record.IsClosed, True)
+        self.assertIsNone(record.ShopType)
+        self.assertEqual(record.SecondaryDomains, ('a.example', 'b.example'))
+        self.assertEqual(record.Attributes, (
+            ShopAttribute('Path', None, '/Shops/DemoShop', {}),))
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_from_all_info(self):
+        records = [ShopRecord.from_info(shop)
+                   for shop in self._sc.iter_all_info()]
+        self.assertEqual([record.Alias for record in records],
+                         ['Shop0', 'Shop1', 'Shop2'])
+        self.assertEqual(
+            records, [ShopRecord.from_info(shop)
+                      for shop in self._sc.get_all_info()])
+
+    def test_interned(self):
+        first = ShopRecord(Alias='A', ShopType=''.join(['Min', 'Demo']))
+        second = ShopRecord(Alias='B', ShopType=''.join(['Min', 'Demo']))
+        self.assertIs(first.ShopType, second.ShopType)
+
+    def test_read_only(self):
+        record = ShopRecord(Alias='DemoShop', IsClosed=False)
+        with self.assertRaises(AttributeError):
+            record.IsClosed = True
+        with self.assertRaises(AttributeError):
+            del record.Alias
+        closed = record._replace(IsClosed=True)
+        self.assertIs(closed.IsClosed, True)
+        self.assertIs(record.IsClosed, False)
+        with self.assertRaises(TypeError):
+            ShopRecord(Alias='DemoShop', Unknown=1)
+
+    def test_hash(self):
+        record = ShopRecord.from_info(self.info())
+        same = ShopRecord.from_info(self.info())
+        closed = record._replace(IsClosed=not record.IsClosed)
+        self.assertEqual(len({record, same, closed}), 2)
+        self.assertEqual({record: 1}[same], 1)
+
+    def test_pickle(self):
+        record = ShopRecord.from_info(self.info())
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_shop(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        record = ShopRecord.from_shop(shop)
+        self.assertEqual(record, ShopRecord.from_info(self.info()))
+
+        self._fake.reset()
+        shop = record.to_shop(self._sc)
+        self.assertEqual(shop.DomainName, 'demo.example')
+        self.assertTrue(shop.exists)
+        self.assertEqual(shop.changes(), {})
+        self.assertEqual(shop.Attributes[0].Value, '/Shops/DemoShop')
+        self.assertEqual(dict(self._fake.calls), {})
+        self.assertEqual(ShopRecord.from_shop(shop), record)
+
+        shop.IsClosed = False
+        self.assertEqual(shop.changes(), {'IsClosed': False})
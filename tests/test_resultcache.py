@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.resultcache`, these run without ePages."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from zeep.exceptions import Fault, TransportError
+
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.resultcache import (
+    MemoryBackend, ResultCache, SQLiteBackend
+)
+
+from .fake_epages import FakeEpages
+from .test_domains import empty_handler
+from .test_templates import exists_handler, info_handler
+
+
+class BackendTests(object):
+    """ the same tests for every backend """
+
+    def test_get_set(self):
+        self.assertIsNone(self.backend.get('missing'))
+        self.backend.set('a', 'tag', 10.0, {'IsClosed': True})
+        self.assertEqual(self.backend.get('a'), (10.0, {'IsClosed': True}))
+        self.assertEqual(len(self.backend), 1)
+
+    def test_copies(self):
+        value = {'SecondaryDomains': ['a.example']}
+        self.backend.set('a', 'tag', 10.0, value)
+        value['SecondaryDomains'].append('b.example')
+        cached = self.backend.get('a')[1]
+        cached['SecondaryDomains'].append('c.example')
+        self.assertEqual(self.backend.get('a')[1],
+                         {'SecondaryDomains': ['a.example']})
+
+    def test_least_recently_used(self):
+        self.backend.set('a', 'a', 10.0, 1)
+        self.backend.set('b', 'b', 10.0, 2)
+        self.backend.get('a')
+        self.backend.set('c', 'c', 10.0, 3)
+        self.assertEqual(len(self.backend), 2)
+        self.assertIsNone(self.backend.get('b'))
+        self.assertIsNotNone(self.backend.get('a'))
+
+    def test_invalidate(self):
+        self.backend.set('exists:a', 'a', 10.0, True)
+        self.backend.set('getInfo:a', 'a', 10.0, {})
+        self.backend.set('exists:b', 'b', 10.0, True)
+        self.backend.invalidate('a')
+        self.assertIsNone(self.backend.get('exists:a'))
+        self.assertIsNone(self.backend.get('getInfo:a'))
+        self.assertEqual(len(self.backend), 1)
+        self.backend.clear()
+        self.assertEqual(len(self.backend), 0)
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend(maxsize=2)
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'results.db')
+        self.backend = SQLiteBackend(self.path, maxsize=2)
+
+    def test_least_recently_used(self):
+        # used is time.time, make sure it differs between the calls
+        with mock.patch('epages_provisioning.resultcache.time.time',
+                        side_effect=range(100)):
+            super(TestSQLiteBackend, self).test_least_recently_used()
+
+    def test_shared(self):
+        self.backend.set('a', 'a', 10.0, True)
+        other = SQLiteBackend(self.path)
+        self.assertEqual(other.get('a'), (10.0, True))
+        other.invalidate('a')
+        self.assertIsNone(self.backend.get('a'))
+
+    def test_not_pickled(self):
+        self.backend.set('a', 'a', 10.0, threading.Lock())
+        self.assertIsNone(self.backend.get('a'))
+
+    def test_memory(self):
+        with self.assertRaises(ValueError):
+            SQLiteBackend(':memory:')
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(ttl=10)
+        self.calls = []
+
+    def read(self, request, value=True):
+        self.calls.append(request)
+        return value
+
+    def test_read_through(self):
+        self.assertIs(self.cache.call(
+            'exists', {'Alias': 'Demo'}, lambda: self.read('Demo')), True)
+        self.assertIs(self.cache.call(
+            'exists', {'Alias': 'Demo', 'Ignored': None},
+            lambda: self.read('Demo')), True)
+        self.cache.call('exists', {'Alias': 'Other'},
+                        lambda: self.read('Other', False))
+        self.cache.call('getInfo', {'Alias': 'Demo'}, lambda: self.read('x'))
+        self.assertEqual(self.calls, ['Demo', 'Other', 'x'])
+        self.assertEqual(self.cache.stats(), {
+            'hits': 1, 'misses': 3, 'invalidations': 0, 'size': 3})
+
+    def test_ttl(self):
+        with mock.patch('epages_provisioning.resultcache.time.time',
+                        return_value=100.0):
+            self.cache.call('exists', {'Alias': 'Demo'}, lambda: self.read(1))
+            self.cache.call('exists', {'Alias': 'Demo'}, lambda: self.read(2))
+        with mock.patch('epages_provisioning.resultcache.time.time',
+                        return_value=110.0):
+            self.cache.call('exists', {'Alias': 'Demo'}, lambda: self.read(3))
+        self.assertEqual(self.calls, [1, 3])
+
+    def test_invalidate(self):
+        self.cache.call('exists', {'Alias': 'Demo'}, lambda: self.read(1))
+        self.cache.invalidate('demo')
+        self.cache.call('exists', {'Alias': 'Demo'}, lambda: self.read(2))
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_invalidated_while_reading(self):
+        def read():
+            self.cache.invalidate('Demo')
+            return True
+        self.cache.call('exists', {'Alias': 'Demo'}, read)
+        self.assertEqual(len(self.cache.backend), 0)
+
+    def test_other_shop_invalidated_while_reading(self):
+        def read():
+            self.cache.invalidate('Other')
+            return True
+        self.cache.call('exists', {'Alias': 'Demo'}, read)
+        self.assertEqual(len(self.cache.backend), 1)
+        self.cache.call('exists', {'Alias': 'Demo'}, lambda: self.read(1))
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.cache._reads, {})
+
+    def test_errors_not_cached(self):
+        def fail():
+            self.calls.append('fail')
+            raise Fault('Object not found')
+        for i in range(2):
+            with self.assertRaises(Fault):
+                self.cache.call('getInfo', {'Alias': 'Gone'}, fail)
+        self.assertEqual(self.calls, ['fail', 'fail'])
+
+
+class TestCachedService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'exists': exists_handler,
+            'getInfo': info_handler,
+            'update': empty_handler('update'),
+            'delete': empty_handler('delete'),
+            'setSecondaryDomains': empty_handler('setSecondaryDomains'),
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+        self.cache = ResultCache(ttl=60)
+        self.sc = ShopConfigService(
+            server=self._fake.server, result_cache=self.cache)
+
+    def test_reads(self):
+        sc = self.sc
+        info = sc.get_info(sc.get_infoshop_obj({'Alias': 'DemoShop'}))
+        cached = sc.get_info(sc.get_infoshop_obj({'Alias': 'DemoShop'}))
+        self.assertEqual(cached, info)
+        self.assertIsNot(cached, info)
+        self.assertEqual(sc.get_info_fields('DemoShop', ['IsClosed']),
+                         sc.get_info_fields('DemoShop', ['IsClosed']))
+        sc.get_info_fields('DemoShop')
+        self.assertEqual(self._fake.calls['getInfo'], 3)
+
+        self.assertIs(sc.alias_exists('DemoShop'), True)
+        self.assertIs(sc.exists(sc.get_shopref_obj({'Alias': 'DemoShop'})),
+                      True)
+        self.assertIs(sc.alias_exists('Other'), False)
+        self.assertIs(sc.alias_exists('Other'), False)
+        self.assertEqual(self._fake.calls['exists'], 2)
+
+    def test_writes_invalidate(self):
+        sc = self.sc
+        sc.alias_exists('DemoShop')
+        sc.alias_exists('NewName')
+        sc.update(sc.get_updateshop_obj(
+            {'Alias': 'DemoShop', 'NewAlias': 'NewName'}))
+        sc.alias_exists('DemoShop')
+        sc.alias_exists('NewName')
+        self.assertEqual(self._fake.calls['exists'], 4)
+
+        sc.get_info_fields('DemoShop')
+        sc.set_secondary_domains(
+            sc.get_shopref_obj({'Alias': 'DemoShop'}),
+            sc.get_secondarydomains_obj(['www.demo.example']))
+        sc.get_info_fields('DemoShop')
+        sc.delete(sc.get_shopref_obj({'Alias': 'DemoShop'}))
+        sc.get_info_fields('DemoShop')
+        self.assertEqual(self._fake.calls['getInfo'], 3)
+
+    def test_failed_write_invalidates(self):
+        sc = self.sc
+        sc.alias_exists('DemoShop')
+        sc.get_info_fields('DemoShop')
+        self._fake.handlers['update'] = lambda body: (500, b'')
+        try:
+            with self.assertRaises(TransportError):
+                sc.update(sc.get_updateshop_obj({'Alias': 'DemoShop'}))
+        finally:
+            self._fake.handlers['update'] = empty_handler('update')
+        self.assertEqual(len(self.cache.backend), 0)
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_fallback_counted_once(self):
+        with mock.patch.object(self.sc, '_template', return_value=None):
+            self.assertIs(self.sc.alias_exists('DemoShop'), True)
+            self.sc.get_info_fields('DemoShop')
+        self.assertEqual(self.cache.stats(), {
+            'hits': 0, 'misses': 2, 'invalidations': 0, 'size': 2})
+
+    def test_separate_services(self):
+        other = ShopConfigService(
+            server=self._fake.server, provider='Other',
+            result_cache=self.cache)
+        self.sc.alias_exists('DemoShop')
+        other.alias_exists('DemoShop')
+        self.assertEqual(self._fake.calls['exists'], 2)
+        other.update(other.get_updateshop_obj({'Alias': 'DemoShop'}))
+        self.assertEqual(len(self.cache.backend), 0)
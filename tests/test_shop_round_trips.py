@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Round trips of `epages_provisioning.shop.Shop`, these run without
+ePages."""
+
+import re
+import time
+import unittest
+
+from zeep.exceptions import Fault
+
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.shop import (
+    Shop, ShopAttribute, ShopDisappearedError, ShopExistsError
+)
+
+from .fake_epages import FakeEpages, soap_fault, soap_response
+from .test_templates import exists_handler, info_handler
+
+
+def empty_handler(operation):
+    return lambda body: (200, soap_response(operation, ''))
+
+
+class TestLazyShop(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'exists': exists_handler,
+            'getInfo': info_handler,
+            'create': empty_handler('create'),
+            'update': empty_handler('update'),
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+
+    def calls(self):
+        return dict(self._fake.calls)
+
+    def test_eager(self):
+        shop = Shop('DemoShop', self._sc)
+        self.assertEqual(self.calls(), {'exists': 2, 'getInfo': 1})
+        self.assertTrue(shop.exists)
+
+    def test_no_calls_until_read(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        self.assertEqual(self.calls(), {})
+        self.assertEqual(shop.Alias, 'DemoShop')
+        self.assertEqual(self.calls(), {})
+
+        self.assertEqual(shop.DomainName, 'demo.example')
+        self.assertEqual(self.calls(), {'getInfo': 1})
+        self.assertTrue(shop.exists)
+        self.assertIs(shop.IsClosed, True)
+        self.assertEqual(shop.SecondaryDomains, ['a.example', 'b.example'])
+        self.assertEqual(self.calls(), {'getInfo': 1})
+
+    def test_missing(self):
+        shop = Shop('Missing', self._sc, lazy=True)
+        self.assertFalse(shop.exists)
+        self.assertIsNone(shop.DomainName)
+        self.assertEqual(self.calls(), {'getInfo': 1})
+        with self.assertRaises(ShopDisappearedError):
+            shop.refresh()
+
+    def test_other_faults(self):
+        self._fake.handlers['getInfo'] = \
+            lambda body: (500, soap_fault('Access denied'))
+        try:
+            shop = Shop('DemoShop', self._sc, lazy=True)
+            with self.assertRaises(Fault):
+                shop.exists
+        finally:
+            self._fake.handlers['getInfo'] = info_handler
+
+    def test_set_before_load(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.IsClosed = False
+        self.assertEqual(shop.DomainName, 'demo.example')
+        self.assertIs(shop.IsClosed, False)
+        shop.refresh()
+        self.assertIs(shop.IsClosed, True)
+        self.assertEqual(self.calls(), {'getInfo': 2})
+
+    def test_create(self):
+        shop = Shop('NewShop', self._sc, lazy=True)
+        shop.ShopType = 'MinDemo'
+        # the fake server does not know the shop afterwards either
+        with self.assertRaises(ShopDisappearedError):
+            shop.create()
+        self.assertEqual(self.calls(), {'getInfo': 2, 'create': 1})
+
+        with self.assertRaises(ShopExistsError):
+            Shop('DemoShop', self._sc, lazy=True).create()
+
+    def test_unknown_attribute(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        with self.assertRaises(AttributeError):
+            shop.Nope
+        self.assertEqual(self.calls(), {})
+
+
+class TestApply(unittest.TestCase):
+    """ apply sends only what changed """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'exists': exists_handler,
+            'getInfo': info_handler,
+            'update': empty_handler('update'),
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+
+    def update_body(self):
+        (body,) = [body for operation, body in self._fake.requests
+                   if operation == 'update']
+        return body
+
+    def test_nothing_changed(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.DomainName
+        shop.IsClosed = True
+        shop.apply()
+        self.assertEqual(dict(self._fake.calls), {'getInfo': 1})
+
+    def test_only_changes(self):
+        shop = Shop('DemoShop', self._sc)
+        shop.IsClosed = False
+        self.assertEqual(shop.changes(), {'IsClosed': False})
+        shop.apply()
+        body = self.update_body()
+        self.assertIn(b'<Alias>DemoShop</Alias>', body)
+        self.assertIn(b'<IsClosed>0</IsClosed>', body)
+        self.assertNotIn(b'DomainName', body)
+        self.assertNotIn(b'SecondaryDomains', body)
+        self.assertNotIn(b'Attributes', body)
+        self.assertEqual(self._fake.calls['getInfo'], 2)
+
+    def test_in_place(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.SecondaryDomains.append('c.example')
+        self.assertEqual(shop.changes(), {
+            'SecondaryDomains': ['a.example', 'b.example', 'c.example']})
+        shop.apply()
+        self.assertIn(b'c.example', self.update_body())
+
+    def test_without_refresh(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.MerchantEMail = 'merchant@demo.example'
+        shop.apply(refresh=False)
+        self.assertEqual(dict(self._fake.calls), {'update': 1})
+        self.assertEqual(shop.changes(), {})
+        shop.apply()
+        self.assertEqual(dict(self._fake.calls), {'update': 1})
+        # the other keys are still loaded on first read
+        self.assertEqual(shop.DomainName, 'demo.example')
+        self.assertEqual(shop.MerchantEMail, 'merchant@demo.example')
+        self.assertEqual(dict(self._fake.calls),
+                         {'update': 1, 'getInfo': 1})
+
+
+def attributes_handler(body):
+    """ getInfo answering the attributes and languages asked for """
+    attributes, languages = body.split(b'<Languages', 1)
+    names = re.findall(rb'<item[^>]*>(\w+)</item>', attributes)
+    languages = re.findall(rb'<item[^>]*>(\w+)</item>', languages)
+    items = ''.join(
+        '<item><Name>{0}</Name><Type>String</Type><Value>{0}-value</Value>'
+        '<LocalizedValues soapenc:arrayType="ns1:TLocalizedValue[{1}]">{2}'
+        '</LocalizedValues></item>'.format(
+            name.decode(), len(languages), ''.join(
+                '<item><LanguageCode>{0}</LanguageCode>'
+                '<Value>{1}-{0}</Value></item>'.format(
+                    language.decode(), name.decode())
+                for language in languages))
+        for name in names)
+    return 200, soap_response('getInfo', (
+        '<Shop><Alias>DemoShop</Alias>'
+        '<Attributes soapenc:arrayType="ns1:TAttribute[{}]">{}</Attributes>'
+        '</Shop>').format(len(names), items))
+
+
+class TestAttributes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'getInfo': attributes_handler,
+            'update': empty_handler('update'),
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+
+    def test_one_call(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        attributes = shop.get_shop_attributes(
+            ['Title', 'CreationDate', 'Path'], ['en', 'de'])
+        self.assertEqual(dict(self._fake.calls), {'getInfo': 1})
+        self.assertEqual(list(attributes), ['Title', 'CreationDate', 'Path'])
+        self.assertEqual(attributes['Title'], ShopAttribute(
+            'Title', 'String', 'Title-value',
+            {'en': 'Title-en', 'de': 'Title-de'}))
+        self.assertEqual(shop.get_shop_attribute('Path'), 'Path-value')
+
+    def test_cache(self):
+        shop = Shop('DemoShop', self._sc, lazy=True, attribute_cache_ttl=60)
+        shop.get_shop_attributes(['Title', 'Path'])
+        shop.get_shop_attributes(['Title', 'Path'])
+        self.assertEqual(self._fake.calls['getInfo'], 1)
+
+        # only the attribute not read before
+        attributes = shop.get_shop_attributes(['Title', 'CreationDate'])
+        self.assertEqual(attributes['CreationDate'].value,
+                         'CreationDate-value')
+        self.assertEqual(self._fake.calls['getInfo'], 2)
+        self.assertNotIn(b'>Title</item>', self._fake.requests[-1][1])
+
+        # other languages are read again
+        shop.get_shop_attributes(['Title'], 'de')
+        self.assertEqual(self._fake.calls['getInfo'], 3)
+
+        # writes forget the attribute
+        shop.set_shop_attribute('Title', 'New title')
+        shop.get_shop_attributes(['Title', 'Path'])
+        self.assertEqual(self._fake.calls['getInfo'], 4)
+
+    def test_expires(self):
+        shop = Shop('DemoShop', self._sc, lazy=True,
+                    attribute_cache_ttl=0.01)
+        shop.get_shop_attributes(['Title'])
+        time.sleep(0.02)
+        shop.get_shop_attributes(['Title'])
+        self.assertEqual(self._fake.calls['getInfo'], 2)
+
+    def test_no_cache(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.get_shop_attributes(['Title'])
+        shop.get_shop_attributes(['Title'])
+        self.assertEqual(self._fake.calls['getInfo'], 2)
+
+
+def attribute_writes(body):
+    """ the TAttribute elements of an update as (name, value, localized) """
+    writes = []
+    for attribute in re.findall(rb'<TAttribute>(.*?)</TAttribute>', body):
+        name = re.search(rb'<Name>(.*?)</Name>', attribute).group(1)
+        value = re.search(rb'</Name><Value>(.*?)</Value>', attribute)
+        localized = re.findall(
+            rb'<LanguageCode>(.*?)</LanguageCode><Value>(.*?)</Value>',
+            attribute)
+        writes.append((name.decode(), value and value.group(1).decode(),
+                       {k.decode(): v.decode() for k, v in localized}))
+    return writes
+
+
+class TestAttributeWrites(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+        self._fake.handlers.update({
+            'getInfo': attributes_handler,
+            'update': empty_handler('update'),
+        })
+
+    def updates(self):
+        return [attribute_writes(body)
+                for operation, body in self._fake.requests
+                if operation == 'update']
+
+    def test_set_shop_attributes(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        shop.set_shop_attributes({
+            'GrantServiceAccessUntil': '2100-01-01',
+            'Title': {'en': 'Demo shop', 'de': 'Demoshop'},
+        })
+        self.assertEqual(self.updates(), [[
+            ('GrantServiceAccessUntil', '2100-01-01', {}),
+            ('Title', None, {'en': 'Demo shop', 'de': 'Demoshop'}),
+        ]])
+
+    def test_batch(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        with shop.attribute_batch():
+            shop.set_shop_attribute('Title', 'Demo')
+            shop.set_shop_attribute('Title', localized_values=[
+                {'LanguageCode': 'de', 'Value': 'Demoshop'}])
+            with shop.attribute_batch():
+                shop.set_shop_attribute('Path', 'old')
+            shop.set_shop_attribute('Path', 'new')
+            self.assertEqual(self._fake.calls['update'], 0)
+        self.assertEqual(self.updates(), [[
+            ('Title', 'Demo', {'de': 'Demoshop'}),
+            ('Path', 'new', {}),
+        ]])
+
+    def test_batch_error(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        with self.assertRaises(KeyError):
+            with shop.attribute_batch():
+                shop.set_shop_attribute('Title', 'Demo')
+                raise KeyError('Path')
+        self.assertEqual(self.updates(), [[('Title', 'Demo', {})]])
+
+    def test_failed_flush(self):
+        shop = Shop('DemoShop', self._sc, lazy=True)
+        self._fake.handlers['update'] = lambda body: (
+            500, soap_fault('Database is locked'))
+        with self.assertRaises(Fault):
+            shop.set_shop_attributes({'Title': 'Demo'})
+        self._fake.handlers['update'] = empty_handler('update')
+        shop.set_shop_attributes({'Path': 'new'})
+        self.assertEqual(self.updates()[-1], [
+            ('Title', 'Demo', {}), ('Path', 'new', {})])
+
+    def test_flush_delay(self):
+        shop = Shop('DemoShop', self._sc, lazy=True,
+                    attribute_flush_delay=0.05)
+        shop.set_shop_attribute('Title', 'Demo')
+        shop.set_shop_attribute('Path', 'new')
+        self.assertEqual(self._fake.calls['update'], 0)
+        deadline = time.monotonic() + 5
+        while not self._fake.calls['update'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.updates(), [[
+            ('Title', 'Demo', {}), ('Path', 'new', {})]])
+
+    def test_flush_delay_failure(self):
+        self._fake.handlers['update'] = lambda body: (
+            500, soap_fault('Database is locked'))
+        self.addCleanup(self._fake.handlers.__setitem__, 'update',
+                        empty_handler('update'))
+        shop = Shop('DemoShop', self._sc, lazy=True,
+                    attribute_flush_delay=0.05)
+        with self.assertLogs('epages_provisioning.shop', 'ERROR') as logs:
+            shop.set_shop_attribute('Title', 'Demo')
+            timer = shop._attribute_timer
+            self.assertTrue(timer.daemon)
+            timer.join(5)
+        self.assertIn('Sending the attributes of DemoShop failed',
+                      logs.output[0])
+        # kept for the next flush
+        self._fake.handlers['update'] = empty_handler('update')
+        shop.flush_attributes()
+        self.assertEqual(self.updates()[-1], [('Title', 'Demo', {})])
+
+    def test_read_flushes(self):
+        shop = Shop('DemoShop', self._sc, lazy=True, attribute_flush_delay=60)
+        shop.set_shop_attribute('Title', 'Demo')
+        shop.get_shop_attributes(['Title'])
+        self.assertEqual([operation for operation, _ in self._fake.requests],
+                         ['update', 'getInfo'])
+        self.assertIsNone(shop._attribute_timer)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.shopfile`, these run without ePages."""
+
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.records import ShopRecord
+from epages_provisioning.shop import ShopAttribute
+from epages_provisioning.shopfile import (
+    ShopFile, ShopFileError, export_shop_file, write_shop_file
+)
+
+from .fake_epages import FakeEpages
+from .test_templates import all_info_handler
+
+
+def records(count, prefix='Shop'):
+    return [ShopRecord(
+        Alias='{}{}'.format(prefix, i), ShopType='MinDemo',
+        IsClosed=bool(i % 2), DomainName='shop{}.example'.format(i),
+        SecondaryDomains=['www.shop{}.example'.format(i)])
+        for i in range(count)]
+
+
+class TestShopFile(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.path = os.path.join(self._dir, 'shops.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_lookups(self):
+        shops = records(100)
+        shops.append(ShopRecord(
+            Alias='Full', IsTrialShop=False, Name='Shöp',
+            MarkedForDelOn=datetime.datetime(2030, 1, 2, 3, 4, 5),
+            Attributes=[ShopAttribute('Title', 'String', 'x', {'de': 'y'})]))
+        self.assertEqual(write_shop_file(self.path, shops), 101)
+        with ShopFile(self.path) as shopfile:
+            self.assertEqual(len(shopfile), 101)
+            self.assertEqual(shopfile.get('Shop42'), shops[42])
+            self.assertEqual(shopfile.get('Full'), shops[100])
+            self.assertIsNone(shopfile.get('Shop100'))
+            self.assertIn('Shop7', shopfile)
+            self.assertNotIn('shop7', shopfile)
+            self.assertEqual(shopfile.by_domain('WWW.shop9.example').Alias,
+                             'Shop9')
+            self.assertEqual(shopfile.alias_for_domain('shop3.example'),
+                             'Shop3')
+            self.assertIsNone(shopfile.by_domain('shop100.example'))
+            self.assertEqual(list(shopfile), shops)
+
+    def test_empty(self):
+        write_shop_file(self.path, [])
+        with ShopFile(self.path) as shopfile:
+            self.assertEqual(len(shopfile), 0)
+            self.assertIsNone(shopfile.get('Shop1'))
+
+    def test_swap(self):
+        write_shop_file(self.path, records(3))
+        shopfile = ShopFile(self.path)
+        self.assertFalse(shopfile.reload())
+        write_shop_file(self.path, records(2, 'Other'))
+        # the old file until reloaded
+        self.assertEqual(shopfile.alias_for_domain('shop2.example'), 'Shop2')
+        self.assertTrue(shopfile.reload())
+        self.assertEqual(shopfile.alias_for_domain('shop1.example'), 'Other1')
+        self.assertIsNone(shopfile.get('Shop2'))
+        self.assertEqual(os.listdir(self._dir), ['shops.bin'])
+
+        shopfile.check_interval = 0
+        write_shop_file(self.path, records(1, 'Third'))
+        self.assertIn('Third0', shopfile)
+        shopfile.close()
+
+    def test_other_process(self):
+        write_shop_file(self.path, records(10))
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys; from epages_provisioning.shopfile import ShopFile; '
+            'print(ShopFile(sys.argv[1]).alias_for_domain("shop5.example"))',
+            self.path], cwd=os.path.dirname(os.path.dirname(__file__)))
+        self.assertEqual(output.strip(), b'Shop5')
+
+    def test_not_a_shop_file(self):
+        with open(self.path, 'wb') as fh:
+            fh.write(b'x' * 100)
+        with self.assertRaises(ShopFileError):
+            ShopFile(self.path)
+
+    def test_export(self):
+        with FakeEpages() as fake:
+            fake.handlers['getAllInfo'] = all_info_handler(20)
+            sc = ShopConfigService(server=fake.server)
+            self.assertEqual(export_shop_file(sc, self.path), 20)
+        with ShopFile(self.path) as shopfile:
+            self.assertEqual(shopfile.by_domain('www.shop11.example'),
+                             shopfile.get('Shop11'))
+            self.assertIs(shopfile.get('Shop11').IsClosed, True)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.snapshot`, these run without ePages."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.snapshot import SnapshotError, main
+
+from .fake_epages import FakeEpages
+
+
+class TestSnapshot(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'ShopConfigService12.snapshot')
+        self._kwargs = {
+            'server': self._fake.server,
+            'provider': 'Distributor',
+            'username': 'admin',
+            'password': 'admin',
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_roundtrip(self):
+        ShopConfigService(**self._kwargs).save_snapshot(self._path)
+        self._fake.wsdl_requests.clear()
+
+        sc = ShopConfigService.from_snapshot(self._path, **self._kwargs)
+        self.assertEqual(sum(self._fake.wsdl_requests.values()), 0)
+
+        shopref = sc.get_shopref_obj({'Alias': 'DemoShop'})
+        self.assertEqual(shopref.Alias, 'DemoShop')
+        self.assertIsInstance(shopref, type(sc.get_shopref_obj()))
+
+    def test_key_mismatch(self):
+        ShopConfigService(**self._kwargs).save_snapshot(self._path)
+        with self.assertRaises(SnapshotError):
+            ShopConfigService.from_snapshot(
+                self._path, version='11', **self._kwargs)
+
+    def test_cli(self):
+        main(['--server', self._fake.server, '--output', self._dir,
+              '--service', 'ShopConfigService'])
+        self.assertTrue(os.path.exists(self._path))
+
+    def test_cli_credentials(self):
+        with mock.patch.object(ShopConfigService, 'save_snapshot',
+                               autospec=True) as save, \
+                mock.patch.dict(os.environ, {'EP_PASSWORD': 'secret'}):
+            main(['--server', self._fake.server, '--output', self._dir,
+                  '--service', 'ShopConfigService',
+                  '--provider', 'Distributor', '--username', 'admin'])
+        service = save.call_args[0][0]
+        self.assertEqual(
+            (service.provider, service.username, service.password),
+            ('Distributor', 'admin', 'secret'))
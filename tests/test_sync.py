@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.sync`, these run without ePages."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lxml import etree
+
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.sync import ChangeSet, ShopStore
+
+from .fake_epages import FakeEpages, soap_response
+from .test_templates import info_handler
+
+SHOP = (
+    '<item><Alias>{0}</Alias><ShopType>{1}</ShopType>'
+    '<IsClosed>{2}</IsClosed>'
+    '<DomainName>{0}.example</DomainName>'
+    '<MerchantEMail>owner@{0}.example</MerchantEMail>'
+    '<SecondaryDomains soapenc:arrayType="xsd:string[1]">'
+    '<item>www.{0}.example</item></SecondaryDomains>'
+    '<Attributes soapenc:arrayType="ns1:TAttribute[1]">'
+    '<item><Name>Path</Name><Value>/Shops/{0}</Value></item>'
+    '</Attributes>'
+    '</item>'
+)
+
+
+class TestShopStore(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers.update({
+            'getAllInfo': cls.all_info_handler,
+            'getInfo': info_handler,
+        })
+        cls._sc = ShopConfigService(server=cls._fake.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    @classmethod
+    def all_info_handler(cls, body):
+        items = ''.join(SHOP.format(alias, shop_type, closed)
+                        for alias, (shop_type, closed) in cls.shops.items())
+        return 200, soap_response(
+            'getAllInfo',
+            '<Shops soapenc:arrayType="ns0:TInfoShop_Return[{}]">{}</Shops>'
+            .format(len(cls.shops), items))
+
+    def setUp(self):
+        self._fake.reset()
+        self._dir = tempfile.mkdtemp()
+        self.path = os.path.join(self._dir, 'shops.sqlite')
+        type(self).shops = {
+            'Shop{}'.format(i): ('MinDemo' if i % 2 else 'Big', 0)
+            for i in range(5)}
+        self.store = ShopStore(self.path, self._sc)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self._dir)
+
+    def test_sync(self):
+        self.assertIsNone(self.store.synced_at)
+        changes = self.store.sync()
+        self.assertEqual(changes, ChangeSet(
+            ['Shop0', 'Shop1', 'Shop2', 'Shop3', 'Shop4'], [], []))
+        self.assertEqual(len(self.store), 5)
+        self.assertIsNotNone(self.store.synced_at)
+
+        self.assertTrue(self.store.sync().empty)
+
+        self.shops['Shop1'] = ('MinDemo', 1)
+        self.shops['Shop5'] = ('Big', 0)
+        del self.shops['Shop2']
+        self.assertEqual(self.store.sync(),
+                         ChangeSet(['Shop5'], ['Shop1'], ['Shop2']))
+        self.assertNotIn('Shop2', self.store)
+        self.assertIs(self.store.get('Shop1').IsClosed, True)
+
+    def test_failed_sync(self):
+        self.store.sync()
+        del self.shops['Shop2']
+        self._fake.handlers['getAllInfo'] = lambda body: (
+            200, self.all_info_handler(body)[1][:-200])
+        try:
+            with self.assertRaises(etree.XMLSyntaxError):
+                self.store.sync()
+        finally:
+            self._fake.handlers['getAllInfo'] = self.all_info_handler
+        self.assertIn('Shop2', self.store)
+
+    def test_queries(self):
+        self.store.sync()
+        self.assertEqual(
+            [record.Alias for record in self.store.find(ShopType='Big')],
+            ['Shop0', 'Shop2', 'Shop4'])
+        self.assertEqual(self.store.find(ShopType='Big', IsClosed=True), [])
+        self.assertEqual(len(self.store.find(Database=None)), 5)
+        self.assertEqual(self.store.by_domain('WWW.Shop3.example').Alias,
+                         'Shop3')
+        self.assertIsNone(self.store.by_domain('shop9.example'))
+        self.assertEqual(
+            [record.Alias for record in
+             self.store.by_email('owner@Shop4.example')], ['Shop4'])
+        record = self.store.get('Shop4')
+        self.assertEqual(record.SecondaryDomains, ('www.Shop4.example',))
+        self.assertEqual(record.Attributes[0].value, '/Shops/Shop4')
+        self.assertEqual(list(self.store)[0].Alias, 'Shop0')
+        self.assertEqual(
+            len(self.store.inventory().find(ShopType='MinDemo')), 2)
+
+        # persistent
+        self.store.close()
+        self.store = ShopStore(self.path)
+        self.assertEqual(self.store.get('Shop4'), record)
+        self.assertEqual(dict(self._fake.calls), {'getAllInfo': 1})
+
+    def test_refresh(self):
+        self.store.sync()
+        changes = self.store.refresh(['DemoShop', 'Shop1'])
+        self.assertEqual(changes, ChangeSet(['DemoShop'], [], ['Shop1']))
+        self.assertEqual(self.store.by_domain('a.example').Alias, 'DemoShop')
+        self.assertTrue(self.store.refresh(['DemoShop']).empty)
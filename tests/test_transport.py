@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.transport`, these run without ePages."""
+
+import base64
+import time
+import unittest
+
+from requests import Session
+from requests.exceptions import Timeout
+
+from epages_provisioning.features import FeaturePackService
+from epages_provisioning.provisioning import ShopConfigService
+from epages_provisioning.transport import TransportConfig
+
+from .fake_epages import FakeEpages, soap_response
+
+
+def exists_handler(body):
+    return 200, soap_response('exists', '<exists>1</exists>')
+
+
+def slow_handler(body):
+    time.sleep(0.5)
+    return 200, soap_response('exists', '<exists>1</exists>')
+
+
+def basic_user(headers):
+    """ user name of the basic auth header """
+    encoded = headers['Authorization'].split(' ', 1)[1]
+    return base64.b64decode(encoded).decode('utf-8').split(':', 1)[0]
+
+
+class TestTransportConfig(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._fake = FakeEpages().start()
+        cls._fake.handlers['exists'] = exists_handler
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._fake.stop()
+
+    def setUp(self):
+        self._fake.reset()
+
+    def test_shared_pool(self):
+        config = TransportConfig(pool_maxsize=4)
+        sc = ShopConfigService(server=self._fake.server,
+                               transport_config=config)
+        fp = FeaturePackService(self._fake.server, 'Distributor', 'admin',
+                                'admin', transport_config=config)
+        endpoint = sc.endpoint
+        self.assertIsNot(sc.client.transport.session,
+                         fp.client.transport.session)
+        self.assertIs(sc.client.transport.session.get_adapter(endpoint),
+                      config.adapter)
+        self.assertIs(fp.client.transport.session.get_adapter(endpoint),
+                      config.adapter)
+        self.assertEqual(config.adapter._pool_maxsize, 4)
+
+    def test_own_pool_by_default(self):
+        first = ShopConfigService(server=self._fake.server)
+        second = ShopConfigService(server=self._fake.server)
+        self.assertIsNot(
+            first.client.transport.session.get_adapter(first.endpoint),
+            second.client.transport.session.get_adapter(second.endpoint))
+
+    def test_shared_session(self):
+        config = TransportConfig(session=Session())
+        first = ShopConfigService(
+            server=self._fake.server, provider='Distributor',
+            username='first', password='a', transport_config=config)
+        second = ShopConfigService(
+            server=self._fake.server, provider='Distributor',
+            username='second', password='b', transport_config=config)
+        self.assertIs(first.client.transport.session,
+                      second.client.transport.session)
+
+        first.exists(first.get_shopref_obj({'Alias': 'DemoShop'}))
+        second.alias_exists('DemoShop')
+        self.assertEqual(
+            [basic_user(headers) for headers in self._fake.headers],
+            ['/Providers/Distributor/Users/first',
+             '/Providers/Distributor/Users/second'])
+
+    def test_keep_alive(self):
+        config = TransportConfig(keep_alive=False)
+        sc = ShopConfigService(server=self._fake.server,
+                               transport_config=config)
+        sc.alias_exists('DemoShop')
+        self.assertEqual(self._fake.headers[0]['Connection'], 'close')
+
+    def test_operation_timeouts(self):
+        config = TransportConfig(timeout=5, operation_timeouts={'exists': 0.1})
+        sc = ShopConfigService(server=self._fake.server,
+                               transport_config=config)
+        transport = sc.client.transport
+        self.assertEqual(transport.timeout_for('exists'), 0.1)
+        self.assertEqual(transport.timeout_for('getInfo'), 5)
+
+        self._fake.handlers['exists'] = slow_handler
+        try:
+            with self.assertRaises(Timeout):
+                sc.exists(sc.get_shopref_obj({'Alias': 'DemoShop'}))
+            with self.assertRaises(Timeout):
+                sc.alias_exists('DemoShop')
+        finally:
+            self._fake.handlers['exists'] = exists_handler
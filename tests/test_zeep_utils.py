@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `epages_provisioning.zeep_utils`, these run without ePages."""
+
+import copy
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from lxml import etree
+from zeep import Client, Settings
+
+from epages_provisioning.zeep_utils import (
+    ArrayFixer, BooleanFixer, DocumentCache, EnvelopeFixer,
+    LocalSchemaTransport, FEATUREPACK_TYPES_NS
+)
+
+from .fake_epages import DATA_DIR
+
+XSD = b"""<?xml version="1.0"?>
+<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+            targetNamespace="urn://wrong"/>"""
+
+
+class DocumentHandler(BaseHTTPRequestHandler):
+    """ serves XSD with an ETag and counts the requests """
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(XSD)))
+        self.end_headers()
+        self.wfile.write(XSD)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDocumentCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._server = HTTPServer(('127.0.0.1', 0), DocumentHandler)
+        cls._thread = threading.Thread(target=cls._server.serve_forever)
+        cls._thread.daemon = True
+        cls._thread.start()
+        cls._url = 'http://127.0.0.1:{}/WebRoot/WSDL/FeaturePackTypes.xsd'\
+            .format(cls._server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._server.shutdown()
+        cls._server.server_close()
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'documents.db')
+        DocumentHandler.requests.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_add_get(self):
+        cache = DocumentCache(self._path)
+        cache.add('http://example.com/a.wsdl', b'<a/>', '12', etag='"x"')
+        self.assertEqual(cache.get('http://example.com/a.wsdl', '12'), b'<a/>')
+        self.assertIsNone(cache.get('http://example.com/a.wsdl', '11'))
+        self.assertEqual(
+            cache.lookup('http://example.com/a.wsdl', '12').etag, '"x"')
+
+    def test_expired(self):
+        cache = DocumentCache(self._path, timeout=-1)
+        cache.add('http://example.com/a.wsdl', b'<a/>')
+        self.assertIsNone(cache.get('http://example.com/a.wsdl'))
+        self.assertTrue(cache.lookup('http://example.com/a.wsdl').expired)
+
+    def test_patched_content_is_cached(self):
+        transport = LocalSchemaTransport(cache=DocumentCache(self._path))
+        content = transport.load(self._url)
+        self.assertIn(FEATUREPACK_TYPES_NS.encode(), content)
+
+        # new process, same file: no request at all
+        transport = LocalSchemaTransport(cache=DocumentCache(self._path))
+        self.assertEqual(transport.load(self._url), content)
+        self.assertEqual(DocumentHandler.requests, [None])
+
+    def test_revalidate(self):
+        transport = LocalSchemaTransport(
+            cache=DocumentCache(self._path, timeout=-1))
+        content = transport.load(self._url)
+        self.assertEqual(transport.load(self._url), content)
+        # second load was a conditional GET answered with 304
+        self.assertEqual(DocumentHandler.requests, [None, '"v1"'])
+
+
+def fix_old(envelope, operation):
+    """ the envelope as the ArrayFixer and BooleanFixer plugins leave it """
+    envelope = copy.deepcopy(envelope)
+    for plugin in (ArrayFixer(), BooleanFixer()):
+        envelope, _ = plugin.egress(envelope, {}, operation, {})
+    return etree.tostring(envelope)
+
+
+def fix_new(envelope, operation, fixer):
+    envelope = copy.deepcopy(envelope)
+    envelope, _ = fixer.egress(envelope, {}, operation, {})
+    return etree.tostring(envelope)
+
+
+class TestEnvelopeFixer(unittest.TestCase):
+    """ EnvelopeFixer must produce the same envelopes as the old plugins """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._client = Client(
+            os.path.join(DATA_DIR, 'ShopConfigService12.wsdl'),
+            settings=Settings(strict=False),
+            transport=LocalSchemaTransport(),
+        )
+        binding = next(iter(cls._client.wsdl.bindings.values()))
+        cls._binding = binding
+        cls._service = cls._client.create_service(
+            binding.name, 'http://localhost/epages/Site.soap')
+
+    def assertSameEnvelope(self, operation_name, *args):
+        envelope = self._client.create_message(
+            self._service, operation_name, *args)
+        operation = self._binding.get(operation_name)
+        fixer = EnvelopeFixer()
+        expected = fix_old(envelope, operation)
+        self.assertEqual(fix_new(envelope, operation, fixer), expected)
+        # and again with the cached rules
+        self.assertEqual(fix_new(envelope, operation, fixer), expected)
+
+    def test_update(self):
+        attribute = self._client.get_type('ns1:TAttribute')
+        shop = self._client.get_type('ns0:TUpdateShop')(
+            Alias='DemoShop',
+            IsClosed=False,
+            IsTrialShop=True,
+            HasSSLCertificate=False,
+            SecondaryDomains=['shop{}.example'.format(i) for i in range(20)],
+            Attributes=[attribute(Name='a{}'.format(i), Value=str(i))
+                        for i in range(20)],
+        )
+        self.assertSameEnvelope('update', shop)
+
+    def test_get_info(self):
+        shop = self._client.get_type('ns0:TInfoShop_Input')(
+            Alias='DemoShop', Attributes=['Path', 'CreationDate'],
+            Languages=['en', 'de'])
+        self.assertSameEnvelope('getInfo', shop)
+
+    def test_exists(self):
+        shopref = self._client.get_type('ns0:TShopRef')(Alias='DemoShop')
+        self.assertSameEnvelope('exists', shopref)
+        # nothing to fix in exists, the envelope is not walked
+        self.assertEqual(
+            EnvelopeFixer()._tags_for(self._binding.get('exists')), ())
+
+    def test_set_secondary_domains(self):
+        shopref = self._client.get_type('ns0:TShopRef')(Alias='DemoShop')
+        domains = self._client.get_type('ns0:TSecondaryDomains')(
+            ['a.example', 'b.example'])
+        self.assertSameEnvelope('setSecondaryDomains', shopref, domains)
+
+    def test_feature_packs(self):
+        envelope = etree.fromstring(
+            '<Envelope><Body><applyToShop><FeaturePacks>'
+            '<item xsi:type="xsd:string" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">a</item>'
+            '<item>b</item>'
+            '</FeaturePacks></applyToShop></Body></Envelope>')
+        Operation = namedtuple('Operation', 'name')
+        for name in ('applyToShop', 'getInfo'):
+            operation = Operation(name)
+            self.assertEqual(
+                fix_new(envelope, operation, EnvelopeFixer()),
+                fix_old(envelope, operation))